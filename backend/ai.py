@@ -0,0 +1,51 @@
+"""Lazy access to the emergentintegrations LLM SDK.
+
+The SDK pulls in a large dependency tree, so it is not imported when the
+app starts. ``AVAILABLE`` only checks that the package is installed; the
+import happens on the first AI request (off the event loop), or shortly
+after startup when ``AI_WARMUP_DELAY`` is set.
+"""
+import asyncio
+import importlib
+import importlib.util
+import logging
+import threading
+import time
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+AVAILABLE = importlib.util.find_spec("emergentintegrations") is not None
+
+_sdk: Optional[Tuple[type, type]] = None
+_lock = threading.Lock()
+
+
+def load_sdk() -> Tuple[type, type]:
+    """Import the SDK once and return ``(LlmChat, UserMessage)``."""
+    global _sdk
+    if _sdk is None:
+        with _lock:
+            if _sdk is None:
+                started = time.perf_counter()
+                module = importlib.import_module("emergentintegrations.llm.chat")
+                _sdk = (module.LlmChat, module.UserMessage)
+                logger.info(f"Loaded LLM SDK in {(time.perf_counter() - started) * 1000:.0f}ms")
+    return _sdk
+
+
+async def sdk() -> Tuple[type, type]:
+    if _sdk is not None:
+        return _sdk
+    # The first import takes long enough to stall every other request if
+    # it ran on the event loop
+    return await asyncio.to_thread(load_sdk)
+
+
+async def warm_up(delay: float = 0.0):
+    """Import the SDK in the background after ``delay`` seconds."""
+    await asyncio.sleep(delay)
+    try:
+        await sdk()
+    except Exception as e:
+        logger.error(f"LLM SDK warm-up failed: {e}")
@@ -0,0 +1,134 @@
+"""In-process dispatch of batched GET requests.
+
+``/api/batch`` lets a client fetch several API resources in one HTTP
+round trip. Each entry is run through the ASGI app as if it had arrived
+on its own, with the batch request's credentials, so routes, dependencies
+and middleware behave exactly as for a direct call. Entries run
+concurrently; whatever has not finished when the batch's time budget runs
+out is cancelled and reported as a 504.
+
+Bodies are spliced into the combined response as they are: JSON bodies
+are embedded without being parsed and serialized again.
+"""
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+from caching import dumps
+
+logger = logging.getLogger(__name__)
+
+# Request headers passed on to every entry; the rest (cookies, encodings,
+# content headers of the batch itself) don't apply to an internal GET
+FORWARDED_HEADERS = (b"authorization", b"x-client-id", b"accept-language", b"user-agent")
+
+
+class Result:
+    __slots__ = ("status", "content_type", "body")
+
+    def __init__(self, status: int, content_type: bytes = b"application/json", body: bytes = b""):
+        self.status = status
+        self.content_type = content_type
+        self.body = body
+
+
+def _error(status: int, detail: str) -> Result:
+    return Result(status, body=dumps({"detail": detail}))
+
+
+def sub_scope(scope: dict, path: str) -> Optional[dict]:
+    """The scope of a GET for ``path`` made with ``scope``'s credentials."""
+    parts = urlsplit(path)
+    if parts.scheme or parts.netloc:
+        return None
+    headers = [(name, value) for name, value in scope["headers"] if name in FORWARDED_HEADERS]
+    headers.append((b"accept", b"application/json"))
+    return {
+        "type": "http",
+        "asgi": scope.get("asgi", {"version": "3.0"}),
+        "http_version": scope.get("http_version", "1.1"),
+        "method": "GET",
+        "scheme": scope.get("scheme", "http"),
+        "server": scope.get("server"),
+        "client": scope.get("client"),
+        "root_path": scope.get("root_path", ""),
+        "path": unquote(parts.path),
+        "raw_path": parts.path.encode(),
+        "query_string": parts.query.encode(),
+        "headers": headers,
+        "state": {},
+    }
+
+
+async def dispatch(app, scope: dict) -> Result:
+    """Run one request through ``app`` and collect its response."""
+    result = Result(500)
+    chunks: List[bytes] = []
+    finished = asyncio.Event()
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Only asked again by handlers watching for the client to go away
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            result.status = message["status"]
+            for name, value in message.get("headers", ()):
+                if name.lower() == b"content-type":
+                    result.content_type = value
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                finished.set()
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        finished.set()
+    result.body = b"".join(chunks)
+    return result
+
+
+async def run(app, scope: dict, entries: Iterable[Tuple[str, str]], timeout: float,
+              is_allowed=lambda path: True) -> Dict[str, Result]:
+    """Dispatch ``(id, path)`` entries concurrently, within ``timeout`` seconds in total."""
+    results: Dict[str, Result] = {}
+    tasks: Dict[asyncio.Task, str] = {}
+    for entry_id, path in entries:
+        request_scope = sub_scope(scope, path)
+        if request_scope is None or not is_allowed(request_scope["path"]):
+            results[entry_id] = _error(400, "Path not allowed in a batch")
+        else:
+            tasks[asyncio.ensure_future(dispatch(app, request_scope))] = entry_id
+
+    done, pending = await asyncio.wait(tasks, timeout=timeout) if tasks else (set(), set())
+    for task in pending:
+        task.cancel()
+        results[tasks[task]] = _error(504, "Timed out")
+    for task in done:
+        try:
+            results[tasks[task]] = task.result()
+        except Exception as e:
+            logger.error(f"Batched request {tasks[task]} failed: {e}")
+            results[tasks[task]] = _error(500, "Internal server error")
+    return results
+
+
+def encode(order: Iterable[str], results: Dict[str, Result]) -> bytes:
+    """``{"responses": {id: {"status": ..., "body": ...}}}``, in request order."""
+    parts = []
+    for entry_id in order:
+        result = results[entry_id]
+        if result.content_type.startswith(b"application/json") and result.body:
+            body = result.body
+        else:
+            body = dumps(result.body.decode("utf-8", "replace"))
+        parts.append(b"%s:{\"status\":%d,\"body\":%s}" % (dumps(entry_id), result.status, body))
+    return b'{"responses":{' + b",".join(parts) + b"}}"
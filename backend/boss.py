@@ -0,0 +1,190 @@
+"""Daily boss challenges.
+
+A user's challenge for a day is a pure function of (user_id, date) and
+the difficulty model: the challenge and difficulty are picked, with a
+generator seeded by both, among the options the model gives the user's
+bucket (see difficulty.py), and the id is a UUIDv5 of them. A daily job
+inserts tomorrow's challenges for every recently active user ahead of
+time, so the first requests after midnight are plain reads; anyone it
+missed gets theirs through an upsert on first visit. The unique
+(user_id, date) index makes both paths safe to repeat and to race.
+
+Challenges are marked ``served`` when first shown, so the difficulty
+model does not learn from pre-generated challenges nobody saw.
+"""
+import logging
+import os
+import random
+import time
+import uuid
+from datetime import date, timedelta
+from typing import Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+import difficulty
+
+logger = logging.getLogger(__name__)
+
+BOSS_CHALLENGES = [
+    "Complete 5 tasks without distraction",
+    "Work for 2 hours straight in Focus Mode",
+    "Finish your most difficult task today",
+    "Complete all pending tasks from yesterday",
+    "Learn something new and create a task about it",
+    "Help someone else with their task",
+    "Wake up early and complete 3 tasks before noon",
+    "No social media until you complete 3 tasks",
+    "Complete a task you've been procrastinating on",
+    "Double your daily task completion rate"
+]
+
+# Users active within this many days get tomorrow's challenge pre-generated
+ACTIVE_DAYS = int(os.environ.get('BOSS_ACTIVE_DAYS', '7'))
+
+_NAMESPACE = uuid.UUID("6f1c1f8e-3f6a-4d8c-9a51-2f0d7c1b5e42")
+
+model = difficulty.DifficultyModel(ttl=float(os.environ.get('BOSS_MODEL_TTL', '3600')))
+
+
+async def remove_duplicates(db) -> int:
+    """Delete all but one challenge per (user_id, date), preferring a completed one.
+
+    Only needed for rows written before the unique index existed. Every
+    worker picks the same survivor, so concurrent runs are safe.
+    """
+    removed = 0
+    groups = db.boss_challenges.aggregate([
+        {"$sort": {"completed": -1, "_id": 1}},
+        {"$group": {"_id": {"user_id": "$user_id", "date": "$date"}, "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ], allowDiskUse=True)
+    async for group in groups:
+        result = await db.boss_challenges.delete_many({"_id": {"$in": group["ids"][1:]}})
+        removed += result.deleted_count
+    return removed
+
+
+async def ensure_indexes(db):
+    # Both ways of creating a challenge rely on this index: fail startup without it
+    keys = [("user_id", 1), ("date", 1)]
+    try:
+        await db.boss_challenges.create_index(keys, unique=True)
+    except OperationFailure as e:
+        if e.code != 11000:
+            raise
+        removed = await remove_duplicates(db)
+        logger.warning(f"Removed {removed} duplicate boss challenges before creating their unique index")
+        await db.boss_challenges.create_index(keys, unique=True)
+
+
+def challenge_for(user_id: str, day: str, bucket: Optional[str] = None) -> dict:
+    rng = random.Random(f"{user_id}:{day}")
+    options = model.options(bucket)
+    if options:
+        index, level, probability = rng.choice(options)
+        text = BOSS_CHALLENGES[index]
+    else:
+        # No model trained yet
+        text, level, probability = rng.choice(BOSS_CHALLENGES), rng.randint(3, 5), None
+    return {
+        "id": str(uuid.uuid5(_NAMESPACE, f"{user_id}:{day}")),
+        "user_id": user_id,
+        "challenge_text": text,
+        "difficulty": level,
+        "xp_reward": level * 50,
+        "completed": False,
+        "date": day,
+        "served": False,
+        "bucket": bucket,
+        "success_probability": probability,
+        "model_version": model.version or None
+    }
+
+
+async def train_model(db, today: date, batch_size: int = 1000, on_batch=None) -> dict:
+    stats = await difficulty.train(db, today, BOSS_CHALLENGES, batch_size=batch_size, on_batch=on_batch)
+    model.invalidate()
+    return stats
+
+
+async def mark_served(db, challenge: dict) -> dict:
+    """Record that ``challenge`` is being shown to its user; one write per challenge."""
+    # Rows created before the flag existed have no "served" and count as shown
+    if not challenge.get("served", True):
+        await db.boss_challenges.update_one({"id": challenge["id"]}, {"$set": {"served": True}})
+        challenge["served"] = True
+    return challenge
+
+
+async def get_or_create(db, user: dict, day: str) -> dict:
+    user_id = user["id"]
+    challenge = await db.boss_challenges.find_one({"user_id": user_id, "date": day}, {"_id": 0})
+    if challenge:
+        return await mark_served(db, challenge)
+
+    await model.ensure_fresh(db)
+    # Not pre-generated (new or long-inactive user): create it on demand
+    challenge = challenge_for(user_id, day, user.get("boss_bucket"))
+    del challenge["served"]
+    try:
+        return await db.boss_challenges.find_one_and_update(
+            {"user_id": user_id, "date": day},
+            {"$setOnInsert": challenge, "$set": {"served": True}},
+            projection={"_id": 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # A concurrent request inserted it between our read and upsert
+        return await db.boss_challenges.find_one_and_update(
+            {"user_id": user_id, "date": day},
+            {"$set": {"served": True}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+
+
+async def _insert_chunk(db, challenges) -> int:
+    try:
+        result = await db.boss_challenges.insert_many(challenges, ordered=False)
+        return len(result.inserted_ids)
+    except BulkWriteError as e:
+        # Challenges created on demand already exist; anything else is real
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+        return e.details.get("nInserted", 0)
+
+
+async def generate(db, today: date, batch_size: int = 1000, on_batch=None, day: Optional[date] = None) -> dict:
+    """Insert the challenges for ``day`` (default: tomorrow) of recently active users."""
+    day = (day or today + timedelta(days=1)).isoformat()
+    stats = {"date": day, "users": 0, "inserted": 0, "batches": 0}
+    started = time.perf_counter()
+
+    await model.ensure_fresh(db)
+    cursor = db.users.find(
+        {"last_active_date": {"$gte": (today - timedelta(days=ACTIVE_DAYS)).isoformat()}},
+        {"_id": 0, "id": 1, "boss_bucket": 1},
+    ).sort([("last_active_date", 1), ("id", 1)]).batch_size(batch_size)
+
+    chunk = []
+
+    async def flush():
+        stats["inserted"] += await _insert_chunk(db, chunk)
+        stats["batches"] += 1
+        chunk.clear()
+        if on_batch:
+            await on_batch(stats)
+
+    async for user in cursor:
+        stats["users"] += 1
+        chunk.append(challenge_for(user["id"], day, user.get("boss_bucket")))
+        if len(chunk) >= batch_size:
+            await flush()
+    if chunk:
+        await flush()
+
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    return stats
@@ -0,0 +1,190 @@
+"""In-process caches for pre-serialized API responses."""
+import asyncio
+import gzip
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Bodies smaller than this are not worth a gzip frame
+GZIP_MIN_SIZE = 1024
+
+
+def _default(obj):
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    return str(obj)
+
+
+if ORJSON_AVAILABLE:
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+else:
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), default=_default).encode()
+
+
+def json_response(content, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    """Serialize ``content`` straight to a response, skipping jsonable_encoder."""
+    return Response(dumps(content), status_code=status_code, headers=headers, media_type="application/json")
+
+
+def content_hash(obj) -> str:
+    canonical = json.dumps(obj, separators=(",", ":"), sort_keys=True, default=str).encode()
+    return hashlib.sha256(canonical).hexdigest()[:32]
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison as required for If-None-Match (RFC 9110 13.1.2)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == wanted:
+            return True
+    return False
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    codings = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        codings[name.strip().lower()] = q
+    return codings
+
+
+def accepts_gzip(request: Request) -> bool:
+    # "gzip;q=0" refuses gzip
+    return parse_accept_encoding(request.headers.get("accept-encoding", "")).get("gzip", 0) > 0
+
+
+class CachedBody:
+    __slots__ = ("etag", "body", "gzip_body", "expires_at")
+
+    def __init__(self, etag: str, body: bytes, ttl: float):
+        self.etag = etag
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=6, mtime=0) if len(body) >= GZIP_MIN_SIZE else None
+        self.expires_at = time.monotonic() + ttl
+
+
+class LRUBytesCache:
+    """Bounded LRU of serialized (and pre-compressed) response bodies.
+
+    Entries also expire after ``ttl`` seconds so that a write made through
+    another process is picked up eventually.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # Bumped by every invalidation: a fill that started before one
+        # passes the generation it read to put(), which then keeps nothing
+        self.generation = 0
+        self._entries: "OrderedDict[str, CachedBody]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[CachedBody]:
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, body: bytes, etag: str, generation: Optional[int] = None) -> CachedBody:
+        entry = CachedBody(etag, body, self.ttl)
+        if generation is not None and generation != self.generation:
+            # Loaded before an invalidation: good for its caller, not for the cache
+            return entry
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, key: str):
+        self.generation += 1
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def body_etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one.
+
+    The first caller for a key starts ``load()`` in its own task; callers
+    arriving while it runs await that task instead of starting another.
+    The load is shielded, so a caller that goes away (a client
+    disconnecting) does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self.hits = 0  # callers that joined a call already in flight
+        self.misses = 0  # calls actually made
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved, even if every caller went away
+
+    async def do(self, key: Hashable, load: Callable[[], Awaitable]):
+        task = self._calls.get(key)
+        if task is None:
+            self.misses += 1
+            task = self._calls[key] = asyncio.ensure_future(load())
+            task.add_done_callback(lambda done: self._done(key, done))
+        else:
+            self.hits += 1
+        return await asyncio.shield(task)
+
+
+def cached_response(entry: CachedBody, request: Request, cache_control: str = "no-cache",
+                    headers: Optional[dict] = None) -> Response:
+    headers = {**(headers or {}), "ETag": entry.etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    if entry.gzip_body is not None and accepts_gzip(request):
+        headers["Content-Encoding"] = "gzip"
+        return Response(entry.gzip_body, media_type="application/json", headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
@@ -0,0 +1,125 @@
+"""Database client construction and lifecycle.
+
+``DB_BACKEND=memory`` (or a ``memory://`` MONGO_URL) swaps MongoDB for the
+in-process implementation in memdb.py, so the app, its tests and
+benchmarks can run without a mongod.
+
+Pool sizing is configured through the environment:
+
+    MONGO_MAX_POOL_SIZE              (default 100)
+    MONGO_MIN_POOL_SIZE              (default 5)
+    MONGO_WAIT_QUEUE_TIMEOUT_MS      (default 5000)
+    MONGO_SERVER_SELECTION_TIMEOUT_MS (default 5000)
+    MONGO_CONNECT_TIMEOUT_MS         (default 10000)
+    MONGO_WARMUP_CONNECTIONS         (default: the min pool size)
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+from memdb import MemoryClient
+
+logger = logging.getLogger(__name__)
+
+
+def use_memory_backend(mongo_url: str) -> bool:
+    return os.environ.get('DB_BACKEND', 'mongo').lower() == 'memory' or mongo_url.startswith('memory://')
+
+
+def pool_options() -> dict:
+    return {
+        "maxPoolSize": int(os.environ.get('MONGO_MAX_POOL_SIZE', '100')),
+        "minPoolSize": int(os.environ.get('MONGO_MIN_POOL_SIZE', '5')),
+        "waitQueueTimeoutMS": int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '5000')),
+        "serverSelectionTimeoutMS": int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+        "connectTimeoutMS": int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '10000')),
+    }
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Tracks open and checked-out connections across all pools of the client."""
+
+    def __init__(self, max_pool_size: int):
+        self.max_pool_size = max_pool_size
+        self.open = 0
+        self.checked_out = 0
+        self.waiting = 0
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+
+    def connection_created(self, event):
+        self.open += 1
+
+    def connection_ready(self, event): pass
+
+    def connection_closed(self, event):
+        self.open -= 1
+
+    def connection_check_out_started(self, event):
+        self.waiting += 1
+
+    def connection_check_out_failed(self, event):
+        self.waiting -= 1
+
+    def connection_checked_out(self, event):
+        self.waiting -= 1
+        self.checked_out += 1
+
+    def connection_checked_in(self, event):
+        self.checked_out -= 1
+
+    def stats(self) -> dict:
+        return {
+            "max_pool_size": self.max_pool_size,
+            "open": self.open,
+            "checked_out": self.checked_out,
+            "waiting": max(self.waiting, 0),
+            "utilization": round(self.checked_out / self.max_pool_size, 3) if self.max_pool_size else 0,
+        }
+
+
+def create_client(mongo_url: str, event_listeners=None, pool_monitor: Optional[PoolMonitor] = None):
+    if use_memory_backend(mongo_url):
+        logger.warning("Using in-memory database backend, data will not be persisted")
+        return MemoryClient(event_listeners=event_listeners)
+    listeners = list(event_listeners or [])
+    if pool_monitor is not None:
+        listeners.append(pool_monitor)
+    # connect=False defers the monitor threads and sockets to first use, so a
+    # client built while the app is preloaded in the gunicorn master is not
+    # carried across fork into the workers
+    # tz_aware: dates come back as aware UTC datetimes, like the ones written (see dates.py)
+    return AsyncIOMotorClient(mongo_url, event_listeners=listeners, connect=False, tz_aware=True, **pool_options())
+
+
+async def ping(db, timeout: float = 2.0) -> float:
+    """Round-trip a ping and return its latency in seconds."""
+    started = time.perf_counter()
+    await asyncio.wait_for(db.command("ping"), timeout)
+    return time.perf_counter() - started
+
+
+async def warm_up(db, connections: Optional[int] = None):
+    """Check connectivity and open ``connections`` pooled sockets up front.
+
+    Concurrent pings force the driver to establish that many connections so
+    the first requests after a cold start don't pay for the TCP/TLS
+    handshakes. Failures are logged, not raised: readiness reports them.
+    """
+    if connections is None:
+        connections = int(os.environ.get('MONGO_WARMUP_CONNECTIONS', pool_options()["minPoolSize"]))
+    try:
+        latency = await ping(db, timeout=pool_options()["serverSelectionTimeoutMS"] / 1000)
+        if connections > 1:
+            await asyncio.gather(*(db.command("ping") for _ in range(connections)))
+        logger.info(f"MongoDB ready: ping {latency * 1000:.1f}ms, {connections} connections warmed")
+    except Exception as e:
+        logger.error(f"MongoDB warm-up failed: {str(e) or type(e).__name__}")
@@ -0,0 +1,56 @@
+"""Timestamps: stored as BSON dates, read in either format.
+
+Instants used to be stored as ISO-8601 strings. They are now written as
+timezone-aware datetimes, and the Mongo client is ``tz_aware``, so they
+come back aware and in UTC. migrations.py converts existing documents in
+the background. Until it has finished, a field may hold either type.
+Readers go through ``as_datetime``, and range filters through ``since``,
+``after`` or ``before``, which match both.
+
+Calendar days (``last_active_date``, ``discipline_decayed_through``, a
+boss challenge's ``date``) are day keys, not instants. They stay
+``YYYY-MM-DD`` strings.
+"""
+from datetime import date, datetime, timezone
+from typing import Optional
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def start_of_day(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+def as_datetime(value) -> Optional[datetime]:
+    """An aware datetime from a stored timestamp of either format, None if unset or invalid."""
+    if isinstance(value, datetime):
+        # pymongo returns naive UTC datetimes unless the client is tz_aware
+        return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, str) and value:
+        try:
+            return as_datetime(datetime.fromisoformat(value))
+        except ValueError:
+            return None
+    return None
+
+
+def since(field: str, start: datetime) -> dict:
+    """Filter for ``field >= start``, whether the field holds a date or an ISO string.
+
+    MongoDB compares values of one BSON type only, so each format needs
+    its own branch. Once the migration has finished, the string branch
+    matches nothing.
+    """
+    return {"$or": [{field: {"$gte": start}}, {field: {"$gte": start.isoformat()}}]}
+
+
+def after(field: str, start: datetime) -> dict:
+    """Filter for ``field > start``, in either format, like ``since``."""
+    return {"$or": [{field: {"$gt": start}}, {field: {"$gt": start.isoformat()}}]}
+
+
+def before(field: str, end: datetime) -> dict:
+    """Filter for ``field < end``, in either format, like ``since``."""
+    return {"$or": [{field: {"$lt": end}}, {field: {"$lt": end.isoformat()}}]}
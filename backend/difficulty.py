@@ -0,0 +1,250 @@
+"""Boss challenge difficulty model.
+
+Trained offline by a daily job, served from memory. Users are grouped
+into buckets by three features over the last ``WINDOW_DAYS`` days:
+
+- boss completion rate (``new`` when they have no boss history),
+- average completed focus minutes per day,
+- the skill tree most of their completed tasks belong to.
+
+For every bucket the job estimates the success probability of each
+(challenge, difficulty) pair from the outcomes of past boss challenges,
+counting only days that have ended and challenges the user was shown,
+backing off to coarser buckets and finally to a per-difficulty prior when
+data is sparse. The model keeps, per bucket, the few options whose
+probability is closest to ``TARGET_SUCCESS``; picking one at request time
+is a dict lookup and a seeded random choice.
+
+The job writes each user's bucket to ``users.boss_bucket``, so the request
+path needs no extra query. Feature aggregations are sorted by user id and
+merge-joined as they stream, so memory stays bounded by the model size,
+not the user count.
+"""
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from dates import since, start_of_day
+
+logger = logging.getLogger(__name__)
+
+MODEL_ID = "boss_difficulty"
+WINDOW_DAYS = int(os.environ.get('BOSS_MODEL_WINDOW_DAYS', '30'))
+TARGET_SUCCESS = float(os.environ.get('BOSS_TARGET_SUCCESS', '0.6'))
+DIFFICULTIES = (3, 4, 5)
+SKILL_TREES = ("Work", "Learning", "Health", "Creative", "Social", "General")
+# Options kept per bucket: at least CANDIDATES, plus any within TOLERANCE
+# of the best one. The seeded per-user pick among them adds variety.
+CANDIDATES = 3
+TOLERANCE = 0.05
+# Pseudo-observations given to the parent estimate when smoothing
+SMOOTHING = 5.0
+PRIOR = {3: 0.75, 4: 0.6, 5: 0.45}
+
+_FOCUS_BOUNDS = (10, 30, 60)  # minutes per day
+
+
+def completion_bucket(attempts: int, completed: int) -> str:
+    if not attempts:
+        return "new"
+    return str(min(3, int(completed / attempts * 4)))
+
+
+def focus_bucket(minutes_per_day: float) -> str:
+    return str(sum(minutes_per_day >= bound for bound in _FOCUS_BOUNDS))
+
+
+def bucket_key(attempts: int, completed: int, focus_minutes: float, skill: Optional[str]) -> str:
+    skill = skill if skill in SKILL_TREES else "General"
+    return f"{completion_bucket(attempts, completed)}:{focus_bucket(focus_minutes / WINDOW_DAYS)}:{skill}"
+
+
+def _parent(level: str) -> str:
+    # "1:2:Work" -> "1:2" -> "1" -> "" (all users)
+    return level.rsplit(":", 1)[0] if ":" in level else ""
+
+
+class DifficultyModel:
+    """In-memory lookup table: bucket -> [(challenge index, difficulty, p), ...].
+
+    Reloaded from the ``models`` collection after ``ttl`` seconds, so a
+    newly trained model reaches every worker within that time.
+    """
+
+    def __init__(self, ttl: float = 3600.0):
+        self.ttl = ttl
+        self.version = ""
+        self.table: Dict[str, List[Tuple[int, int, float]]] = {}
+        self._expires_at = 0.0
+
+    async def ensure_fresh(self, db):
+        if time.monotonic() < self._expires_at:
+            return
+        self._expires_at = time.monotonic() + self.ttl
+        try:
+            doc = await db.models.find_one({"_id": MODEL_ID})
+        except Exception as e:
+            logger.error(f"Could not load the boss difficulty model: {e}")
+            return
+        if doc:
+            self.load(doc)
+
+    def invalidate(self):
+        self._expires_at = 0.0
+
+    def load(self, doc: dict):
+        self.version = doc.get("version", "")
+        self.table = {bucket: [tuple(option) for option in options] for bucket, options in doc["table"].items()}
+
+    def options(self, bucket: Optional[str]) -> List[Tuple[int, int, float]]:
+        return self.table.get(bucket or "", []) or self.table.get("", [])
+
+
+async def _merge_by_user(**streams) -> AsyncIterator[Tuple[str, Dict[str, dict]]]:
+    """Merge-join aggregation streams sorted by ``_id`` (the user id)."""
+    iterators = {name: stream.__aiter__() for name, stream in streams.items()}
+    heads: Dict[str, dict] = {}
+
+    async def advance(name):
+        try:
+            heads[name] = await iterators[name].__anext__()
+        except StopAsyncIteration:
+            heads.pop(name, None)
+
+    for name in iterators:
+        await advance(name)
+    while heads:
+        user_id = min(head["_id"] for head in heads.values())
+        row = {}
+        for name in [n for n, head in heads.items() if head["_id"] == user_id]:
+            row[name] = heads[name]
+            await advance(name)
+        yield user_id, row
+
+
+def _feature_streams(db, first_day: date, today: date):
+    start = start_of_day(first_day)
+    boss = db.boss_challenges.aggregate([
+        # Today's challenges are still open, and pre-generated ones never
+        # shown are not failures; rows older than the flag count as shown
+        {"$match": {"date": {"$gte": first_day.isoformat(), "$lt": today.isoformat()},
+                    "served": {"$ne": False}}},
+        {"$group": {
+            "_id": "$user_id",
+            "attempts": {"$sum": 1},
+            "completed": {"$sum": {"$cond": ["$completed", 1, 0]}},
+            "outcomes": {"$push": {"text": "$challenge_text", "difficulty": "$difficulty", "completed": "$completed"}},
+        }},
+        {"$sort": {"_id": 1}},
+    ], allowDiskUse=True)
+    focus = db.focus_sessions.aggregate([
+        {"$match": {"completed": True, **since("started_at", start)}},
+        {"$group": {"_id": "$user_id", "minutes": {"$sum": "$duration_minutes"}}},
+        {"$sort": {"_id": 1}},
+    ], allowDiskUse=True)
+    skills = db.tasks.aggregate([
+        {"$match": {"completed": True, **since("completed_at", start)}},
+        {"$group": {"_id": {"user_id": "$user_id", "skill": "$skill_tree"}, "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+        {"$group": {"_id": "$_id.user_id", "skill": {"$first": "$_id.skill"}}},
+        {"$sort": {"_id": 1}},
+    ], allowDiskUse=True)
+    return {"boss": boss, "focus": focus, "skills": skills}
+
+
+def build_table(counts: Dict[Tuple[str, int, int], List[int]], challenge_count: int,
+                target: float = TARGET_SUCCESS) -> Dict[str, List[list]]:
+    """Smoothed success probabilities, reduced to the options nearest ``target``."""
+    # Roll observations up to every coarser level of the hierarchy
+    rolled: Dict[Tuple[str, int, int], List[int]] = {}
+    for (bucket, challenge, difficulty), (attempts, wins) in counts.items():
+        level = bucket
+        while True:
+            cell = rolled.setdefault((level, challenge, difficulty), [0, 0])
+            cell[0] += attempts
+            cell[1] += wins
+            if level == "":
+                break
+            level = _parent(level)
+
+    estimates: Dict[Tuple[str, int, int], float] = {}
+
+    def probability(level: str, challenge: int, difficulty: int) -> float:
+        key = (level, challenge, difficulty)
+        if key not in estimates:
+            parent = PRIOR[difficulty] if level == "" else probability(_parent(level), challenge, difficulty)
+            attempts, wins = rolled.get(key, (0, 0))
+            estimates[key] = (wins + SMOOTHING * parent) / (attempts + SMOOTHING)
+        return estimates[key]
+
+    completions = ["new", "0", "1", "2", "3"]
+    focuses = ["0", "1", "2", "3"]
+    levels = [""] + completions + [f"{c}:{f}" for c in completions for f in focuses]
+    levels += [f"{c}:{f}:{s}" for c in completions for f in focuses for s in SKILL_TREES]
+
+    table = {}
+    for level in levels:
+        options = [
+            (challenge, difficulty, probability(level, challenge, difficulty))
+            for challenge in range(challenge_count) for difficulty in DIFFICULTIES
+        ]
+        options.sort(key=lambda option: abs(option[2] - target))
+        cutoff = max(abs(options[0][2] - target) + TOLERANCE, abs(options[CANDIDATES - 1][2] - target))
+        table[level] = [[c, d, round(p, 4)] for c, d, p in options if abs(p - target) <= cutoff]
+    return table
+
+
+async def train(db, today: date, challenges: List[str], batch_size: int = 1000, on_batch=None) -> dict:
+    """Recompute every active user's bucket and the bucket -> options table."""
+    index = {text: i for i, text in enumerate(challenges)}
+    first_day = today - timedelta(days=WINDOW_DAYS)
+    stats = {"users": 0, "outcomes": 0, "buckets_changed": 0, "batches": 0}
+    started = time.perf_counter()
+
+    counts: Dict[Tuple[str, int, int], List[int]] = {}
+    ops = []
+
+    async def flush():
+        if ops:
+            result = await db.users.bulk_write(ops, ordered=False)
+            stats["buckets_changed"] += result.modified_count
+            ops.clear()
+        stats["batches"] += 1
+        if on_batch:
+            await on_batch(stats)
+
+    async for user_id, row in _merge_by_user(**_feature_streams(db, first_day, today)):
+        boss = row.get("boss", {})
+        bucket = bucket_key(
+            boss.get("attempts", 0), boss.get("completed", 0),
+            row.get("focus", {}).get("minutes", 0), row.get("skills", {}).get("skill"),
+        )
+        for outcome in boss.get("outcomes", []):
+            challenge = index.get(outcome.get("text"))
+            if challenge is None or outcome.get("difficulty") not in PRIOR:
+                continue
+            cell = counts.setdefault((bucket, challenge, outcome["difficulty"]), [0, 0])
+            cell[0] += 1
+            cell[1] += bool(outcome.get("completed"))
+            stats["outcomes"] += 1
+
+        stats["users"] += 1
+        ops.append(UpdateOne({"id": user_id, "boss_bucket": {"$ne": bucket}}, {"$set": {"boss_bucket": bucket}}))
+        if len(ops) >= batch_size:
+            await flush()
+    await flush()
+
+    version = datetime.now(timezone.utc).isoformat()
+    await db.models.replace_one(
+        {"_id": MODEL_ID},
+        {"version": version, "target": TARGET_SUCCESS, "window_days": WINDOW_DAYS,
+         "table": build_table(counts, len(challenges))},
+        upsert=True,
+    )
+    stats["version"] = version
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    return stats
@@ -0,0 +1,279 @@
+"""Domain events: the ``events`` outbox collection and a per-user pub/sub bus.
+
+Producers append events next to the state change that caused them.
+Appending writes the outbox and hands the events to this worker's ``bus``
+at once; a ``Relay`` in every worker tails the outbox and hands over the
+events written by the others, so a subscriber sees every event of its
+user whichever worker produced it. Writing to the outbox never fails the
+producer: a lost event is logged, the state change stands. A TTL index
+removes events after ``EVENT_RETENTION_SECONDS``; they only serve the
+relay and clients resuming a stream, so a day is plenty.
+
+Subscribers are per user and each holds a bounded queue: when a client
+stops reading, its oldest events are dropped instead of blocking the
+producer or growing memory.
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from collections import OrderedDict, deque
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from pymongo.errors import OperationFailure
+
+from dates import after, as_datetime, utc_now
+from metrics import REGISTRY, Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+STREAK_CHANGED = "streak.changed"
+XP_EARNED = "xp.earned"
+LEVEL_UP = "level.up"
+CHALLENGE_COMPLETED = "challenge.completed"
+# Admin edits of public content (no user); other workers drop their caches
+CONTENT_CHANGED = "content.changed"
+
+# Events queued per subscriber before the oldest are dropped
+SUBSCRIBER_QUEUE = int(os.environ.get('EVENT_SUBSCRIBER_QUEUE', '100'))
+# Polling relay (used when MongoDB has no change streams): how often it
+# polls, and how far back it re-reads to catch late inserts of other workers
+RELAY_POLL_SECONDS = float(os.environ.get('EVENT_RELAY_POLL_SECONDS', '0.5'))
+RELAY_LOOKBACK_SECONDS = float(os.environ.get('EVENT_RELAY_LOOKBACK_SECONDS', '5'))
+# How long the outbox keeps events
+RETENTION_SECONDS = int(os.environ.get('EVENT_RETENTION_SECONDS', '86400'))
+
+event_subscribers = REGISTRY.add(Gauge(
+    "event_subscribers", "Open event stream subscriptions"))
+events_delivered = REGISTRY.add(Counter(
+    "events_delivered_total", "Events queued to subscribers, by origin", ("origin",)))
+events_dropped = REGISTRY.add(Counter(
+    "events_dropped_total", "Events dropped from full subscriber queues"))
+event_subscribers.set(value=0)
+
+
+def _origin() -> str:
+    # Read per call: with a preloaded app, import time is before the fork
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def make_event(event_type: str, user_id: Optional[str], data: dict) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "type": event_type,
+        "user_id": user_id,
+        "data": data,
+        "created_at": utc_now(),
+        "origin": _origin(),
+        "published": False,
+    }
+
+
+def public(event: dict) -> dict:
+    """The part of an event sent to clients."""
+    return {"id": event["id"], "type": event["type"], "data": event["data"], "created_at": event["created_at"]}
+
+
+class Subscription:
+    """One client's view of its user's channel."""
+
+    __slots__ = ("user_id", "queue", "dropped", "closed", "_ready")
+
+    def __init__(self, user_id: str, maxsize: int):
+        self.user_id = user_id
+        self.queue = deque(maxlen=maxsize)
+        self.dropped = 0
+        self.closed = False
+        self._ready = asyncio.Event()
+
+    def put(self, event: dict):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+            events_dropped.inc()
+        self.queue.append(event)
+        self._ready.set()
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """The next event; None on timeout or once closed."""
+        if not self.queue and not self.closed:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        if not self.queue:
+            return None
+        event = self.queue.popleft()
+        if not self.queue and not self.closed:
+            self._ready.clear()
+        return event
+
+
+class EventBus:
+    """In-process pub/sub with one channel per user."""
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE, seen_size: int = 10000):
+        self.queue_size = queue_size
+        self.closed = False
+        self.channels: Dict[str, Set[Subscription]] = {}
+        self.remote_listeners: List[Tuple[str, Callable[[dict], Awaitable[None]]]] = []
+        # Ids of recent events already delivered here, so the relay skips them
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._seen_size = seen_size
+
+    def subscribe(self, user_id: str) -> Subscription:
+        subscription = Subscription(user_id, self.queue_size)
+        if self.closed:
+            subscription.close()
+        self.channels.setdefault(user_id, set()).add(subscription)
+        event_subscribers.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        channel = self.channels.get(subscription.user_id)
+        if channel is None or subscription not in channel:
+            return
+        channel.discard(subscription)
+        if not channel:
+            del self.channels[subscription.user_id]
+        event_subscribers.dec()
+
+    def on_remote(self, prefix: str, callback: Callable[[dict], Awaitable[None]]):
+        """Call ``callback`` for events of types starting with ``prefix`` that
+        other workers produced (this worker's own are handled in place)."""
+        self.remote_listeners.append((prefix, callback))
+
+    def _mark_seen(self, event_id: str) -> bool:
+        if event_id in self._seen:
+            return False
+        self._seen[event_id] = None
+        if len(self._seen) > self._seen_size:
+            self._seen.popitem(last=False)
+        return True
+
+    def publish(self, event: dict, origin: str = "local") -> int:
+        """Queue ``event`` for its user's subscribers; returns how many got it."""
+        if not self._mark_seen(event["id"]):
+            return 0
+        channel = self.channels.get(event.get("user_id"))
+        if not channel:
+            return 0
+        message = public(event)
+        for subscription in channel:
+            subscription.put(message)
+        events_delivered.inc(origin, amount=len(channel))
+        return len(channel)
+
+    async def publish_remote(self, event: dict):
+        if event["id"] in self._seen or event.get("origin") == _origin():
+            return
+        self.publish(event, origin="relay")
+        for prefix, callback in self.remote_listeners:
+            if event["type"].startswith(prefix):
+                try:
+                    await callback(event)
+                except Exception as e:
+                    logger.error(f"Remote event listener for {prefix} failed: {e}")
+
+    def close(self):
+        """End every subscription, current and future (shutdown)."""
+        self.closed = True
+        for channel in self.channels.values():
+            for subscription in channel:
+                subscription.close()
+
+
+bus = EventBus()
+
+
+async def ensure_indexes(db):
+    try:
+        await db.events.create_index("id")
+        try:
+            await db.events.create_index("created_at", expireAfterSeconds=RETENTION_SECONDS)
+        except OperationFailure as e:
+            # IndexOptionsConflict: the index predates the TTL, or the
+            # retention changed; update it in place
+            if e.code != 85:
+                raise
+            await db.command("collMod", "events", index={
+                "keyPattern": {"created_at": 1}, "expireAfterSeconds": RETENTION_SECONDS})
+        await db.events.create_index([("user_id", 1), ("created_at", 1)])
+    except Exception as e:
+        logger.error(f"Could not create event indexes: {e}")
+
+
+async def append(db, events: List[dict]):
+    if not events:
+        return
+    try:
+        await db.events.insert_many(events, ordered=False)
+    except Exception as e:
+        logger.error(f"Could not record {len(events)} events: {e}")
+    for event in events:
+        bus.publish(event)
+
+
+async def since(db, user_id: str, last_event_id: str, limit: int = 100) -> List[dict]:
+    """A user's events after ``last_event_id``, for clients that reconnect."""
+    last = await db.events.find_one({"id": last_event_id, "user_id": user_id}, {"_id": 0, "created_at": 1})
+    if not last:
+        return []
+    return await db.events.find(
+        {"user_id": user_id, **after("created_at", as_datetime(last["created_at"]))}, {"_id": 0}
+    ).sort("created_at", 1).to_list(limit)
+
+
+class Relay:
+    """Hands events other workers wrote to the outbox to the local bus.
+
+    Uses a change stream when MongoDB supports one (replica sets, Atlas)
+    and falls back to polling by ``created_at``; the bus drops events it
+    has already delivered, so the polling overlap is harmless.
+    """
+
+    def __init__(self, db, bus: EventBus, poll_seconds: float = RELAY_POLL_SECONDS,
+                 lookback_seconds: float = RELAY_LOOKBACK_SECONDS):
+        self.db = db
+        self.bus = bus
+        self.poll_seconds = poll_seconds
+        self.lookback = timedelta(seconds=lookback_seconds)
+
+    async def _watch(self):
+        async with self.db.events.watch([{"$match": {"operationType": "insert"}}]) as stream:
+            logger.info("Event relay following the outbox change stream")
+            async for change in stream:
+                await self.bus.publish_remote(change["fullDocument"])
+
+    async def _poll(self):
+        logger.info(f"Event relay polling the outbox every {self.poll_seconds}s")
+        newest = utc_now()
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                cursor = self.db.events.find(
+                    after("created_at", newest - self.lookback), {"_id": 0}
+                ).sort("created_at", 1)
+                async for event in cursor:
+                    await self.bus.publish_remote(event)
+                    newest = max(newest, as_datetime(event["created_at"]) or newest)
+            except Exception as e:
+                logger.error(f"Event relay poll failed: {e}")
+
+    async def run(self):
+        while True:
+            try:
+                await self._watch()
+            except OperationFailure as e:
+                # Standalone servers have no change streams
+                logger.info(f"Outbox change stream unavailable ({e}), polling instead")
+                break
+            except Exception as e:
+                logger.error(f"Outbox change stream failed: {e}")
+                await asyncio.sleep(1)
+        await self._poll()
@@ -0,0 +1,521 @@
+"""Server-authoritative focus sessions.
+
+A session's time is derived from what is stored on its document:
+``elapsed_seconds`` accumulated before the last start/resume, plus the
+time since ``resumed_at`` while ``status`` is ``running``. Completion XP
+is credited for that elapsed time, never for the planned duration alone.
+
+Each worker keeps the running sessions it knows about in a hashed timer
+wheel, which completes them when their planned time is up and sends
+periodic ticks to the WebSocket subscribers of their user. Scheduling and
+cancelling a timer is O(1) and the wheel advances once per ``resolution``
+second, so tens of thousands of timers cost a few dict operations each.
+
+Every transition is an update conditional on the ``resumed_at`` value it
+was computed from, so two workers racing on the same session (a pause
+here, an expiry there) apply exactly one transition; the loser re-reads
+the document. On startup each worker reloads the running sessions from
+Mongo, so timers survive restarts.
+
+Completing a session that was started for a task adds its credited
+minutes to the task's entry in ``task_focus_totals``, so a task list can
+show focus time with one query for all its tasks rather than summing
+sessions per task.
+"""
+import asyncio
+import base64
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import events
+from dates import as_datetime
+
+logger = logging.getLogger(__name__)
+
+RUNNING = "running"
+PAUSED = "paused"
+COMPLETED = "completed"
+ABANDONED = "abandoned"
+
+# Seconds between tick pushes to connected clients, which count down locally in between
+TICK_SECONDS = float(os.environ.get('FOCUS_TICK_SECONDS', '5'))
+# Network and clock slack forgiven when crediting a session completed on time
+GRACE_SECONDS = float(os.environ.get('FOCUS_GRACE_SECONDS', '5'))
+# Queued pushes per WebSocket; a client that falls further behind misses ticks
+SUBSCRIBER_QUEUE = int(os.environ.get('FOCUS_SUBSCRIBER_QUEUE', '32'))
+
+# Explicit statuses only, so sessions from before the timer (no status) never match
+_ACTIVE = {"completed": False, "status": {"$in": [RUNNING, PAUSED]}}
+# All a timer needs; recovered sessions are held with just these
+_TIMER_FIELDS = {"_id": 0, "id": 1, "user_id": 1, "duration_minutes": 1, "task_id": 1, "completed": 1,
+                 "status": 1, "elapsed_seconds": 1, "started_at": 1, "resumed_at": 1}
+
+
+def _now() -> float:
+    return time.time()
+
+
+def _at(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+def _timestamp(value) -> Optional[float]:
+    # A date, or an ISO string from before timestamps were stored as dates
+    moment = as_datetime(value)
+    return moment.timestamp() if moment else None
+
+
+def status_of(doc: dict) -> str:
+    if doc.get("completed"):
+        return COMPLETED
+    # Sessions started before the server timed them have no status. Their
+    # clients kept the time and are long gone: never resume or credit them
+    return doc.get("status") or ABANDONED
+
+
+def elapsed_seconds(doc: dict, now: Optional[float] = None) -> float:
+    elapsed = doc.get("elapsed_seconds") or 0.0
+    if status_of(doc) == RUNNING:
+        since = _timestamp(doc.get("resumed_at") or doc["started_at"])
+        elapsed += max(0.0, (now or _now()) - since)
+    return elapsed
+
+
+def credited_minutes(doc: dict, elapsed: float) -> int:
+    return min(doc["duration_minutes"], int((elapsed + GRACE_SECONDS) // 60))
+
+
+def public_state(doc: dict, now: Optional[float] = None) -> dict:
+    elapsed = elapsed_seconds(doc, now)
+    return {
+        "id": doc["id"],
+        "status": status_of(doc),
+        "duration_minutes": doc["duration_minutes"],
+        "task_id": doc.get("task_id"),
+        "elapsed_seconds": round(elapsed, 1),
+        "remaining_seconds": round(max(0.0, doc["duration_minutes"] * 60 - elapsed), 1),
+    }
+
+
+def encode_cursor(doc: dict) -> str:
+    """Opaque position just past ``doc`` in a user's history, newest first."""
+    started_at = doc["started_at"]
+    # "d:" marks a date; a bare value is a session not yet migrated from an ISO string
+    position = f"d:{started_at.isoformat()}" if isinstance(started_at, datetime) else started_at
+    raw = f"{position}|{doc['id']}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[object, str]]:
+    """``(started_at, id)`` from ``encode_cursor``, or None if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except ValueError:  # binascii.Error and UnicodeDecodeError included
+        return None
+    started_at, sep, session_id = raw.rpartition("|")
+    if not sep or not started_at or not session_id:
+        return None
+    if started_at.startswith("d:"):
+        try:
+            started_at = datetime.fromisoformat(started_at[2:])
+        except ValueError:
+            return None
+    return started_at, session_id
+
+
+async def history_page(db, user_id: str, limit: int,
+                       after: Optional[Tuple[object, str]] = None) -> Tuple[List[dict], Optional[str]]:
+    """Up to ``limit`` sessions older than ``after``, and the cursor of the next page.
+
+    Ordered by ``(started_at, id)`` so sessions started in the same instant
+    are neither repeated nor skipped across pages; the ``(user_id,
+    started_at, id)`` index serves the query without a sort.
+    """
+    query = {"user_id": user_id}
+    if after is not None:
+        started_at, session_id = after
+        query["$or"] = [{"started_at": {"$lt": started_at}},
+                        {"started_at": started_at, "id": {"$lt": session_id}}]
+        if isinstance(started_at, datetime):
+            # Sessions still holding ISO strings sort after every date, newest first
+            query["$or"].append({"started_at": {"$type": "string"}})
+    # One extra document tells whether there is a next page
+    sessions = await db.focus_sessions.find(query, {"_id": 0}).sort(
+        [("started_at", -1), ("id", -1)]
+    ).limit(limit + 1).to_list(limit + 1)
+    if len(sessions) <= limit:
+        return sessions, None
+    sessions = sessions[:limit]
+    return sessions, encode_cursor(sessions[-1])
+
+
+async def task_totals(db, user_id: str, task_ids: Iterable[str]) -> Dict[str, dict]:
+    """Focus totals of each of ``task_ids``, zero for tasks never focused on."""
+    totals = {task_id: {"focus_minutes": 0, "sessions": 0, "last_focused_at": None} for task_id in task_ids}
+    if not totals:
+        return totals
+    cursor = db.task_focus_totals.find(
+        {"user_id": user_id, "task_id": {"$in": list(totals)}},
+        {"_id": 0, "task_id": 1, "focus_minutes": 1, "sessions": 1, "last_focused_at": 1},
+    )
+    async for entry in cursor:
+        totals[entry.pop("task_id")].update(entry)
+    return totals
+
+
+class TimerWheel:
+    """Hashed timing wheel: ``slots`` buckets of ``resolution`` seconds each.
+
+    A timer lands in the bucket of its deadline and stays there until the
+    wheel passes it on the lap its deadline falls in, so timers further
+    out than one lap cost nothing extra until then.
+    """
+
+    def __init__(self, resolution: float = 1.0, slots: int = 512, now: Optional[float] = None):
+        self.resolution = resolution
+        self.slots = slots
+        self._buckets: List[Dict[object, float]] = [{} for _ in range(slots)]
+        self._where: Dict[object, int] = {}
+        self._tick = self._tick_of(_now() if now is None else now)
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, key):
+        return key in self._where
+
+    def _tick_of(self, timestamp: float) -> int:
+        return int(timestamp // self.resolution)
+
+    def schedule(self, key, deadline: float):
+        self.cancel(key)
+        # Never behind the hand, or it would wait a whole lap
+        slot = max(self._tick_of(deadline), self._tick) % self.slots
+        self._buckets[slot][key] = deadline
+        self._where[key] = slot
+
+    def cancel(self, key):
+        slot = self._where.pop(key, None)
+        if slot is not None:
+            del self._buckets[slot][key]
+
+    def advance(self, now: float) -> list:
+        """Move the hand to ``now`` and return the keys that came due."""
+        due = []
+        target = self._tick_of(now)
+        if target < self._tick:
+            # The wall clock stepped back: hold the hand until it catches up
+            return due
+        # After a long stall, one lap visits every bucket
+        first = max(self._tick, target - self.slots + 1)
+        for tick in range(first, target + 1):
+            bucket = self._buckets[tick % self.slots]
+            for key in [k for k, deadline in bucket.items() if deadline <= now]:
+                del bucket[key]
+                del self._where[key]
+                due.append(key)
+        self._tick = target
+        return due
+
+
+class FocusEngine:
+    """Focus session transitions, timers and WebSocket fan-out for one worker.
+
+    ``on_complete(session, credited_minutes, client_id)`` awards the
+    session and returns the reward fields merged into the completion
+    result; ``client_id`` identifies the client that completed it, None
+    when the timer did. ``on_change(user_id)``, if given, is awaited after
+    every transition has been written.
+    """
+
+    def __init__(self, db, on_complete: Callable[[dict, int, Optional[str]], Awaitable[dict]],
+                 tick_seconds: float = TICK_SECONDS, resolution: float = 1.0,
+                 on_change: Optional[Callable[[str], Awaitable]] = None):
+        self.db = db
+        self.on_complete = on_complete
+        self.on_change = on_change
+        self.tick_seconds = tick_seconds
+        self.wheel = TimerWheel(resolution)
+        self.sessions: Dict[str, dict] = {}
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._pending: Set[asyncio.Task] = set()
+
+    async def ensure_indexes(self):
+        try:
+            await self.db.focus_sessions.create_index("id", unique=True)
+            await self.db.focus_sessions.create_index([("completed", 1), ("status", 1)])
+            await self.db.focus_sessions.create_index([("user_id", 1), ("started_at", -1), ("id", -1)])
+            await self.db.task_focus_totals.create_index([("user_id", 1), ("task_id", 1)], unique=True)
+        except Exception as e:
+            logger.error(f"Could not create focus session indexes: {e}")
+
+    # ---- in-memory state ----
+
+    def _track(self, doc: dict):
+        status = status_of(doc)
+        if status not in (RUNNING, PAUSED):
+            self._untrack(doc["id"])
+            return
+        if status == PAUSED and doc["user_id"] not in self.subscribers:
+            # Nothing to time or push until someone resumes it
+            self._untrack(doc["id"])
+            return
+        self.sessions[doc["id"]] = doc
+        if status == RUNNING:
+            started = _timestamp(doc.get("resumed_at") or doc["started_at"])
+            remaining = doc["duration_minutes"] * 60 - (doc.get("elapsed_seconds") or 0.0)
+            self.wheel.schedule(("due", doc["id"]), started + remaining)
+            self._schedule_tick(doc)
+        else:
+            self.wheel.cancel(("due", doc["id"]))
+            self.wheel.cancel(("tick", doc["id"]))
+
+    def _untrack(self, session_id: str):
+        self.sessions.pop(session_id, None)
+        self.wheel.cancel(("due", session_id))
+        self.wheel.cancel(("tick", session_id))
+
+    def _schedule_tick(self, doc: dict):
+        if doc["user_id"] in self.subscribers and self.tick_seconds > 0:
+            self.wheel.schedule(("tick", doc["id"]), _now() + self.tick_seconds)
+
+    def _push(self, user_id: str, message: dict):
+        for queue in self.subscribers.get(user_id, ()):
+            if queue.full():
+                # Slow client: drop its oldest message rather than block the wheel
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    def _publish(self, event_type: str, doc: dict, **extra):
+        self._push(doc["user_id"], {"type": event_type, "session": public_state(doc), **extra})
+
+    async def _record(self, event_type: str, doc: dict, **extra):
+        if self.on_change is not None:
+            await self.on_change(doc["user_id"])
+        self._publish(event_type, doc, **extra)
+        await events.append(self.db, [events.make_event(
+            f"focus.{event_type}", doc["user_id"], {"session_id": doc["id"], **extra}
+        )])
+
+    # ---- transitions ----
+
+    async def _load(self, user_id: str, session_id: str) -> Optional[dict]:
+        return await self.db.focus_sessions.find_one({"id": session_id, "user_id": user_id}, {"_id": 0})
+
+    async def _transition(self, doc: dict, changes: dict) -> Optional[dict]:
+        """Apply ``changes`` unless another transition got there first."""
+        result = await self.db.focus_sessions.update_one(
+            {"id": doc["id"], "completed": False, "resumed_at": doc.get("resumed_at"),
+             "status": {"$in": [RUNNING, PAUSED]}},
+            {"$set": changes},
+        )
+        if not result.modified_count:
+            return None
+        return {**doc, **changes}
+
+    async def start(self, user_id: str, duration_minutes: int, task_id: Optional[str] = None) -> dict:
+        # One active session per user: starting another abandons the rest
+        previous = await self.db.focus_sessions.find(
+            {"user_id": user_id, **_ACTIVE}, {"_id": 0}
+        ).to_list(None)
+        if previous:
+            await self.db.focus_sessions.update_many(
+                {"id": {"$in": [doc["id"] for doc in previous]}, **_ACTIVE},
+                {"$set": {"status": ABANDONED, "resumed_at": None}},
+            )
+            for doc in previous:
+                self._untrack(doc["id"])
+                self._publish(ABANDONED, {**doc, "status": ABANDONED, "resumed_at": None})
+
+        now = _now()
+        doc = {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "duration_minutes": duration_minutes,
+            "task_id": task_id,
+            "completed": False,
+            "xp_earned": 0,
+            "status": RUNNING,
+            "elapsed_seconds": 0.0,
+            "started_at": _at(now),
+            "resumed_at": _at(now),
+            "completed_at": None
+        }
+        await self.db.focus_sessions.insert_one(doc)
+        doc.pop("_id", None)
+        self._track(doc)
+        await self._record("started", doc)
+        return doc
+
+    async def pause(self, user_id: str, session_id: str) -> Optional[dict]:
+        """Pause a running session; None when it isn't running."""
+        doc = await self._load(user_id, session_id)
+        if not doc or status_of(doc) != RUNNING:
+            return None
+        now = _now()
+        elapsed = elapsed_seconds(doc, now)
+        if elapsed >= doc["duration_minutes"] * 60:
+            # Already over: finish it instead, crediting the planned time
+            return await self.complete(user_id, session_id)
+        doc = await self._transition(doc, {
+            "status": PAUSED, "elapsed_seconds": elapsed, "resumed_at": None, "paused_at": _at(now)
+        })
+        if doc:
+            self._track(doc)
+            await self._record(PAUSED, doc)
+        return doc
+
+    async def resume(self, user_id: str, session_id: str) -> Optional[dict]:
+        """Resume a paused session; None when it isn't paused."""
+        doc = await self._load(user_id, session_id)
+        if not doc or status_of(doc) != PAUSED:
+            return None
+        doc = await self._transition(doc, {"status": RUNNING, "resumed_at": _at(_now()), "paused_at": None})
+        if doc:
+            self._track(doc)
+            await self._record("resumed", doc)
+        return doc
+
+    async def abandon(self, user_id: str, session_id: str) -> Optional[dict]:
+        doc = await self._load(user_id, session_id)
+        if not doc or status_of(doc) not in (RUNNING, PAUSED):
+            return None
+        elapsed = elapsed_seconds(doc)
+        doc = await self._transition(doc, {"status": ABANDONED, "elapsed_seconds": elapsed, "resumed_at": None})
+        if doc:
+            self._untrack(doc["id"])
+            await self._record(ABANDONED, doc)
+        return doc
+
+    async def complete(self, user_id: str, session_id: str, doc: Optional[dict] = None,
+                       client_id: Optional[str] = None) -> Optional[dict]:
+        """Complete an active session and award the time actually focused.
+
+        Returns the completed session merged with ``on_complete``'s reward;
+        None when the session is not active (anymore).
+        """
+        doc = doc or await self._load(user_id, session_id)
+        if not doc or status_of(doc) not in (RUNNING, PAUSED):
+            return None
+        now = _now()
+        elapsed = elapsed_seconds(doc, now)
+        minutes = credited_minutes(doc, elapsed)
+        doc = await self._transition(doc, {
+            "completed": True, "status": COMPLETED, "elapsed_seconds": round(elapsed, 1),
+            "xp_earned": minutes * 2, "completed_at": _at(now)
+        })
+        if doc is None:
+            return None
+        self._untrack(doc["id"])
+        if doc.get("task_id"):
+            # Only the transition above succeeds once per session, so this counts it once
+            await self.db.task_focus_totals.update_one(
+                {"user_id": doc["user_id"], "task_id": doc["task_id"]},
+                {"$inc": {"focus_minutes": minutes, "sessions": 1},
+                 "$max": {"last_focused_at": doc["completed_at"]}},
+                upsert=True,
+            )
+        reward = await self.on_complete(doc, minutes, client_id)
+        await self._record(COMPLETED, doc, credited_minutes=minutes, **reward)
+        return {**doc, "credited_minutes": minutes, **reward}
+
+    async def _expire(self, session_id: str):
+        doc = self.sessions.get(session_id)
+        if doc is None:
+            return
+        try:
+            if await self.complete(doc["user_id"], session_id, doc=doc) is None:
+                # Changed on another worker since we loaded it: pick up its state
+                fresh = await self._load(doc["user_id"], session_id)
+                if fresh:
+                    self._track(fresh)
+                else:
+                    self._untrack(session_id)
+        except Exception as e:
+            logger.error(f"Could not complete focus session {session_id}: {e}")
+
+    async def refresh(self, event: dict):
+        """Adopt a transition another worker made (a ``focus.*`` event)."""
+        session_id = event["data"].get("session_id")
+        if session_id not in self.sessions and event["user_id"] not in self.subscribers:
+            return
+        doc = await self._load(event["user_id"], session_id)
+        if doc is None:
+            return
+        self._track(doc)
+        extra = {k: v for k, v in event["data"].items() if k != "session_id"}
+        self._publish(event["type"].split(".", 1)[1], doc, **extra)
+
+    # ---- subscribers ----
+
+    async def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE)
+        self.subscribers.setdefault(user_id, set()).add(queue)
+        active = await self.db.focus_sessions.find({"user_id": user_id, **_ACTIVE}, {"_id": 0}).to_list(None)
+        for doc in active:
+            self._track(doc)
+        queue.put_nowait({"type": "state", "sessions": [public_state(doc) for doc in active]})
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        queues = self.subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if queues:
+            return
+        del self.subscribers[user_id]
+        for session_id, doc in list(self.sessions.items()):
+            if doc["user_id"] == user_id:
+                self.wheel.cancel(("tick", session_id))
+                if status_of(doc) == PAUSED:
+                    self._untrack(session_id)
+
+    # ---- background ----
+
+    async def recover(self, batch_size: int = 1000) -> int:
+        """Reload every running session, e.g. after a restart."""
+        recovered = 0
+        cursor = self.db.focus_sessions.find(
+            {"completed": False, "status": RUNNING}, _TIMER_FIELDS
+        ).batch_size(batch_size)
+        async for doc in cursor:
+            self._track(doc)
+            recovered += 1
+        return recovered
+
+    def _fire(self, keys: list):
+        expired = []
+        for kind, session_id in keys:
+            doc = self.sessions.get(session_id)
+            if doc is None:
+                continue
+            if kind == "due":
+                expired.append(session_id)
+            else:
+                self._publish("tick", doc)
+                self._schedule_tick(doc)
+        if expired:
+            task = asyncio.create_task(self._expire_all(expired))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    async def _expire_all(self, session_ids: List[str], concurrency: int = 64):
+        for i in range(0, len(session_ids), concurrency):
+            await asyncio.gather(*(self._expire(s) for s in session_ids[i:i + concurrency]))
+
+    async def run(self, batch_size: int = 1000):
+        try:
+            logger.info(f"Recovered {await self.recover(batch_size)} running focus sessions")
+        except Exception as e:
+            logger.error(f"Could not recover focus sessions: {e}")
+        while True:
+            await asyncio.sleep(self.wheel.resolution - _now() % self.wheel.resolution)
+            try:
+                self._fire(self.wheel.advance(_now()))
+            except Exception as e:
+                logger.error(f"Focus timer wheel failed: {e}")
@@ -0,0 +1,89 @@
+"""Production launcher: gunicorn master with one uvicorn worker per CPU.
+
+    cd backend && gunicorn -c gunicorn.conf.py server:app
+
+Environment:
+
+    PORT                      listen port (default 8001)
+    WEB_CONCURRENCY           worker count (default: CPUs available to the process)
+    GUNICORN_MAX_REQUESTS     requests before a worker is recycled (default 10000, 0 disables)
+    GUNICORN_TIMEOUT          seconds a silent worker is allowed before it is killed (default 60)
+    METRICS_DIR               where workers share metric snapshots (default: a temp dir)
+    FORWARDED_ALLOW_IPS       proxy addresses trusted for X-Forwarded-* headers (default 127.0.0.1)
+
+The app is preloaded in the master, so imports, the static asset manifest
+and other module-level state are built once and shared copy-on-write.
+Everything that needs a connection or an event loop (the Mongo pool,
+caches, the metrics flusher) is created per worker in the app lifespan.
+"""
+import itertools
+import math
+import os
+import shutil
+import tempfile
+
+
+def available_cpus() -> int:
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    # Honour a cgroup v2 CPU quota (containers often see every host core)
+    try:
+        quota, period = open("/sys/fs/cgroup/cpu.max").read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8001')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Each uvicorn worker runs an event loop, so one per core is enough
+workers = int(os.environ.get("WEB_CONCURRENCY") or available_cpus())
+if os.environ.get("DB_BACKEND", "").lower() == "memory" or os.environ.get("MONGO_URL", "").startswith("memory://"):
+    # The in-memory database lives inside a single process
+    workers = 1
+
+preload_app = True
+
+# Recycle workers periodically to bound memory growth; the jitter keeps
+# them from all restarting at the same moment
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = max_requests // 10
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+# Seconds in-flight requests get to finish after SIGTERM, before SIGKILL
+graceful_timeout = int(float(os.environ.get("SHUTDOWN_DRAIN_SECONDS", "10"))) + 5
+keepalive = 5
+
+# Addresses of the proxies trusted to set X-Forwarded-For/-Proto. Never
+# "*": uvicorn would then take the client address from the leftmost
+# X-Forwarded-For entry, which the client writes itself. Render's proxy
+# addresses are not fixed, so the rate limiter reads the header on its
+# own there (RATE_LIMIT_PROXY_HOPS)
+forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+accesslog = None
+errorlog = "-"
+
+metrics_dir = os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), "cyberfocus-metrics"))
+
+
+def on_starting(server):
+    # Drop snapshots left behind by a previous run
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def pre_fork(server, worker):
+    # Give each worker the lowest free slot number, so a recycled worker
+    # takes over its predecessor's worker="N" label instead of adding a new one
+    taken = {getattr(w, "slot", None) for w in server.WORKERS.values()}
+    worker.slot = next(i for i in itertools.count() if i not in taken)
+
+
+def post_fork(server, worker):
+    os.environ["WORKER_ID"] = str(worker.slot)
@@ -0,0 +1,97 @@
+"""Daily background jobs, run once per UTC day across all workers.
+
+Each job is an ``async def job(db, today, batch_size, on_batch) -> dict``.
+Every worker checks periodically whether today's run is still pending;
+a lease on the job's document in the ``jobs`` collection lets exactly one
+process run it, and the lease is renewed after every batch so a crashed
+run is picked up by another process once it expires.
+"""
+import asyncio
+import logging
+import os
+import random
+import socket
+import uuid
+from datetime import date, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from dates import before, utc_now
+
+logger = logging.getLogger(__name__)
+
+Job = Callable[..., Awaitable[dict]]
+
+
+def utc_today() -> date:
+    return utc_now().date()
+
+
+def _owner() -> str:
+    # Unique per run, so a manual run can't piggyback on a scheduled one
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+async def acquire_lease(db, job_id: str, owner: str, seconds: float, today: Optional[date] = None) -> bool:
+    """Take the job lease unless another owner holds it or today's run is done.
+
+    With ``today`` None the completion check is skipped (manual runs).
+    """
+    now = utc_now()
+    # Leases taken by the previous release are ISO strings, released ones ""
+    query = {"_id": job_id, **before("lease_expires_at", now)}
+    if today is not None:
+        query["completed_for"] = {"$ne": today.isoformat()}
+    try:
+        job = await db.jobs.find_one_and_update(
+            query,
+            {"$set": {"owner": owner, "lease_expires_at": now + timedelta(seconds=seconds)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # The job document exists but didn't match: leased or already done
+        return False
+    return job is not None
+
+
+async def run_with_lease(db, job_id: str, job: Job, today: Optional[date] = None, force: bool = False,
+                         lease_seconds: float = 300.0, batch_size: int = 1000) -> Optional[dict]:
+    """Run ``job`` for ``today`` if this process gets the lease; None if not."""
+    today = today or utc_today()
+    owner = _owner()
+    if not await acquire_lease(db, job_id, owner, lease_seconds, None if force else today):
+        return None
+
+    async def renew(stats):
+        await db.jobs.update_one(
+            {"_id": job_id, "owner": owner},
+            {"$set": {"lease_expires_at": utc_now() + timedelta(seconds=lease_seconds)}}
+        )
+
+    try:
+        stats = await job(db, today, batch_size=batch_size, on_batch=renew)
+        await db.jobs.update_one(
+            {"_id": job_id, "owner": owner},
+            {"$set": {"completed_for": today.isoformat(), "last_stats": stats}}
+        )
+        logger.info(f"Job {job_id} finished: {stats}")
+        return stats
+    finally:
+        # Expired as of now
+        await db.jobs.update_one({"_id": job_id, "owner": owner}, {"$set": {"lease_expires_at": utc_now()}})
+
+
+async def scheduler(db, jobs: Dict[str, Job], interval: float, batch_size: int = 1000):
+    """Try each pending daily job every ``interval`` seconds."""
+    # Spread the first attempt of workers started together
+    await asyncio.sleep(random.uniform(0, min(interval, 60)))
+    while True:
+        for job_id, job in jobs.items():
+            try:
+                await run_with_lease(db, job_id, job, batch_size=batch_size)
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {e}")
+        await asyncio.sleep(interval)
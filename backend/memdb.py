@@ -0,0 +1,849 @@
+"""In-memory, Motor-compatible database for tests, CI and benchmarks.
+
+Implements the subset of the Motor/pymongo API used by the app: cursors
+with sort/skip/limit/projection/to_list, find_one, insert_one/insert_many,
+update_one/update_many (with upsert), find_one_and_update, delete_one/
+delete_many, bulk_write, count_documents, create_index (unique indexes are
+enforced and used for equality lookups) and aggregate with
+$match/$group/$sort/$skip/$limit/$project/$count.
+
+Each operation runs synchronously but yields to the event loop once, like
+a network round trip would, so concurrent requests still interleave.
+Benchmarks can set ``ROUND_TRIP_SECONDS`` to make that yield take as long
+as a real round trip. Command listeners passed as ``event_listeners`` are
+told about every operation, as if it had taken one round trip, so
+monitoring costs the same work as against MongoDB.
+Handler cost can be measured without network I/O. Not thread-safe and not
+persistent.
+"""
+import asyncio
+import copy
+import itertools
+import re
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, ReturnDocument, UpdateMany, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+_MISSING = object()
+
+# $type aliases the app queries by
+_BSON_TYPES = {"string": str, "date": datetime, "bool": bool, "object": dict, "array": list,
+               "objectId": ObjectId, "null": type(None)}
+
+# Simulated network latency per operation
+ROUND_TRIP_SECONDS = 0.0
+
+# Operation -> the command it is sent as, for command listeners
+_COMMAND_NAMES = {
+    "find": "find", "find_one": "find", "count_documents": "aggregate", "aggregate": "aggregate",
+    "insert_one": "insert", "insert_many": "insert", "update_one": "update", "update_many": "update",
+    "find_one_and_update": "findAndModify", "delete_one": "delete", "delete_many": "delete",
+    "bulk_write": "update",
+}
+
+
+# ============ QUERY MATCHING ============
+
+def _get_path(doc, path: str):
+    value = doc
+    for part in path.split("."):
+        if isinstance(value, dict):
+            value = value.get(part, _MISSING)
+        elif isinstance(value, list) and part.isdigit():
+            index = int(part)
+            value = value[index] if index < len(value) else _MISSING
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def _as_utc(value):
+    # BSON dates carry no zone: a naive datetime is stored as UTC, like pymongo does
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _compare(value, target, op) -> bool:
+    if value is _MISSING or value is None or target is None:
+        return False
+    try:
+        return op(_as_utc(value), _as_utc(target))
+    except TypeError:
+        # Mongo only compares values within the same type bracket
+        return False
+
+
+def _equals(value, target) -> bool:
+    if value is _MISSING:
+        return target is None
+    if isinstance(value, list) and not isinstance(target, list):
+        return _as_utc(target) in [_as_utc(item) for item in value]
+    return _as_utc(value) == _as_utc(target)
+
+
+def _match_operator(value, op: str, arg, query: dict) -> bool:
+    if op == "$eq":
+        return _equals(value, arg)
+    if op == "$ne":
+        return not _equals(value, arg)
+    if op == "$gt":
+        return _compare(value, arg, lambda a, b: a > b)
+    if op == "$gte":
+        return _compare(value, arg, lambda a, b: a >= b)
+    if op == "$lt":
+        return _compare(value, arg, lambda a, b: a < b)
+    if op == "$lte":
+        return _compare(value, arg, lambda a, b: a <= b)
+    if op == "$in":
+        return any(_equals(value, a) for a in arg)
+    if op == "$nin":
+        return not any(_equals(value, a) for a in arg)
+    if op == "$exists":
+        return (value is not _MISSING) == bool(arg)
+    if op == "$regex":
+        if not isinstance(value, str):
+            return False
+        flags = re.IGNORECASE if "i" in query.get("$options", "") else 0
+        pattern = arg if isinstance(arg, re.Pattern) else re.compile(arg, flags)
+        return pattern.search(value) is not None
+    if op == "$options":
+        return True
+    if op == "$type":
+        aliases = arg if isinstance(arg, list) else [arg]
+        return value is not _MISSING and any(type(value) is _BSON_TYPES.get(alias) for alias in aliases)
+    if op == "$not":
+        return not _match_value(value, arg)
+    raise OperationFailure(f"memdb: unsupported query operator {op}")
+
+
+def _match_value(value, condition) -> bool:
+    if isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+        return all(_match_operator(value, op, arg, condition) for op, arg in condition.items())
+    if isinstance(condition, re.Pattern):
+        return isinstance(value, str) and condition.search(value) is not None
+    return _equals(value, condition)
+
+
+def matches(doc: dict, query: Optional[dict]) -> bool:
+    if not query:
+        return True
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, q) for q in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, q) for q in condition):
+                return False
+        elif key == "$nor":
+            if any(matches(doc, q) for q in condition):
+                return False
+        elif not _match_value(_get_path(doc, key), condition):
+            return False
+    return True
+
+
+# ============ PROJECTION / SORT / UPDATE ============
+
+def _copy(value):
+    # Scalars (strings, numbers, dates, ObjectIds) are immutable; only containers need a copy
+    return copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+
+
+def _clone(doc: dict) -> dict:
+    return {k: _copy(v) for k, v in doc.items()}
+
+
+def project(doc: dict, projection) -> dict:
+    if not projection:
+        return _clone(doc)
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+
+    include_id = projection.get("_id", 1)
+    fields = {k: v for k, v in projection.items() if k != "_id"}
+    if fields and all(fields.values()):
+        out = {}
+        if include_id and "_id" in doc:
+            out["_id"] = doc["_id"]
+        for field in fields:
+            value = _get_path(doc, field)
+            if value is not _MISSING and "." not in field:
+                out[field] = _copy(value)
+        return out
+
+    out = _clone(doc)
+    for field, flag in projection.items():
+        if not flag:
+            out.pop(field, None)
+    return out
+
+
+def _sort_key(value):
+    # None/missing sort first, then numbers, strings, everything else
+    if value is _MISSING or value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (4, value)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, value)
+
+
+def sort_documents(docs: List[dict], spec: List[Tuple[str, int]]) -> List[dict]:
+    for field, direction in reversed(spec):
+        docs.sort(key=lambda d: _sort_key(_get_path(d, field)), reverse=direction < 0)
+    return docs
+
+
+def _normalize_sort(key_or_list, direction=None) -> List[Tuple[str, int]]:
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction if direction is not None else 1)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return list(key_or_list)
+
+
+def _set_path(doc: dict, path: str, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+
+def _unset_path(doc: dict, path: str):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(parts[-1], None)
+
+
+def apply_update(doc: dict, update: dict, inserting: bool = False):
+    if not any(k.startswith("$") for k in update):
+        # Replacement document
+        keep_id = doc.get("_id")
+        doc.clear()
+        doc.update(copy.deepcopy(update))
+        if keep_id is not None:
+            doc["_id"] = keep_id
+        return
+
+    for op, fields in update.items():
+        for path, arg in fields.items():
+            current = _get_path(doc, path)
+            if op == "$set":
+                _set_path(doc, path, _copy(arg))
+            elif op == "$setOnInsert":
+                if inserting:
+                    _set_path(doc, path, _copy(arg))
+            elif op == "$unset":
+                _unset_path(doc, path)
+            elif op == "$inc":
+                _set_path(doc, path, (0 if current is _MISSING else current) + arg)
+            elif op == "$mul":
+                _set_path(doc, path, (0 if current is _MISSING else current) * arg)
+            elif op == "$max":
+                # Across types, by BSON sort order (a date beats a string)
+                if current is _MISSING or _sort_key(arg) > _sort_key(current):
+                    _set_path(doc, path, arg)
+            elif op == "$min":
+                if current is _MISSING or _sort_key(arg) < _sort_key(current):
+                    _set_path(doc, path, arg)
+            elif op == "$push":
+                values = list(current) if isinstance(current, list) else []
+                if isinstance(arg, dict) and "$each" in arg:
+                    values.extend(arg["$each"])
+                    if "$slice" in arg:
+                        values = values[arg["$slice"]:] if arg["$slice"] < 0 else values[:arg["$slice"]]
+                else:
+                    values.append(arg)
+                _set_path(doc, path, values)
+            elif op == "$addToSet":
+                values = list(current) if isinstance(current, list) else []
+                if arg not in values:
+                    values.append(arg)
+                _set_path(doc, path, values)
+            else:
+                raise OperationFailure(f"memdb: unsupported update operator {op}")
+
+
+def _upsert_seed(query: dict) -> dict:
+    seed = {}
+    for key, value in query.items():
+        if key.startswith("$"):
+            continue
+        if isinstance(value, dict) and any(k.startswith("$") for k in value):
+            if "$eq" in value:
+                _set_path(seed, key, value["$eq"])
+            continue
+        _set_path(seed, key, _copy(value))
+    return seed
+
+
+# ============ AGGREGATION ============
+
+def _eval_expr(doc: dict, expr):
+    if isinstance(expr, str) and expr.startswith("$"):
+        value = _get_path(doc, expr[1:])
+        return None if value is _MISSING else value
+    if isinstance(expr, dict):
+        if len(expr) == 1:
+            op, arg = next(iter(expr.items()))
+            if op == "$ifNull":
+                value = _eval_expr(doc, arg[0])
+                return _eval_expr(doc, arg[1]) if value is None else value
+            if op == "$cond":
+                cond, then, other = arg if isinstance(arg, list) else (arg["if"], arg["then"], arg["else"])
+                return _eval_expr(doc, then) if _eval_expr(doc, cond) else _eval_expr(doc, other)
+            if op == "$eq":
+                return _eval_expr(doc, arg[0]) == _eval_expr(doc, arg[1])
+            if op == "$substr":
+                value = _eval_expr(doc, arg[0])
+                return str(value)[arg[1]:arg[1] + arg[2]] if value is not None else ""
+            if op == "$add":
+                return sum(_eval_expr(doc, a) or 0 for a in arg)
+        return {k: _eval_expr(doc, v) for k, v in expr.items()}
+    return expr
+
+
+def _group(docs: Iterable[dict], spec: dict) -> List[dict]:
+    groups: Dict[Any, dict] = {}
+    id_expr = spec["_id"]
+    for doc in docs:
+        key = _eval_expr(doc, id_expr)
+        hashable = repr(key)
+        group = groups.get(hashable)
+        if group is None:
+            group = groups[hashable] = {"_id": key}
+            for field, acc in spec.items():
+                if field == "_id":
+                    continue
+                op = next(iter(acc))
+                group[field] = {"$sum": 0, "$push": [], "$addToSet": []}.get(op)
+                if op == "$avg":
+                    group[field] = [0, 0]
+        for field, acc in spec.items():
+            if field == "_id":
+                continue
+            op, arg = next(iter(acc.items()))
+            value = _eval_expr(doc, arg)
+            if op == "$sum":
+                group[field] += value if isinstance(value, (int, float)) and not isinstance(value, bool) else 0
+            elif op == "$avg":
+                if isinstance(value, (int, float)):
+                    group[field][0] += value
+                    group[field][1] += 1
+            elif op == "$max":
+                if value is not None and (group[field] is None or value > group[field]):
+                    group[field] = value
+            elif op == "$min":
+                if value is not None and (group[field] is None or value < group[field]):
+                    group[field] = value
+            elif op == "$first":
+                if field not in group or group[field] is None:
+                    group[field] = value
+            elif op == "$last":
+                group[field] = value
+            elif op == "$push":
+                group[field].append(value)
+            elif op == "$addToSet":
+                if value not in group[field]:
+                    group[field].append(value)
+            else:
+                raise OperationFailure(f"memdb: unsupported accumulator {op}")
+
+    out = list(groups.values())
+    for group in out:
+        for field, acc in spec.items():
+            if field != "_id" and next(iter(acc)) == "$avg":
+                total, count = group[field]
+                group[field] = total / count if count else None
+    return out
+
+
+def run_pipeline(docs: List[dict], pipeline: List[dict]) -> List[dict]:
+    for stage in pipeline:
+        name, arg = next(iter(stage.items()))
+        if name == "$match":
+            docs = [d for d in docs if matches(d, arg)]
+        elif name == "$group":
+            docs = _group(docs, arg)
+        elif name == "$sort":
+            docs = sort_documents(list(docs), list(arg.items()))
+        elif name == "$limit":
+            docs = docs[:arg]
+        elif name == "$skip":
+            docs = docs[arg:]
+        elif name == "$project":
+            computed = {k: v for k, v in arg.items() if not isinstance(v, (int, bool))}
+            flags = {k: v for k, v in arg.items() if isinstance(v, (int, bool))}
+            projected = []
+            for d in docs:
+                out = project(d, flags) if flags else ({"_id": d.get("_id")} if computed else _clone(d))
+                for field, expr in computed.items():
+                    out[field] = _eval_expr(d, expr)
+                projected.append(out)
+            docs = projected
+        elif name == "$count":
+            docs = [{arg: len(docs)}] if docs else []
+        else:
+            raise OperationFailure(f"memdb: unsupported pipeline stage {name}")
+    return docs
+
+
+# ============ RESULTS ============
+
+class InsertOneResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+        self.acknowledged = True
+
+
+class InsertManyResult:
+    def __init__(self, inserted_ids):
+        self.inserted_ids = inserted_ids
+        self.acknowledged = True
+
+
+class UpdateResult:
+    def __init__(self, matched_count: int, modified_count: int, upserted_id=None):
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+        self.upserted_id = upserted_id
+        self.acknowledged = True
+
+
+class DeleteResult:
+    def __init__(self, deleted_count: int):
+        self.deleted_count = deleted_count
+        self.acknowledged = True
+
+
+class BulkWriteResult:
+    def __init__(self):
+        self.inserted_count = 0
+        self.matched_count = 0
+        self.modified_count = 0
+        self.deleted_count = 0
+        self.upserted_count = 0
+        self.upserted_ids: Dict[int, Any] = {}
+        self.acknowledged = True
+
+
+# ============ CURSORS ============
+
+class MemoryCursor:
+    def __init__(self, collection: "MemoryCollection", query, projection):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort: List[Tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = _normalize_sort(key_or_list, direction)
+        return self
+
+    def skip(self, count: int):
+        self._skip = count
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def batch_size(self, count: int):
+        return self
+
+    def _results(self) -> List[dict]:
+        docs = [d for d in self._collection._candidates(self._query) if matches(d, self._query)]
+        if self._sort:
+            docs = sort_documents(docs, self._sort)
+        docs = docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        return [project(d, self._projection) for d in docs]
+
+    async def to_list(self, length: Optional[int] = None) -> List[dict]:
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        results = self._results()
+        return results[:length] if length else results
+
+    def __aiter__(self):
+        self._iter = iter(self._results())
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class MemoryAggregateCursor:
+    def __init__(self, docs: List[dict]):
+        self._docs = docs
+
+    async def to_list(self, length: Optional[int] = None) -> List[dict]:
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        return self._docs[:length] if length else self._docs
+
+    def __aiter__(self):
+        self._iter = iter(self._docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+# ============ COLLECTION / DATABASE / CLIENT ============
+
+class CommandEvent:
+    """The attributes of pymongo's command started/succeeded events that listeners read."""
+
+    __slots__ = ("command_name", "command", "database_name", "request_id", "duration_micros")
+
+    def __init__(self, command_name: str, command: dict, database_name: str, request_id: int):
+        self.command_name = command_name
+        self.command = command
+        self.database_name = database_name
+        self.request_id = request_id
+        self.duration_micros = int(ROUND_TRIP_SECONDS * 1e6)
+
+
+class MemoryCollection:
+    def __init__(self, database: "MemoryDatabase", name: str):
+        self.database = database
+        self.name = name
+        self._docs: Dict[Any, dict] = {}
+        self._unique: Dict[str, Tuple[str, ...]] = {}
+        self._unique_keys: Dict[str, Dict[tuple, Any]] = {}
+
+    def _count(self, op: str, filter: Optional[dict] = None):
+        self.database.op_counts[(self.name, op)] += 1
+        client = self.database.client
+        if client.command_listeners:
+            client.notify(self.database.name, self.name, op, filter)
+
+    def _index_key(self, doc: dict, fields: Tuple[str, ...]):
+        return tuple(repr(_get_path(doc, f)) for f in fields)
+
+    def _check_unique(self, doc: dict, ignore_id=None):
+        if doc.get("_id") in self._docs and doc.get("_id") != ignore_id:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: _id_", 11000)
+        for index_name, fields in self._unique.items():
+            owner = self._unique_keys[index_name].get(self._index_key(doc, fields))
+            if owner is not None and owner != ignore_id:
+                raise DuplicateKeyError(
+                    f"E11000 duplicate key error collection: {self.name} index: {index_name}", 11000)
+
+    def _store(self, doc: dict, previous: Optional[dict] = None):
+        for index_name, fields in self._unique.items():
+            keys = self._unique_keys[index_name]
+            if previous is not None:
+                keys.pop(self._index_key(previous, fields), None)
+            keys[self._index_key(doc, fields)] = doc["_id"]
+        self._docs[doc["_id"]] = doc
+
+    def _remove(self, _id):
+        doc = self._docs.pop(_id)
+        for index_name, fields in self._unique.items():
+            self._unique_keys[index_name].pop(self._index_key(doc, fields), None)
+
+    def _candidates(self, filter: Optional[dict]) -> Iterable[dict]:
+        """Documents that may match ``filter``: one, when it pins a unique key."""
+        if filter:
+            _id = filter.get("_id", _MISSING)
+            if _id is not _MISSING and not isinstance(_id, dict):
+                return [self._docs[_id]] if _id in self._docs else []
+            for index_name, fields in self._unique.items():
+                if len(fields) == 1 and fields[0] in filter and not isinstance(filter[fields[0]], dict):
+                    owner = self._unique_keys[index_name].get((repr(filter[fields[0]]),))
+                    return [self._docs[owner]] if owner is not None else []
+        return list(self._docs.values())
+
+    def _insert(self, doc: dict):
+        if "_id" not in doc:
+            doc["_id"] = ObjectId()
+        stored = _clone(doc)
+        self._check_unique(stored)
+        self._store(stored)
+        return stored["_id"]
+
+    # ----- reads -----
+
+    def find(self, filter: Optional[dict] = None, projection=None, sort=None, limit: int = 0, skip: int = 0):
+        self._count("find", filter)
+        cursor = MemoryCursor(self, filter, projection).skip(skip).limit(limit)
+        return cursor.sort(sort) if sort else cursor
+
+    async def find_one(self, filter: Optional[dict] = None, projection=None, sort=None):
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        self._count("find_one", filter)
+        cursor = MemoryCursor(self, filter, projection).limit(1)
+        if sort:
+            cursor.sort(sort)
+        results = cursor._results()
+        return results[0] if results else None
+
+    async def count_documents(self, filter: Optional[dict] = None, **kwargs) -> int:
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        self._count("count_documents", filter)
+        return sum(1 for d in self._docs.values() if matches(d, filter))
+
+    async def estimated_document_count(self) -> int:
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        return len(self._docs)
+
+    def aggregate(self, pipeline: List[dict], **kwargs):
+        self._count("aggregate")
+        return MemoryAggregateCursor(run_pipeline(list(self._docs.values()), pipeline))
+
+    async def distinct(self, key: str, filter: Optional[dict] = None):
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        values = []
+        for d in self._docs.values():
+            if matches(d, filter):
+                value = _get_path(d, key)
+                if value is not _MISSING and value not in values:
+                    values.append(value)
+        return values
+
+    # ----- writes -----
+
+    async def insert_one(self, document: dict):
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        self._count("insert_one")
+        return InsertOneResult(self._insert(document))
+
+    async def insert_many(self, documents: List[dict], ordered: bool = True):
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        self._count("insert_many")
+        inserted, errors = [], []
+        for index, document in enumerate(documents):
+            try:
+                inserted.append(self._insert(document))
+            except DuplicateKeyError as e:
+                errors.append({"index": index, "code": 11000, "errmsg": str(e), "op": document})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(inserted)})
+        return InsertManyResult(inserted)
+
+    def _upsert(self, filter: dict, update: dict):
+        doc = _upsert_seed(filter)
+        apply_update(doc, update, inserting=True)
+        return self._insert(doc)
+
+    def _update_doc(self, doc: dict, update: dict) -> bool:
+        updated = _clone(doc)
+        apply_update(updated, update)
+        if updated == doc:
+            return False
+        self._check_unique(updated, ignore_id=doc["_id"])
+        self._store(updated, previous=doc)
+        return True
+
+    def _update_one(self, filter: dict, update: dict, upsert: bool) -> UpdateResult:
+        for doc in self._candidates(filter):
+            if matches(doc, filter):
+                return UpdateResult(1, int(self._update_doc(doc, update)))
+        if upsert:
+            return UpdateResult(0, 0, self._upsert(filter, update))
+        return UpdateResult(0, 0)
+
+    def _update_many(self, filter: dict, update: dict, upsert: bool) -> UpdateResult:
+        targets = [d for d in self._candidates(filter) if matches(d, filter)]
+        modified = sum(self._update_doc(d, update) for d in targets)
+        if not targets and upsert:
+            return UpdateResult(0, 0, self._upsert(filter, update))
+        return UpdateResult(len(targets), modified)
+
+    async def update_one(self, filter: dict, update: dict, upsert: bool = False):
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        self._count("update_one", filter)
+        return self._update_one(filter, update, upsert)
+
+    async def update_many(self, filter: dict, update: dict, upsert: bool = False):
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        self._count("update_many", filter)
+        return self._update_many(filter, update, upsert)
+
+    async def replace_one(self, filter: dict, replacement: dict, upsert: bool = False):
+        return await self.update_one(filter, replacement, upsert=upsert)
+
+    async def find_one_and_update(self, filter: dict, update: dict, projection=None, sort=None,
+                                  upsert: bool = False, return_document=ReturnDocument.BEFORE, **kwargs):
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        self._count("find_one_and_update", filter)
+        docs = [d for d in self._docs.values() if matches(d, filter)]
+        if sort:
+            docs = sort_documents(docs, _normalize_sort(sort))
+        if docs:
+            before = docs[0]
+            self._update_doc(before, update)
+            result = self._docs[before["_id"]] if return_document == ReturnDocument.AFTER else before
+            return project(result, projection)
+        if upsert:
+            inserted_id = self._upsert(filter, update)
+            return project(self._docs[inserted_id], projection) if return_document == ReturnDocument.AFTER else None
+        return None
+
+    def _delete(self, filter: dict, limit: int = 0) -> int:
+        doomed = [doc["_id"] for doc in self._candidates(filter) if matches(doc, filter)]
+        if limit:
+            doomed = doomed[:limit]
+        for _id in doomed:
+            self._remove(_id)
+        return len(doomed)
+
+    async def delete_one(self, filter: dict):
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        self._count("delete_one", filter)
+        return DeleteResult(self._delete(filter, limit=1))
+
+    async def delete_many(self, filter: dict):
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        self._count("delete_many", filter)
+        return DeleteResult(self._delete(filter))
+
+    async def bulk_write(self, requests: List[Any], ordered: bool = True):
+        """Apply pymongo write models (UpdateOne, InsertOne, ...) in one round trip."""
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        self._count("bulk_write")
+        result, errors = BulkWriteResult(), []
+        for index, request in enumerate(requests):
+            try:
+                if isinstance(request, InsertOne):
+                    self._insert(request._doc)
+                    result.inserted_count += 1
+                    continue
+                if isinstance(request, (DeleteOne, DeleteMany)):
+                    result.deleted_count += self._delete(request._filter, limit=int(isinstance(request, DeleteOne)))
+                    continue
+                if isinstance(request, (UpdateOne, ReplaceOne)):
+                    update = self._update_one(request._filter, request._doc, bool(request._upsert))
+                elif isinstance(request, UpdateMany):
+                    update = self._update_many(request._filter, request._doc, bool(request._upsert))
+                else:
+                    raise OperationFailure(f"memdb: unsupported bulk operation {type(request).__name__}")
+            except DuplicateKeyError as e:
+                errors.append({"index": index, "code": 11000, "errmsg": str(e), "op": request})
+                if ordered:
+                    break
+                continue
+            result.matched_count += update.matched_count
+            result.modified_count += update.modified_count
+            if update.upserted_id is not None:
+                result.upserted_count += 1
+                result.upserted_ids[index] = update.upserted_id
+        if errors:
+            raise BulkWriteError({
+                "writeErrors": errors,
+                "nInserted": result.inserted_count,
+                "nMatched": result.matched_count,
+                "nModified": result.modified_count,
+                "nRemoved": result.deleted_count,
+                "nUpserted": result.upserted_count,
+            })
+        return result
+
+    # ----- indexes -----
+
+    async def create_index(self, keys, unique: bool = False, name: Optional[str] = None, **kwargs) -> str:
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        fields = tuple(field for field, _ in _normalize_sort(keys, 1))
+        index_name = name or "_".join(f"{field}_1" for field in fields)
+        if unique and index_name not in self._unique:
+            keys = {}
+            for doc in self._docs.values():
+                key = self._index_key(doc, fields)
+                if key in keys:
+                    raise DuplicateKeyError(
+                        f"E11000 duplicate key error collection: {self.name} index: {index_name}", 11000)
+                keys[key] = doc["_id"]
+            self._unique[index_name] = fields
+            self._unique_keys[index_name] = keys
+        return index_name
+
+    async def drop(self):
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        self._docs.clear()
+        self._unique.clear()
+        self._unique_keys.clear()
+
+
+class MemoryDatabase:
+    def __init__(self, client: "MemoryClient", name: str):
+        self.client = client
+        self.name = name
+        self._collections: Dict[str, MemoryCollection] = {}
+        # (collection, operation) -> count, for benchmarks that count queries
+        self.op_counts: Counter = Counter()
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = MemoryCollection(self, name)
+        return collection
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    async def command(self, command, **kwargs):
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        name = command if isinstance(command, str) else next(iter(command))
+        if name == "ping":
+            return {"ok": 1.0}
+        raise OperationFailure(f"memdb: unsupported command {name}")
+
+    async def list_collection_names(self) -> List[str]:
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        return list(self._collections)
+
+
+class MemoryClient:
+    def __init__(self, *args, event_listeners=None, **kwargs):
+        self._databases: Dict[str, MemoryDatabase] = {}
+        self.admin = self["admin"]
+        self.command_listeners = [listener for listener in event_listeners or ()
+                                  if isinstance(listener, monitoring.CommandListener)]
+        self._request_ids = itertools.count(1)
+
+    def notify(self, database: str, collection: str, op: str, filter: Optional[dict]):
+        """Report one operation to the command listeners, started and succeeded."""
+        name = _COMMAND_NAMES[op]
+        event = CommandEvent(name, {name: collection, "filter": filter or {}}, database, next(self._request_ids))
+        for listener in self.command_listeners:
+            listener.started(event)
+        for listener in self.command_listeners:
+            listener.succeeded(event)
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        database = self._databases.get(name)
+        if database is None:
+            database = self._databases[name] = MemoryDatabase(self, name)
+        return database
+
+    def get_database(self, name: str) -> MemoryDatabase:
+        return self[name]
+
+    def close(self):
+        pass
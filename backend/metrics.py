@@ -0,0 +1,448 @@
+"""Minimal Prometheus instrumentation for the API.
+
+Metrics are plain Python objects updated in-process and rendered in the
+Prometheus text exposition format on scrape. The request middleware is a
+raw ASGI wrapper, and neither it nor the MongoDB command listener
+aggregates on the hot path: each appends a tuple to a ``Backlog``, which is
+folded into the metrics every ``BACKLOG_SIZE`` observations and before
+every render.
+
+Under a multi-worker launcher every worker process has its own registry.
+When ``METRICS_DIR`` is set, each worker periodically writes a snapshot of
+its samples, labelled with ``worker="<WORKER_ID>"``, to that directory, and
+a scrape served by any worker merges the snapshots of all of them.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLM_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+# Observations buffered by a Backlog before they are folded into metrics
+BACKLOG_SIZE = int(os.environ.get("METRICS_BACKLOG_SIZE", "1024"))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: Tuple[str, ...] = ()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs.extend(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+# (name, documentation, type, sample lines)
+Family = Tuple[str, str, str, List[str]]
+
+
+def _render_families(families: Iterable[Family]) -> str:
+    lines = []
+    for name, documentation, kind, samples in families:
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def samples(self, extra: Tuple[str, ...] = ()) -> List[Tuple[str, str, float]]:
+        raise NotImplementedError
+
+    def families(self, extra: Tuple[str, ...] = ()) -> List[Family]:
+        lines = [f"{self.name}{suffix}{labels} {value}" for suffix, labels, value in self.samples(extra)]
+        return [(self.name, self.documentation, self.kind, lines)]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self, extra=()):
+        return [("", _format_labels(self.labelnames, k, extra), v) for k, v in sorted(self.values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def set(self, *labels, value: float):
+        self.values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self.values: Dict[Tuple, List[float]] = {}
+
+    def observe(self, value: float, *labels):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self, extra=()):
+        out = []
+        for key, series in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                out.append(("_bucket", _format_labels(self.labelnames, key, extra + (f'le="{bound}"',)), cumulative))
+            out.append(("_count", _format_labels(self.labelnames, key, extra), cumulative))
+            out.append(("_sum", _format_labels(self.labelnames, key, extra), series[-1]))
+        return out
+
+
+class CacheStats(Metric):
+    """Collects hit/miss counters from registered cache objects on scrape.
+
+    Every in-process cache also declares how it stays coherent across
+    worker processes, exported as ``cache_coherence_info``:
+
+    - ``immutable``: content is fixed for the lifetime of a deploy, so
+      per-worker copies can never disagree.
+    - ``ttl``: writes invalidate the cache of the worker that handled
+      them; other workers serve the old entry for at most ``ttl`` seconds.
+    """
+    kind = "counter"
+
+    def __init__(self):
+        super().__init__("cache_requests_total", "Cache lookups by cache and result", ("cache", "result"))
+        self.caches = {}
+        self.coherence: Dict[str, Tuple[str, Optional[float]]] = {}
+
+    def register(self, name: str, cache, coherence: str, ttl: Optional[float] = None):
+        if cache is not None:
+            self.caches[name] = cache
+        self.coherence[name] = (coherence, ttl)
+
+    def samples(self, extra=()):
+        out = []
+        for name, cache in sorted(self.caches.items()):
+            out.append(("", _format_labels(self.labelnames, (name, "hit"), extra), cache.hits))
+            out.append(("", _format_labels(self.labelnames, (name, "miss"), extra), cache.misses))
+        return out
+
+    def families(self, extra=()):
+        ratios = []
+        for name, cache in sorted(self.caches.items()):
+            total = cache.hits + cache.misses
+            ratios.append(f'cache_hit_ratio{_format_labels(("cache",), (name,), extra)} {cache.hits / total if total else 0}')
+        coherence = [
+            f'cache_coherence_info{_format_labels(("cache", "strategy", "ttl_seconds"), (name, strategy, ttl or 0), extra)} 1'
+            for name, (strategy, ttl) in sorted(self.coherence.items())
+        ]
+        return super().families(extra) + [
+            ("cache_hit_ratio", "Fraction of cache lookups served from the cache", "gauge", ratios),
+            ("cache_coherence_info", "Cross-worker coherence strategy of each in-process cache", "gauge", coherence),
+        ]
+
+
+class Backlog:
+    """Raw observations recorded on the hot path and aggregated in batches.
+
+    Recording is one append to ``items``, which is atomic, so pymongo's
+    executor threads need no lock either; recorders call ``drain()`` once it
+    holds ``size`` of them. ``fold`` gets the batch then and whenever the
+    registry collects.
+    """
+
+    def __init__(self, fold: Callable[[List[tuple]], None], size: int = BACKLOG_SIZE):
+        self.fold = fold
+        self.size = size
+        self.items = deque()
+        self._lock = threading.Lock()
+
+    def drain(self):
+        with self._lock:
+            items = self.items
+            # Only drain() pops, so the length can only grow meanwhile
+            batch = [items.popleft() for _ in range(len(items))]
+            if batch:
+                self.fold(batch)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self.backlogs: List[Backlog] = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def backlog(self, fold: Callable[[List[tuple]], None]) -> Backlog:
+        backlog = Backlog(fold)
+        self.backlogs.append(backlog)
+        return backlog
+
+    def collect(self):
+        """Fold every backlog into its metrics."""
+        for backlog in self.backlogs:
+            backlog.drain()
+
+    def families(self, extra: Tuple[str, ...] = ()) -> List[Family]:
+        self.collect()
+        out = []
+        for metric in self.metrics:
+            out.extend(metric.families(extra))
+        return out
+
+    def render(self) -> str:
+        return _render_families(self.families())
+
+
+class WorkerSnapshots:
+    """Shares per-worker samples through one JSON file per worker.
+
+    Files are replaced atomically, so a scrape never reads a partial
+    snapshot. Snapshots of other workers are at most ``interval`` seconds
+    old; the worker serving the scrape writes its own first.
+    """
+
+    def __init__(self, directory: str, worker_id: str, interval: float = 5.0):
+        self.directory = Path(directory)
+        self.worker_id = worker_id
+        self.interval = interval
+        self.path = self.directory / f"worker-{worker_id}.json"
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def write(self, registry: Registry):
+        families = registry.families((f'worker="{_escape(self.worker_id)}"',))
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(families))
+        os.replace(tmp, self.path)
+
+    def render(self, registry: Registry) -> str:
+        self.write(registry)
+        merged: Dict[str, Family] = {}
+        for path in sorted(self.directory.glob("worker-*.json")):
+            try:
+                families = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            for name, documentation, kind, lines in families:
+                if name not in merged:
+                    merged[name] = (name, documentation, kind, [])
+                merged[name][3].extend(lines)
+        return _render_families(merged.values())
+
+    async def run(self, registry: Registry):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.write(registry)
+            except OSError as e:
+                logging.getLogger(__name__).warning(f"Could not write metrics snapshot: {e}")
+
+
+REGISTRY = Registry()
+
+http_requests = REGISTRY.add(Counter(
+    "http_requests_total", "HTTP requests by method, route and status", ("method", "route", "status")))
+http_latency = REGISTRY.add(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by method and route", ("method", "route")))
+http_in_flight = REGISTRY.add(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served"))
+mongo_latency = REGISTRY.add(Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency by collection and command",
+    ("collection", "command")))
+mongo_failures = REGISTRY.add(Counter(
+    "mongodb_command_failures_total", "Failed MongoDB commands by collection and command",
+    ("collection", "command")))
+llm_latency = REGISTRY.add(Histogram(
+    "llm_request_duration_seconds", "LLM call latency by model and outcome", ("model", "outcome"),
+    buckets=LLM_BUCKETS))
+llm_tokens = REGISTRY.add(Counter(
+    "llm_tokens_total", "LLM tokens by model and direction (estimated from text length)",
+    ("model", "direction")))
+cache_stats = REGISTRY.add(CacheStats())
+process_start = REGISTRY.add(Gauge(
+    "process_start_time_seconds", "Start time of the worker process since the epoch"))
+
+http_in_flight.set(value=0)
+process_start.set(value=time.time())
+
+COHERENCE_IMMUTABLE = "immutable"
+COHERENCE_TTL = "ttl"
+
+
+def register_cache(name: str, cache, coherence: str, ttl: Optional[float] = None):
+    """Export a cache's hit/miss counters and declare its coherence strategy.
+
+    ``cache`` may be None for caches that don't count lookups.
+    """
+    cache_stats.register(name, cache, coherence, ttl)
+
+
+def worker_snapshots() -> Optional[WorkerSnapshots]:
+    """Snapshot writer for this worker, or None outside a multi-worker launch.
+
+    Read at startup rather than import time: with a preloaded app the
+    module is imported by the master before WORKER_ID is assigned.
+    """
+    directory = os.environ.get("METRICS_DIR")
+    if not directory:
+        return None
+    process_start.set(value=time.time())
+    worker_id = os.environ.get("WORKER_ID") or str(os.getpid())
+    return WorkerSnapshots(directory, worker_id, float(os.environ.get("METRICS_FLUSH_SECONDS", "5")))
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text with GPT-style tokenizers
+    return (len(text) + 3) // 4
+
+
+def observe_llm_call(model: str, seconds: float, prompt: str, completion: str = "", outcome: str = "ok"):
+    llm_latency.observe(seconds, model, outcome)
+    llm_tokens.inc(model, "prompt", amount=estimate_tokens(prompt))
+    if completion:
+        llm_tokens.inc(model, "completion", amount=estimate_tokens(completion))
+
+
+# ASGI scope of the HTTP request being served. Motor runs pymongo on
+# executor threads with a copy of the caller's context, so the value is
+# visible inside command listeners.
+current_request: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("current_request", default=None)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency, status and in-flight requests.
+
+    Routes are labelled by their path template (``/api/tasks/{task_id}``)
+    rather than the raw path, to keep label cardinality bounded. The
+    request is also published in ``current_request`` for the query profiler.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths = None
+        self.backlog = REGISTRY.backlog(self._fold)
+
+    def _route_label(self, app, endpoint) -> str:
+        if endpoint is None:
+            return "unmatched"
+        if self._route_paths is None:
+            self._route_paths = {
+                route.endpoint: route.path
+                for route in app.routes if hasattr(route, "endpoint")
+            }
+        return self._route_paths.get(endpoint, "unmatched")
+
+    def _fold(self, batch: List[tuple]):
+        for scope, status_code, elapsed in batch:
+            route = self._route_label(scope["app"], scope.get("endpoint"))
+            http_latency.observe(elapsed, scope["method"], route)
+            http_requests.inc(scope["method"], route, status_code)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+
+        # A plain function returning send's awaitable: no coroutine per message
+        def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            return send(message)
+
+        in_flight = http_in_flight.values
+        in_flight[()] += 1
+        token = current_request.set(scope)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_request.reset(token)
+            in_flight[()] -= 1
+            backlog = self.backlog
+            backlog.items.append((scope, status_code, elapsed))
+            if len(backlog.items) >= backlog.size:
+                backlog.drain()
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Times every MongoDB command, grouped by collection and command name.
+
+    pymongo invokes listeners on Motor's executor threads; commands are
+    recorded in a ``Backlog`` as they are, and only looked into when it is
+    folded. Commands are also fed to ``profiler`` (see query_profiler.py)
+    from here rather than registering it as a second listener, so each
+    command is dispatched and tracked once: slow ones are handed over at
+    once, and one in ``profiler.sample_every`` is reduced to its shape and
+    aggregated when the batch is folded.
+    """
+
+    def __init__(self, profiler=None):
+        self.profiler = profiler
+        self.slow_micros = profiler.slow_micros if profiler is not None else float("inf")
+        self.backlog = REGISTRY.backlog(self._fold)
+        self._pending: Dict[int, dict] = {}
+        self._folded = 0
+
+    def started(self, event):
+        self._pending[event.request_id] = event.command
+
+    def succeeded(self, event, failed: bool = False):
+        command = self._pending.pop(event.request_id, None)
+        micros = event.duration_micros
+        if micros >= self.slow_micros:
+            self.profiler.log_slow(self.profiler.shape(event.command_name, command or {}), micros / 1e6, failed,
+                                   event.database_name)
+        backlog = self.backlog
+        backlog.items.append((event.command_name, command, micros, failed))
+        if len(backlog.items) >= backlog.size:
+            backlog.drain()
+
+    def failed(self, event):
+        self.succeeded(event, failed=True)
+
+    def _fold(self, batch: List[tuple]):
+        profiler = self.profiler
+        for command_name, command, micros, failed in batch:
+            command = command or {}
+            collection = command.get(command_name)
+            if not isinstance(collection, str):
+                collection = "-"
+            seconds = micros / 1e6
+            mongo_latency.observe(seconds, collection, command_name)
+            if failed:
+                mongo_failures.inc(collection, command_name)
+            if profiler is not None:
+                self._folded += 1
+                if self._folded % profiler.sample_every == 0:
+                    profiler.record(profiler.shape(command_name, command), seconds, failed)
@@ -0,0 +1,191 @@
+"""Online migration of ISO-8601 string timestamps to BSON dates.
+
+Runs as the ``date_migration`` daily job (see jobs.py), so exactly one
+worker converts at a time while the app keeps serving. It can also be run
+by hand:
+
+    python migrations.py [--rate 500] [--batch-size 1000] [--restart]
+
+Each collection is walked newest first, by ``_id``, in batches of
+documents that still hold a string in one of their ``DATE_FIELDS``.
+Converted documents are the newest ones, and new writes are dates too.
+Remaining strings are always older, and BSON sorts every string before
+every date, so time-sorted lists stay in order throughout.
+
+Every update is conditional on the string it replaces, so a concurrent
+write wins over the migration. The position reached is saved in the
+``migrations`` collection after every batch, and a run that is
+interrupted resumes from there. ``--rate`` caps the documents walked per
+second to leave the database headroom for traffic. Progress is logged
+after every batch.
+
+A collection is marked done once its walk reaches the oldest document.
+Workers still running the previous release during a rolling deploy may
+write strings after that. Readers accept them (see dates.py), and
+``--restart`` walks every collection again to convert them.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from datetime import date
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+
+import jobs
+from database import create_client
+from dates import as_datetime, utc_now
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_DOCS_PER_SECOND = float(os.environ.get('MIGRATION_DOCS_PER_SECOND', '500'))
+
+# collection -> fields holding instants
+DATE_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "users": ("created_at", "tokens_revoked_at"),
+    "tasks": ("created_at", "completed_at"),
+    # Not resumed_at: focus transitions are conditional on its stored value,
+    # and it is rewritten (or cleared) by the session's next transition anyway
+    "focus_sessions": ("started_at", "paused_at", "completed_at"),
+    "task_focus_totals": ("last_focused_at",),
+    "chat_history": ("timestamp",),
+    "admin_quests": ("created_at",),
+    "events": ("created_at",),
+    "news": ("created_at",),
+    "learning_content": ("created_at",),
+    "learning_completions": ("completed_at",),
+    "quest_completions": ("completed_at",),
+    "music_tracks": ("created_at",),
+    "refresh_tokens": ("created_at",),
+}
+
+
+def _state_id(collection: str) -> str:
+    return f"dates.{collection}"
+
+
+def _conversion(doc: dict, fields: Tuple[str, ...]) -> Optional[UpdateOne]:
+    changes = {}
+    for field in fields:
+        value = doc.get(field)
+        if isinstance(value, str):
+            converted = as_datetime(value)
+            # Unparseable values are left as they are, for a person to look at
+            if converted is not None:
+                changes[field] = converted
+    if not changes:
+        return None
+    # Only if none of the fields changed since we read them
+    return UpdateOne({"_id": doc["_id"], **{field: doc[field] for field in changes}}, {"$set": changes})
+
+
+async def migrate_collection(db, name: str, fields: Tuple[str, ...], batch_size: int = 1000,
+                             rate: float = MIGRATION_DOCS_PER_SECOND, on_batch=None) -> dict:
+    """Convert ``fields`` of ``name`` from ISO strings to dates, resuming where the last run stopped."""
+    state = await db.migrations.find_one({"_id": _state_id(name)}) or {}
+    stats = {"scanned": 0, "converted": 0, "batches": 0, "done": bool(state.get("done"))}
+    if stats["done"]:
+        return stats
+
+    collection = db[name]
+    pending = {"$or": [{field: {"$type": "string"}} for field in fields]}
+    last_id = state.get("last_id")
+    remaining = await collection.count_documents(
+        pending if last_id is None else {**pending, "_id": {"$lt": last_id}}
+    )
+    started = time.perf_counter()
+
+    while True:
+        query = pending if last_id is None else {**pending, "_id": {"$lt": last_id}}
+        batch_started = time.perf_counter()
+        batch = await collection.find(query, {field: 1 for field in fields}).sort(
+            "_id", -1
+        ).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+
+        ops = [op for op in (_conversion(doc, fields) for doc in batch) if op is not None]
+        converted = 0
+        if ops:
+            result = await collection.bulk_write(ops, ordered=False)
+            converted = result.modified_count
+        stats["converted"] += converted
+        stats["scanned"] += len(batch)
+        stats["batches"] += 1
+        last_id = batch[-1]["_id"]
+        await db.migrations.update_one(
+            {"_id": _state_id(name)},
+            {"$set": {"last_id": last_id, "updated_at": utc_now()},
+             "$inc": {"scanned": len(batch), "converted": converted}},
+            upsert=True,
+        )
+
+        elapsed = time.perf_counter() - started
+        done_share = stats["scanned"] / remaining if remaining else 1.0
+        eta = elapsed / done_share - elapsed if done_share else 0.0
+        logger.info(f"Migrating {name} dates: {stats['scanned']}/{remaining} "
+                    f"({min(done_share, 1.0):.0%}), {stats['converted']} converted, ~{eta:.0f}s left")
+        if on_batch:
+            await on_batch(stats)
+        if rate > 0:
+            # Throttle: at most ``rate`` documents per second, on average
+            await asyncio.sleep(max(0.0, len(batch) / rate - (time.perf_counter() - batch_started)))
+
+    await db.migrations.update_one(
+        {"_id": _state_id(name)},
+        {"$set": {"done": True, "finished_at": utc_now()}, "$unset": {"last_id": ""}},
+        upsert=True,
+    )
+    stats["done"] = True
+    return stats
+
+
+async def run(db, today: Optional[date] = None, batch_size: int = 1000, on_batch=None,
+              rate: float = MIGRATION_DOCS_PER_SECOND) -> dict:
+    """Convert string timestamps in every collection of ``DATE_FIELDS``.
+
+    Collections already done cost one lookup each, so the daily job is
+    free once the migration has finished.
+    """
+    stats = {}
+    for name, fields in DATE_FIELDS.items():
+        stats[name] = await migrate_collection(db, name, fields, batch_size, rate, on_batch)
+    return stats
+
+
+async def restart(db):
+    """Forget progress, so the next run walks every collection again."""
+    await db.migrations.delete_many({"_id": {"$in": [_state_id(name) for name in DATE_FIELDS]}})
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=MIGRATION_DOCS_PER_SECOND,
+                        help="documents converted per second at most, 0 for no limit")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--restart", action="store_true", help="walk collections already done again")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = create_client(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    db = client[os.environ.get('DB_NAME', 'cyberfocus')]
+    if args.restart:
+        await restart(db)
+
+    async def job(db, today, batch_size, on_batch):
+        return await run(db, today, batch_size, on_batch, rate=args.rate)
+
+    # The same lease as the daily job, so the two never run at once
+    stats = await jobs.run_with_lease(db, "date_migration", job, force=True, batch_size=args.batch_size)
+    if stats is None:
+        logger.error("The date migration is already running elsewhere")
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
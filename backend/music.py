@@ -0,0 +1,141 @@
+"""Music catalog: built-in tracks merged with admin-added ones, indexed by category."""
+import hashlib
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from caching import CachedBody, SingleFlight, content_hash, dumps
+
+_VIDEO_ID = re.compile(r"^[A-Za-z0-9_-]{11}$")
+_YOUTUBE_HOSTS = {"youtube.com", "youtube-nocookie.com", "music.youtube.com"}
+_ID_PATH_PREFIXES = ("/embed/", "/shorts/", "/live/", "/v/")
+# Category of tracks stored without one
+UNCATEGORIZED = "uncategorized"
+
+
+def _category_tag(category: Optional[str]) -> str:
+    # Categories are free text, and ETags must be latin-1 without quotes
+    if category is None:
+        return "all"
+    return hashlib.sha256(category.encode()).hexdigest()[:16]
+
+
+def youtube_video_id(url: str) -> Optional[str]:
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    for prefix in ("www.", "m."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+
+    candidate = None
+    if host == "youtu.be":
+        candidate = parts.path.lstrip("/").split("/")[0]
+    elif host in _YOUTUBE_HOSTS:
+        if parts.path == "/watch":
+            candidate = parse_qs(parts.query).get("v", [None])[0]
+        elif parts.path.startswith(_ID_PATH_PREFIXES):
+            candidate = parts.path.split("/")[2]
+
+    if candidate and _VIDEO_ID.match(candidate):
+        return candidate
+    return None
+
+
+def _require_http_url(url: str, field: str) -> str:
+    url = url.strip()
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.netloc:
+        raise ValueError(f"Invalid {field}: must be an http(s) URL")
+    return url
+
+
+def canonicalize_track(url: str, thumbnail: Optional[str]) -> Tuple[str, str]:
+    """Return the canonical (url, thumbnail) pair for a track.
+
+    YouTube links of any shape (youtu.be, /embed/, /shorts/, m.youtube.com,
+    extra query params) are rewritten to the plain watch URL, and a missing
+    thumbnail is filled in from the video id. Raises ValueError otherwise.
+    """
+    video_id = youtube_video_id(url)
+    if video_id:
+        url = f"https://www.youtube.com/watch?v={video_id}"
+        if not thumbnail:
+            thumbnail = f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg"
+    else:
+        url = _require_http_url(url, "url")
+
+    if thumbnail:
+        thumbnail = _require_http_url(thumbnail, "thumbnail")
+    return url, thumbnail or ""
+
+
+class MusicCatalog:
+    """Merged catalog rebuilt only when tracks change.
+
+    Every category list (and the full list, under ``None``) is kept both as
+    Python objects for pagination and as a pre-serialized body with its
+    ETag. The catalog is reloaded after ``ttl`` seconds as well so that
+    tracks added through another process show up.
+    """
+
+    def __init__(self, defaults: List[dict], ttl: float = 60.0):
+        self.defaults = defaults
+        self.ttl = ttl
+        self.version = ""
+        self.hits = 0
+        self.misses = 0
+        self._tracks: Dict[Optional[str], List[dict]] = {}
+        self._bodies: Dict[Optional[str], CachedBody] = {}
+        self._expires_at = 0.0
+        self._reloads = SingleFlight()
+
+    @property
+    def stale(self) -> bool:
+        return time.monotonic() >= self._expires_at
+
+    async def refresh(self, collection):
+        custom_tracks = await collection.find({}, {"_id": 0}).to_list(1000)
+        self.rebuild(self.defaults + custom_tracks)
+
+    async def ensure_fresh(self, collection):
+        if self.stale:
+            self.misses += 1
+            # Requests arriving while the catalog reloads share that reload
+            await self._reloads.do("refresh", lambda: self.refresh(collection))
+        else:
+            self.hits += 1
+
+    def rebuild(self, tracks: List[dict]):
+        index: Dict[Optional[str], List[dict]] = {None: list(tracks)}
+        for track in tracks:
+            index.setdefault(track.get("category") or UNCATEGORIZED, []).append(track)
+
+        self.version = content_hash(tracks)
+        self._tracks = index
+        self._bodies = {
+            category: CachedBody(f'"{self.version}-{_category_tag(category)}"', dumps(items), self.ttl)
+            for category, items in index.items()
+        }
+        self._expires_at = time.monotonic() + self.ttl
+
+    def invalidate(self):
+        self._expires_at = 0.0
+
+    @property
+    def categories(self) -> List[str]:
+        return sorted(c for c in self._tracks if c is not None)
+
+    def tracks(self, category: Optional[str] = None) -> List[dict]:
+        return self._tracks.get(category, [])
+
+    def body(self, category: Optional[str] = None) -> CachedBody:
+        entry = self._bodies.get(category)
+        if entry is None:
+            entry = CachedBody(f'"{self.version}-{_category_tag(category)}"', b"[]", self.ttl)
+        return entry
+
+    def page(self, category: Optional[str], offset: int, limit: int) -> CachedBody:
+        items = self.tracks(category)[offset:offset + limit]
+        etag = f'"{self.version}-{_category_tag(category)}-{offset}-{limit}"'
+        return CachedBody(etag, dumps(items), self.ttl)
@@ -0,0 +1,182 @@
+"""Query-shape profiler and slow-query log for the Motor client.
+
+Every command is reduced to a shape that keeps the collection, the
+operation and the queried field names (with operators) but drops values,
+e.g. ``tasks.count_documents{user_id,completed,completed_at:$regex}``.
+Counts and latency percentiles are aggregated per shape; commands slower
+than the threshold are written to the ``cyberfocus.slowquery`` logger as
+one JSON object per line, tagged with the HTTP request that issued them.
+The profiler is fed by ``metrics.MongoCommandListener``.
+
+Reducing a command to its shape is most of the profiler's cost, so only
+one command in ``sample_every`` is aggregated, weighted by that many;
+counts and totals are estimates. Slow commands are always logged.
+"""
+import json
+import logging
+import threading
+from collections import deque
+from typing import Dict, List
+
+from metrics import current_request
+
+slow_query_logger = logging.getLogger("cyberfocus.slowquery")
+
+SAMPLE_SIZE = 512
+
+
+def _filter_shape(query) -> str:
+    if not isinstance(query, dict):
+        return ""
+    parts = []
+    for key, value in query.items():
+        if key in ("$or", "$and", "$nor") and isinstance(value, list):
+            parts.append(key + "[" + "|".join(_filter_shape(q) for q in value) + "]")
+        elif isinstance(value, dict) and value and all(k.startswith("$") for k in value):
+            parts.append(key + ":" + "".join(sorted(value)))
+        else:
+            parts.append(key)
+    return ",".join(parts)
+
+
+def _pipeline_shape(pipeline) -> str:
+    stages = []
+    for stage in pipeline or []:
+        if not isinstance(stage, dict) or not stage:
+            continue
+        name = next(iter(stage))
+        if name == "$match":
+            stages.append("$match{" + _filter_shape(stage[name]) + "}")
+        else:
+            stages.append(name)
+    return "[" + ",".join(stages) + "]"
+
+
+def _is_count_pipeline(pipeline) -> bool:
+    # Collection.count_documents() is sent as [$match, $group{_id: 1, n: {$sum: 1}}]
+    return (
+        isinstance(pipeline, list) and len(pipeline) >= 2
+        and "$match" in pipeline[0] and "$group" in pipeline[-1]
+        and pipeline[-1]["$group"].get("_id") == 1 and "n" in pipeline[-1]["$group"]
+    )
+
+
+def command_shape(command_name: str, command) -> str:
+    collection = command.get(command_name)
+    if not isinstance(collection, str):
+        return command_name
+
+    if command_name == "find":
+        op = "find_one" if command.get("limit") == 1 and command.get("singleBatch") else "find"
+        shape = f"{collection}.{op}{{{_filter_shape(command.get('filter', {}))}}}"
+        if command.get("sort"):
+            shape += ".sort(" + ",".join(command["sort"]) + ")"
+        return shape
+
+    if command_name == "aggregate":
+        pipeline = command.get("pipeline")
+        if _is_count_pipeline(pipeline):
+            return f"{collection}.count_documents{{{_filter_shape(pipeline[0]['$match'])}}}"
+        return f"{collection}.aggregate{_pipeline_shape(pipeline)}"
+
+    if command_name == "update":
+        update = (command.get("updates") or [{}])[0]
+        op = "update_many" if update.get("multi") else "update_one"
+        fields = _filter_shape(update.get("q", {}))
+        ops = ",".join(sorted(k for k in update.get("u", {}) if k.startswith("$")))
+        upsert = ".upsert" if update.get("upsert") else ""
+        return f"{collection}.{op}{{{fields}}}{upsert}({ops})"
+
+    if command_name == "delete":
+        delete = (command.get("deletes") or [{}])[0]
+        op = "delete_one" if delete.get("limit") == 1 else "delete_many"
+        return f"{collection}.{op}{{{_filter_shape(delete.get('q', {}))}}}"
+
+    if command_name == "insert":
+        return f"{collection}.insert"
+
+    return f"{collection}.{command_name}"
+
+
+class ShapeStats:
+    __slots__ = ("count", "failures", "total", "max", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.failures = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=SAMPLE_SIZE)
+
+    def record(self, seconds: float, failed: bool, weight: int = 1):
+        self.count += weight
+        self.failures += failed * weight
+        self.total += seconds * weight
+        if seconds > self.max:
+            self.max = seconds
+        self.samples.append(seconds)
+
+    def percentile(self, ordered: List[float], q: float) -> float:
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self) -> dict:
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "failures": self.failures,
+            "total_ms": round(self.total * 1000, 3),
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0,
+            "p50_ms": round(self.percentile(ordered, 0.50) * 1000, 3),
+            "p95_ms": round(self.percentile(ordered, 0.95) * 1000, 3),
+            "p99_ms": round(self.percentile(ordered, 0.99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class QueryProfiler:
+    """Aggregates MongoDB command latency per query shape.
+
+    Percentiles are computed over the last ``SAMPLE_SIZE`` executions of
+    each shape so memory stays bounded on long-running processes.
+    """
+
+    def __init__(self, slow_ms: float = 100.0, sample_every: int = 1):
+        self.slow_ms = slow_ms
+        self.slow_micros = slow_ms * 1000
+        self.sample_every = max(1, sample_every)
+        self.shapes: Dict[str, ShapeStats] = {}
+        self._lock = threading.Lock()
+
+    def shape(self, command_name: str, command: dict) -> str:
+        return command_shape(command_name, command)
+
+    def record(self, shape: str, seconds: float, failed: bool):
+        """Aggregate one sampled command."""
+        with self._lock:
+            stats = self.shapes.get(shape)
+            if stats is None:
+                stats = self.shapes[shape] = ShapeStats()
+            stats.record(seconds, failed, self.sample_every)
+
+    def log_slow(self, shape: str, seconds: float, failed: bool, database: str):
+        request = current_request.get()
+        slow_query_logger.warning(json.dumps({
+            "event": "slow_query",
+            "shape": shape,
+            "duration_ms": round(seconds * 1000, 3),
+            "route": f"{request['method']} {request['path']}" if request else None,
+            "failed": failed,
+            "database": database,
+        }))
+
+    def top(self, limit: int = 20, sort: str = "total_ms") -> List[dict]:
+        with self._lock:
+            rows = [{"shape": shape, **stats.summary()} for shape, stats in self.shapes.items()]
+        rows.sort(key=lambda row: row.get(sort, 0), reverse=True)
+        return rows[:limit]
+
+    def reset(self):
+        with self._lock:
+            self.shapes.clear()
@@ -0,0 +1,213 @@
+"""Request rate limiting for expensive routes (bcrypt, LLM calls).
+
+Each limited route belongs to a group with a ``Limit`` of ``count``
+requests per ``period`` seconds, allowing bursts of up to ``count``.
+Clients are keyed by user id when the request carries a valid token and
+by IP otherwise; groups listed in ``per_ip`` (login and register) are
+always keyed by IP, so a token cannot buy a fresh bucket.
+
+Behind a proxy, ``proxy_hops`` is the number of proxies that append to
+X-Forwarded-For. The client IP is the entry the outermost of them added,
+counted from the right: entries further left come from the client and
+can be anything.
+
+Buckets use GCRA, the "virtual scheduling" form of a token bucket: a key
+stores only the theoretical arrival time (TAT) of its next request. A
+request is allowed when ``TAT - now`` is within the burst tolerance, and
+pushes TAT one emission interval further. A key whose TAT is in the past
+has a full bucket, which is the same as having no entry, so expired keys
+are dropped by an occasional sweep instead of per-key timers.
+
+``MemoryBuckets`` is per process. ``MongoBuckets`` shares the same state
+between workers through one conditional upsert per request.
+"""
+import logging
+import math
+import os
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from caching import dumps
+from metrics import REGISTRY, Counter
+
+logger = logging.getLogger(__name__)
+
+_time = time.time
+
+rate_limited = REGISTRY.add(Counter(
+    "rate_limited_requests_total", "Requests rejected by the rate limiter, by route group", ("group",)))
+
+
+class Limit:
+    """``count`` requests per ``period`` seconds, in bursts of up to ``count``."""
+
+    __slots__ = ("count", "period", "interval", "tolerance")
+
+    def __init__(self, count: int, period: float):
+        self.count = count
+        self.period = period
+        # Seconds one request "costs", and how far TAT may run ahead of now
+        # (the burst minus the request itself); precomputed for the hot path
+        self.interval = period / count
+        self.tolerance = period - self.interval
+
+    def __repr__(self):
+        return f"Limit({self.count}/{self.period:g}s)"
+
+
+def parse_limit(value: str) -> Optional[Limit]:
+    """``"10/60"`` -> 10 requests per 60 seconds; ``"0"`` or empty disables."""
+    value = (value or "").strip()
+    if value in ("", "0"):
+        return None
+    count, _, period = value.partition("/")
+    return Limit(int(count), float(period or 1))
+
+
+class MemoryBuckets:
+    """Per-process GCRA state: key -> TAT (seconds since the epoch)."""
+
+    def __init__(self, sweep_interval: float = 60.0):
+        self.tat: Dict[str, float] = {}
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.time() + sweep_interval
+
+    async def ensure_indexes(self):
+        pass
+
+    def _sweep(self, now: float):
+        self._next_sweep = now + self.sweep_interval
+        for key in [k for k, tat in self.tat.items() if tat <= now]:
+            del self.tat[key]
+
+    def hit(self, key: str, limit: Limit, now: Optional[float] = None) -> float:
+        """Take one request from ``key``'s bucket; 0.0 if allowed, else seconds to wait."""
+        if now is None:
+            now = _time()
+        if now >= self._next_sweep:
+            self._sweep(now)
+        tat = self.tat.get(key, now)
+        if tat < now:
+            tat = now
+        elif tat - now > limit.tolerance:
+            return tat - now - limit.tolerance
+        self.tat[key] = tat + limit.interval
+        return 0.0
+
+    async def ahit(self, key: str, limit: Limit) -> float:
+        return self.hit(key, limit)
+
+
+class MongoBuckets:
+    """GCRA state shared by all workers in the ``rate_limits`` collection.
+
+    Entries carry an ``expires_at`` date once their bucket is full again,
+    and a TTL index removes them.
+    """
+
+    def __init__(self, db):
+        self.collection = db.rate_limits
+
+    async def ensure_indexes(self):
+        try:
+            await self.collection.create_index("expires_at", expireAfterSeconds=0)
+        except Exception as e:
+            logger.error(f"Could not create rate limit indexes: {e}")
+
+    async def ahit(self, key: str, limit: Limit) -> float:
+        now = time.time()
+        try:
+            # Matches only while the request fits in the burst; otherwise the
+            # upsert collides with the existing entry
+            await self.collection.find_one_and_update(
+                {"_id": key, "tat": {"$lte": now + limit.tolerance}},
+                [{"$set": {
+                    "tat": {"$add": [{"$max": [{"$ifNull": ["$tat", now]}, now]}, limit.interval]},
+                }}, {"$set": {
+                    "expires_at": {"$toDate": {"$multiply": ["$tat", 1000]}},
+                }}],
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            return 0.0
+        except DuplicateKeyError:
+            entry = await self.collection.find_one({"_id": key}, {"tat": 1})
+            return max(0.0, entry["tat"] - now - limit.tolerance) if entry else 0.0
+
+
+def client_ip(scope, proxy_hops: int = 0) -> str:
+    """The address of the client, ``proxy_hops`` proxies away from this server."""
+    if proxy_hops > 0:
+        forwarded = [value for name, value in scope["headers"] if name == b"x-forwarded-for"]
+        hosts = [host.strip() for host in b",".join(forwarded).decode("latin-1").split(",")]
+        hosts = [host for host in hosts if host]
+        if len(hosts) >= proxy_hops:
+            return hosts[-proxy_hops]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware answering 429 with ``Retry-After`` over the limit.
+
+    ``routes`` maps ``(method, path)`` to ``(group, limit)``; ``identify``
+    returns the user id of an authenticated request, or None to key it by
+    client IP. Groups in ``per_ip`` are keyed by IP regardless. A limiter
+    failure lets the request through.
+    """
+
+    def __init__(self, app, buckets, routes: Dict[Tuple[str, str], Tuple[str, Limit]],
+                 identify: Callable[[dict], Optional[str]] = lambda scope: None,
+                 per_ip: Iterable[str] = (), proxy_hops: int = 0):
+        self.app = app
+        self.buckets = buckets
+        self.routes = routes
+        self.identify = identify
+        self.per_ip = frozenset(per_ip)
+        self.proxy_hops = proxy_hops
+
+    def _key(self, scope, group: str) -> str:
+        if group not in self.per_ip:
+            user_id = self.identify(scope)
+            if user_id:
+                return f"{group}:u:{user_id}"
+        return f"{group}:ip:{client_ip(scope, self.proxy_hops)}"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        rule = self.routes.get((scope["method"], scope["path"]))
+        if rule is None:
+            return await self.app(scope, receive, send)
+
+        group, limit = rule
+        try:
+            wait = await self.buckets.ahit(self._key(scope, group), limit)
+        except Exception as e:
+            logger.error(f"Rate limiter unavailable, allowing request: {e}")
+            wait = 0.0
+        if wait <= 0:
+            return await self.app(scope, receive, send)
+
+        rate_limited.inc(group)
+        body = dumps({"detail": "Too many requests, try again later"})
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(math.ceil(wait)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def buckets_from_env(db):
+    """``RATE_LIMIT_BACKEND=mongo`` shares limits between workers; the default is per worker."""
+    if os.environ.get('RATE_LIMIT_BACKEND', 'memory').lower() == 'mongo':
+        return MongoBuckets(db)
+    return MemoryBuckets()
@@ -0,0 +1,113 @@
+"""Markdown to sanitized HTML for admin-authored learning content.
+
+Only a small, predictable subset of markdown is supported. The input is
+HTML-escaped before any markup is produced, so the output can never carry
+tags, attributes or scripts that the renderer did not emit itself.
+"""
+import html
+import re
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*)$")
+_UNORDERED = re.compile(r"^\s*[-*+]\s+(.*)$")
+_ORDERED = re.compile(r"^\s*\d+[.)]\s+(.*)$")
+_FENCE = re.compile(r"^\s*```")
+
+_CODE = re.compile(r"`([^`]+)`")
+_BOLD_ITALIC = re.compile(r"\*\*\*(.+?)\*\*\*|___(.+?)___")
+_BOLD = re.compile(r"\*\*(.+?)\*\*|__(.+?)__")
+_ITALIC = re.compile(r"(?<![*\w])\*(?!\s)(.+?)(?<!\s)\*(?![*\w])|(?<!\w)_(?!\s)(.+?)(?<!\s)_(?!\w)")
+_LINK = re.compile(r"\[([^\]]+)\]\(([^)\s]+)\)")
+
+_SAFE_URL = re.compile(r"^(https?://|mailto:|/|#)", re.IGNORECASE)
+
+
+def _link(match: re.Match, stash) -> str:
+    text, url = match.group(1), match.group(2)
+    if not _SAFE_URL.match(url):
+        return text
+    return f'<a href="{stash(url)}" rel="noopener noreferrer nofollow">{text}</a>'
+
+
+def _inline(text: str) -> str:
+    # Code spans and link targets are pulled out first so emphasis never applies inside them
+    spans = []
+
+    def stash(fragment: str) -> str:
+        spans.append(fragment)
+        return f"\x00{len(spans) - 1}\x00"
+
+    text = _CODE.sub(lambda m: stash(f"<code>{m.group(1)}</code>"), html.escape(text, quote=True))
+    text = _LINK.sub(lambda m: _link(m, stash), text)
+    text = _BOLD_ITALIC.sub(lambda m: f"<strong><em>{m.group(1) or m.group(2)}</em></strong>", text)
+    text = _BOLD.sub(lambda m: f"<strong>{m.group(1) or m.group(2)}</strong>", text)
+    text = _ITALIC.sub(lambda m: f"<em>{m.group(1) or m.group(2)}</em>", text)
+    return re.sub(r"\x00(\d+)\x00", lambda m: spans[int(m.group(1))], text)
+
+
+def render_markdown(text: str) -> str:
+    out = []
+    paragraph = []
+    list_tag = None
+    code_lines = None
+
+    def flush_paragraph():
+        if paragraph:
+            out.append(f"<p>{'<br>'.join(_inline(line) for line in paragraph)}</p>")
+            paragraph.clear()
+
+    def close_list():
+        nonlocal list_tag
+        if list_tag:
+            out.append(f"</{list_tag}>")
+            list_tag = None
+
+    for line in (text or "").splitlines():
+        if code_lines is not None:
+            if _FENCE.match(line):
+                out.append(f"<pre><code>{html.escape(chr(10).join(code_lines))}</code></pre>")
+                code_lines = None
+            else:
+                code_lines.append(line)
+            continue
+
+        if _FENCE.match(line):
+            flush_paragraph()
+            close_list()
+            code_lines = []
+            continue
+
+        if not line.strip():
+            flush_paragraph()
+            close_list()
+            continue
+
+        heading = _HEADING.match(line)
+        if heading:
+            flush_paragraph()
+            close_list()
+            level = len(heading.group(1))
+            out.append(f"<h{level}>{_inline(heading.group(2).strip())}</h{level}>")
+            continue
+
+        item = _UNORDERED.match(line)
+        tag = "ul"
+        if not item:
+            item = _ORDERED.match(line)
+            tag = "ol"
+        if item:
+            flush_paragraph()
+            if list_tag != tag:
+                close_list()
+                out.append(f"<{tag}>")
+                list_tag = tag
+            out.append(f"<li>{_inline(item.group(1))}</li>")
+            continue
+
+        close_list()
+        paragraph.append(line.strip())
+
+    if code_lines is not None:
+        out.append(f"<pre><code>{html.escape(chr(10).join(code_lines))}</code></pre>")
+    flush_paragraph()
+    close_list()
+    return "\n".join(out)
@@ -1,26 +1,51 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query, Request, WebSocket, WebSocketDisconnect, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
+import signal
+import threading
+from contextlib import asynccontextmanager
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, TypeAdapter
+from typing import Dict, List, Optional
+import time
 import uuid
 from datetime import datetime, timezone, timedelta
 import jwt
 import bcrypt
-
-# Try to import emergent integrations, fallback gracefully
-try:
-    from emergentintegrations.llm.chat import LlmChat, UserMessage
-    EMERGENT_AVAILABLE = True
-except ImportError:
-    EMERGENT_AVAILABLE = False
+from pymongo import ReturnDocument
+
+from database import PoolMonitor, create_client, ping, pool_options, use_memory_backend, warm_up
+from caching import (ORJSON_AVAILABLE, CachedBody, LRUBytesCache, SingleFlight, body_etag, cached_response,
+                     content_hash, dumps, etag_matches, json_response)
+from metrics import (
+    COHERENCE_IMMUTABLE, COHERENCE_TTL, REGISTRY, Counter, MetricsMiddleware, MongoCommandListener,
+    observe_llm_call, register_cache, worker_snapshots
+)
+from query_profiler import QueryProfiler
+from music import MusicCatalog, canonicalize_track
+from rendering import render_markdown
+from static_assets import StaticManifest
+import ai
+import batch
+import boss
+import dates
+import events
+import focus_timer
+import jobs
+import migrations
+import ratelimit
+import streaks
+import tokens
+import versions
+
+# The LLM SDK itself is imported on first use, see ai.py
+EMERGENT_AVAILABLE = ai.AVAILABLE
+if not EMERGENT_AVAILABLE:
     logging.warning("emergentintegrations not available, AI features disabled")
 
 ROOT_DIR = Path(__file__).parent
@@ -29,22 +54,120 @@ load_dotenv(ROOT_DIR / '.env')
 # MongoDB connection with fallback
 mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
 db_name = os.environ.get('DB_NAME', 'cyberfocus')
-client = AsyncIOMotorClient(mongo_url)
+query_profiler = QueryProfiler(slow_ms=float(os.environ.get('SLOW_QUERY_MS', '100')),
+                               sample_every=int(os.environ.get('QUERY_PROFILE_SAMPLE_EVERY', '10')))
+pool_monitor = PoolMonitor(pool_options()["maxPoolSize"])
+client = create_client(mongo_url, event_listeners=[MongoCommandListener(query_profiler)], pool_monitor=pool_monitor)
 db = client[db_name]
+MEMORY_DB = use_memory_backend(mongo_url)
 
 # JWT Config
 JWT_SECRET = os.environ.get('JWT_SECRET', 'default_secret_change_in_production')
 JWT_ALGORITHM = "HS256"
-JWT_EXPIRATION_HOURS = 24
+# User fields copied into access tokens, for routes that only read them
+TOKEN_CLAIMS = ("username", "level", "xp", "current_streak")
 
 # Emergent LLM Key
 EMERGENT_LLM_KEY = os.environ.get('EMERGENT_LLM_KEY')
 
+# Requests allowed per client on expensive routes, as "count/seconds"
+# ("0" disables); login and register hash with bcrypt, AI routes call the LLM
+RATE_LIMIT_AUTH = ratelimit.parse_limit(os.environ.get('RATE_LIMIT_AUTH', '10/60'))
+RATE_LIMIT_AI = ratelimit.parse_limit(os.environ.get('RATE_LIMIT_AI', '20/300'))
+# Proxies in front of the app that append to X-Forwarded-For (Render: 1)
+RATE_LIMIT_PROXY_HOPS = int(os.environ.get('RATE_LIMIT_PROXY_HOPS', '0'))
+rate_limit_buckets = ratelimit.buckets_from_env(db)
+
+token_revocations = tokens.Revocations(db)
+verified_tokens = tokens.VerifiedTokenCache(lambda token: jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM]))
+register_cache("verified_tokens", verified_tokens, COHERENCE_IMMUTABLE)
+
+data_versions = versions.DataVersions(db)
+register_cache("data_versions", data_versions, COHERENCE_TTL, data_versions.ttl)
+
+# How often each worker checks whether today's daily jobs still have to run
+# (each job runs once a day, on whichever worker gets its lease); 0 disables
+JOB_INTERVAL = float(os.environ.get('JOB_INTERVAL', '900'))
+JOB_BATCH_SIZE = int(os.environ.get('JOB_BATCH_SIZE', '1000'))
+
+DAILY_JOBS = {
+    "streaks": streaks.run,
+    # Trains the difficulty model that tomorrow's challenges are drawn from
+    "boss_difficulty": boss.train_model,
+    "boss_challenges": boss.generate,
+    # Converts ISO string timestamps to dates; a lookup a day once it has finished
+    "date_migration": migrations.run,
+}
+
+# Seconds between keep-alive comments on idle event streams
+EVENT_STREAM_HEARTBEAT = float(os.environ.get('EVENT_STREAM_HEARTBEAT', '15'))
+
+# Import the LLM SDK in the background this many seconds after startup,
+# instead of on the first AI request; unset to keep it fully lazy
+AI_WARMUP_DELAY = os.environ.get('AI_WARMUP_DELAY')
+
+# Hot read routes return pre-shaped documents as raw JSON instead of going
+# through response_model validation; set VALIDATE_RESPONSES=1 to re-enable it
+VALIDATE_RESPONSES = os.environ.get('VALIDATE_RESPONSES', '').lower() in ('1', 'true', 'yes')
+
+app_state = {"draining": False, "metrics": None}
+
+def close_streams_on_exit():
+    # uvicorn waits for open responses before it runs the shutdown half of
+    # the lifespan, so event streams have to end when the exit signal comes,
+    # and readiness has to fail then, while requests are still finishing
+    if threading.current_thread() is not threading.main_thread():
+        return
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        previous = signal.getsignal(sig)
+        
+        def handler(signum, frame, previous=previous):
+            app_state["draining"] = True
+            loop.call_soon_threadsafe(events.bus.close)
+            if callable(previous):
+                previous(signum, frame)
+        
+        signal.signal(sig, handler)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs once per worker, after the fork when the app is preloaded
+    await warm_up(db)
+    await streaks.ensure_indexes(db)
+    await boss.ensure_indexes(db)
+    await boss.model.ensure_fresh(db)
+    await focus_engine.ensure_indexes()
+    await events.ensure_indexes(db)
+    await rate_limit_buckets.ensure_indexes()
+    await tokens.ensure_indexes(db)
+    close_streams_on_exit()
+    snapshots = app_state["metrics"] = worker_snapshots()
+    background = []
+    if snapshots:
+        background.append(asyncio.create_task(snapshots.run(REGISTRY)))
+    background.append(asyncio.create_task(focus_engine.run()))
+    background.append(asyncio.create_task(token_revocations.run()))
+    if not MEMORY_DB:
+        # The memory backend runs a single worker: there is nothing to relay
+        background.append(asyncio.create_task(events.Relay(db, events.bus).run()))
+    if JOB_INTERVAL > 0:
+        background.append(asyncio.create_task(jobs.scheduler(db, DAILY_JOBS, JOB_INTERVAL, JOB_BATCH_SIZE)))
+    if AI_WARMUP_DELAY is not None and EMERGENT_LLM_KEY and EMERGENT_AVAILABLE:
+        background.append(asyncio.create_task(ai.warm_up(float(AI_WARMUP_DELAY or 0))))
+    yield
+    # uvicorn has already let in-flight requests finish
+    for task in background:
+        task.cancel()
+    client.close()
+
 # Create the main app
 app = FastAPI(
     title="CyberFocus API",
     description="Gamified Productivity App Backend",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=ORJSONResponse if ORJSON_AVAILABLE else JSONResponse,
+    lifespan=lifespan
 )
 
 # Create a router with the /api prefix
@@ -63,6 +186,16 @@ class UserLogin(BaseModel):
     email: EmailStr
     password: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class BatchEntry(BaseModel):
+    id: str
+    path: str
+
+class BatchRequest(BaseModel):
+    requests: List[BatchEntry]
+
 class UserResponse(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str
@@ -74,7 +207,7 @@ class UserResponse(BaseModel):
     longest_streak: int = 0
     discipline_score: int = 50
     total_tasks_completed: int = 0
-    created_at: str
+    created_at: datetime
 
 class TaskCreate(BaseModel):
     title: str
@@ -103,8 +236,8 @@ class TaskResponse(BaseModel):
     estimated_minutes: int
     xp_reward: int
     completed: bool
-    completed_at: Optional[str] = None
-    created_at: str
+    completed_at: Optional[datetime] = None
+    created_at: datetime
 
 class BossChallengeResponse(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -135,8 +268,15 @@ class FocusSessionResponse(BaseModel):
     task_id: Optional[str]
     completed: bool
     xp_earned: int
-    started_at: str
-    completed_at: Optional[str] = None
+    status: Optional[str] = None
+    elapsed_seconds: float = 0
+    started_at: datetime
+    completed_at: Optional[datetime] = None
+
+class TaskFocusTotals(BaseModel):
+    focus_minutes: int = 0
+    sessions: int = 0
+    last_focused_at: Optional[datetime] = None
 
 class AchievementResponse(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -150,30 +290,111 @@ class AchievementResponse(BaseModel):
 
 # ============ HELPERS ============
 
-def create_token(user_id: str, email: str) -> str:
+_model_fields = {}
+_response_adapters = {}
+
+def shape(doc: dict, model) -> dict:
+    """Pick exactly the fields of ``model`` from ``doc``, filling defaults."""
+    fields = _model_fields.get(model)
+    if fields is None:
+        fields = _model_fields[model] = [
+            (name, None if field.is_required() else field.get_default())
+            for name, field in model.model_fields.items()
+        ]
+    return {name: doc.get(name, default) for name, default in fields}
+
+def fast_response(content, model=None):
+    if VALIDATE_RESPONSES and model is not None:
+        adapter = _response_adapters.get(model)
+        if adapter is None:
+            adapter = _response_adapters[model] = TypeAdapter(model)
+        content = adapter.dump_python(adapter.validate_python(content), mode="json")
+    return json_response(content)
+
+def create_token(user: dict) -> str:
+    """A short-lived access token carrying a snapshot of ``TOKEN_CLAIMS``."""
     payload = {
-        "user_id": user_id,
-        "email": email,
-        "exp": datetime.now(timezone.utc) + timedelta(hours=JWT_EXPIRATION_HOURS)
+        "user_id": user["id"],
+        "email": user["email"],
+        "ver": user.get("token_version", 0),
+        "exp": datetime.now(timezone.utc) + timedelta(minutes=tokens.ACCESS_TOKEN_MINUTES)
     }
+    for field in TOKEN_CLAIMS:
+        payload[field] = user.get(field, 0)
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
 def verify_token(token: str) -> dict:
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
+        payload = verified_tokens(token)
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    if not token_revocations.is_current(payload.get("user_id"), payload.get("ver", 0)):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    return payload
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     payload = verify_token(credentials.credentials)
-    user = await db.users.find_one({"id": payload["user_id"]}, {"_id": 0})
+    user = await db.users.find_one({"id": payload["user_id"]}, {"_id": 0, "password": 0})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
+async def get_current_claims(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """The user as of their access token: ``id`` and ``TOKEN_CLAIMS``, no database read.
+
+    For read-only routes. The claims may lag behind the database until the
+    client's next ``/auth/me`` or refresh; anything that writes must use
+    ``get_current_user``.
+    """
+    payload = verify_token(credentials.credentials)
+    if "level" not in payload:
+        # Issued before access tokens carried claims
+        return await get_current_user(credentials)
+    claims = {"id": payload["user_id"]}
+    for field in TOKEN_CLAIMS:
+        claims[field] = payload[field]
+    return claims
+
+def with_fresh_claims(response, claims: dict, user: dict):
+    # Attach a new access token when the claims it was issued with went stale
+    if any(claims.get(field) != user.get(field, 0) for field in TOKEN_CLAIMS):
+        response.headers["X-Access-Token"] = create_token(user)
+    return response
+
+async def data_etag(current_user: dict = Depends(get_current_claims)) -> str:
+    """Weak ETag for a user-scoped read, from the cached ``data_version``.
+
+    Also covers the claims some reads render and the UTC day, for reads
+    that depend on the date.
+    """
+    version = await data_versions.get(current_user["id"])
+    today = datetime.now(timezone.utc).date().isoformat()
+    state = "|".join([current_user["id"], today] + [str(current_user.get(field)) for field in TOKEN_CLAIMS])
+    return f'W/"{version}-{content_hash(state)[:16]}"'
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+    return None
+
+def tagged(response: Response, etag: str) -> Response:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+def rate_limit_identity(scope) -> Optional[str]:
+    # Signed-in clients are limited per user, anyone else per IP (login and
+    # register always per IP, see the middleware below)
+    for name, value in scope["headers"]:
+        if name == b"authorization" and value[:7].lower() == b"bearer ":
+            try:
+                return verified_tokens(value[7:].decode())["user_id"]
+            except (jwt.InvalidTokenError, KeyError):
+                return None
+    return None
+
 def calculate_xp_for_level(level: int) -> int:
     return int(100 * (level ** 1.5))
 
@@ -190,6 +411,15 @@ def calculate_xp_to_next_level(xp: int, level: int) -> tuple:
     next_level_xp = calculate_xp_for_level(level)
     return current_level_xp, next_level_xp
 
+async def publish_reward(user_id: str, source: str, xp_earned: int, new_level: Optional[int],
+                         client_id: Optional[str] = None, **data):
+    """Tell the user's other tabs and devices about XP they just earned."""
+    common = {"source": source, "client_id": client_id, **data}
+    batch = [events.make_event(events.XP_EARNED, user_id, {"xp_earned": xp_earned, **common})]
+    if new_level:
+        batch.append(events.make_event(events.LEVEL_UP, user_id, {"new_level": new_level, **common}))
+    await events.append(db, batch)
+
 # ============ AUTH ROUTES ============
 
 @api_router.post("/auth/register")
@@ -212,15 +442,16 @@ async def register(user: UserCreate):
         "discipline_score": 50,
         "total_tasks_completed": 0,
         "last_active_date": datetime.now(timezone.utc).date().isoformat(),
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": dates.utc_now()
     }
     
     await db.users.insert_one(user_doc)
-    token = create_token(user_doc["id"], user_doc["email"])
+    token = create_token(user_doc)
+    refresh_token = await tokens.issue_refresh_token(db, user_doc["id"])
     
     # Create clean user response without password and _id
     user_response = {k: v for k, v in user_doc.items() if k not in ["password", "_id"]}
-    return {"token": token, "user": user_response}
+    return {"token": token, "refresh_token": refresh_token, "user": user_response}
 
 @api_router.post("/auth/login")
 async def login(credentials: UserLogin):
@@ -231,33 +462,37 @@ async def login(credentials: UserLogin):
     if not bcrypt.checkpw(credentials.password.encode(), user["password"].encode()):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    # Update streak
-    today = datetime.now(timezone.utc).date().isoformat()
-    yesterday = (datetime.now(timezone.utc).date() - timedelta(days=1)).isoformat()
-    
-    if user.get("last_active_date") == yesterday:
-        new_streak = user.get("current_streak", 0) + 1
-        longest = max(user.get("longest_streak", 0), new_streak)
-        await db.users.update_one(
-            {"id": user["id"]},
-            {"$set": {"current_streak": new_streak, "longest_streak": longest, "last_active_date": today}}
-        )
-        user["current_streak"] = new_streak
-        user["longest_streak"] = longest
-    elif user.get("last_active_date") != today:
-        await db.users.update_one(
-            {"id": user["id"]},
-            {"$set": {"current_streak": 1, "last_active_date": today}}
-        )
-        user["current_streak"] = 1
+    await streaks.record_activity(db, user)
     
-    token = create_token(user["id"], user["email"])
+    token = create_token(user)
+    refresh_token = await tokens.issue_refresh_token(db, user["id"])
     user_response = {k: v for k, v in user.items() if k != "password"}
-    return {"token": token, "user": user_response}
+    return {"token": token, "refresh_token": refresh_token, "user": user_response}
+
+@api_router.post("/auth/refresh")
+async def refresh_access_token(request: RefreshRequest):
+    user_id = await tokens.redeem_refresh_token(db, request.refresh_token)
+    user = user_id and await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    return {"token": create_token(user)}
+
+@api_router.post("/auth/logout")
+async def logout(request: RefreshRequest):
+    await tokens.revoke_refresh_token(db, request.refresh_token)
+    return {"message": "Logged out"}
+
+@api_router.post("/auth/logout-all")
+async def logout_everywhere(current_user: dict = Depends(get_current_user)):
+    await token_revocations.revoke_all(current_user["id"])
+    return {"message": "Logged out on every device"}
 
 @api_router.get("/auth/me", response_model=UserResponse)
-async def get_me(current_user: dict = Depends(get_current_user)):
-    return current_user
+async def get_me(credentials: HTTPAuthorizationCredentials = Depends(security),
+                 current_user: dict = Depends(get_current_user)):
+    # Clients call this after earning XP: hand back a token with fresh claims
+    return with_fresh_claims(fast_response(shape(current_user, UserResponse), UserResponse),
+                             verified_tokens(credentials.credentials), current_user)
 
 # ============ TASK ROUTES ============
 
@@ -276,23 +511,29 @@ async def create_task(task: TaskCreate, current_user: dict = Depends(get_current
         "xp_reward": xp_reward,
         "completed": False,
         "completed_at": None,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": dates.utc_now()
     }
     
     await db.tasks.insert_one(task_doc)
+    await data_versions.bump(current_user["id"])
     return task_doc
 
 @api_router.get("/tasks", response_model=List[TaskResponse])
-async def get_tasks(completed: Optional[bool] = None, current_user: dict = Depends(get_current_user)):
+async def get_tasks(request: Request, completed: Optional[bool] = None,
+                    current_user: dict = Depends(get_current_claims), etag: str = Depends(data_etag)):
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
     query = {"user_id": current_user["id"]}
     if completed is not None:
         query["completed"] = completed
     
     tasks = await db.tasks.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
-    return tasks
+    return tagged(fast_response(tasks, List[TaskResponse]), etag)
 
 @api_router.patch("/tasks/{task_id}", response_model=TaskResponse)
-async def update_task(task_id: str, task_update: TaskUpdate, current_user: dict = Depends(get_current_user)):
+async def update_task(task_id: str, task_update: TaskUpdate, current_user: dict = Depends(get_current_user),
+                      x_client_id: Optional[str] = Header(None)):
     task = await db.tasks.find_one({"id": task_id, "user_id": current_user["id"]}, {"_id": 0})
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -303,7 +544,7 @@ async def update_task(task_id: str, task_update: TaskUpdate, current_user: dict
     new_level = current_user["level"]
     
     if task_update.completed and not task["completed"]:
-        update_data["completed_at"] = datetime.now(timezone.utc).isoformat()
+        update_data["completed_at"] = dates.utc_now()
         
         # Award XP
         new_xp = current_user["xp"] + task["xp_reward"]
@@ -317,9 +558,13 @@ async def update_task(task_id: str, task_update: TaskUpdate, current_user: dict
                 "$inc": {"total_tasks_completed": 1, "discipline_score": 1}
             }
         )
+        await streaks.record_activity(db, current_user)
+        await publish_reward(current_user["id"], "task", task["xp_reward"], new_level if level_up else None,
+                             x_client_id, task_id=task_id)
     
     if update_data:
         await db.tasks.update_one({"id": task_id}, {"$set": update_data})
+    await data_versions.bump(current_user["id"])
     
     updated_task = await db.tasks.find_one({"id": task_id}, {"_id": 0})
     
@@ -335,52 +580,22 @@ async def delete_task(task_id: str, current_user: dict = Depends(get_current_use
     result = await db.tasks.delete_one({"id": task_id, "user_id": current_user["id"]})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Task not found")
+    await db.task_focus_totals.delete_one({"user_id": current_user["id"], "task_id": task_id})
+    await data_versions.bump(current_user["id"])
     return {"message": "Task deleted"}
 
 # ============ BOSS CHALLENGE ROUTES ============
 
-BOSS_CHALLENGES = [
-    "Complete 5 tasks without distraction",
-    "Work for 2 hours straight in Focus Mode",
-    "Finish your most difficult task today",
-    "Complete all pending tasks from yesterday",
-    "Learn something new and create a task about it",
-    "Help someone else with their task",
-    "Wake up early and complete 3 tasks before noon",
-    "No social media until you complete 3 tasks",
-    "Complete a task you've been procrastinating on",
-    "Double your daily task completion rate"
-]
+register_cache("boss_difficulty_model", None, COHERENCE_TTL, boss.model.ttl)
 
 @api_router.get("/boss-challenge/today", response_model=BossChallengeResponse)
 async def get_todays_boss_challenge(current_user: dict = Depends(get_current_user)):
     today = datetime.now(timezone.utc).date().isoformat()
-    
-    challenge = await db.boss_challenges.find_one(
-        {"user_id": current_user["id"], "date": today},
-        {"_id": 0}
-    )
-    
-    if not challenge:
-        import random
-        challenge_text = random.choice(BOSS_CHALLENGES)
-        difficulty = random.randint(3, 5)
-        
-        challenge = {
-            "id": str(uuid.uuid4()),
-            "user_id": current_user["id"],
-            "challenge_text": challenge_text,
-            "difficulty": difficulty,
-            "xp_reward": difficulty * 50,
-            "completed": False,
-            "date": today
-        }
-        await db.boss_challenges.insert_one(challenge)
-    
-    return challenge
+    return await boss.get_or_create(db, current_user, today)
 
 @api_router.post("/boss-challenge/{challenge_id}/complete")
-async def complete_boss_challenge(challenge_id: str, current_user: dict = Depends(get_current_user)):
+async def complete_boss_challenge(challenge_id: str, current_user: dict = Depends(get_current_user),
+                                  x_client_id: Optional[str] = Header(None)):
     challenge = await db.boss_challenges.find_one(
         {"id": challenge_id, "user_id": current_user["id"]},
         {"_id": 0}
@@ -394,7 +609,7 @@ async def complete_boss_challenge(challenge_id: str, current_user: dict = Depend
     
     await db.boss_challenges.update_one(
         {"id": challenge_id},
-        {"$set": {"completed": True}}
+        {"$set": {"completed": True, "served": True}}
     )
     
     new_xp = current_user["xp"] + challenge["xp_reward"]
@@ -408,6 +623,13 @@ async def complete_boss_challenge(challenge_id: str, current_user: dict = Depend
             "$inc": {"discipline_score": 5}
         }
     )
+    await streaks.record_activity(db, current_user)
+    await events.append(db, [events.make_event(events.CHALLENGE_COMPLETED, current_user["id"], {
+        "challenge_id": challenge_id, "difficulty": challenge["difficulty"], "client_id": x_client_id
+    })])
+    await publish_reward(current_user["id"], "boss_challenge", challenge["xp_reward"],
+                         new_level if level_up else None, x_client_id, challenge_id=challenge_id)
+    await data_versions.bump(current_user["id"])
     
     return {
         "message": "Boss challenge completed!",
@@ -452,6 +674,7 @@ Your role:
 """
     
     try:
+        LlmChat, UserMessage = await ai.sdk()
         chat = LlmChat(
             api_key=EMERGENT_LLM_KEY,
             session_id=session_id,
@@ -467,7 +690,13 @@ Your role:
         full_message = f"{context}\nUser: {message.message}" if context else message.message
         
         user_message = UserMessage(text=full_message)
-        response = await chat.send_message(user_message)
+        started = time.perf_counter()
+        try:
+            response = await chat.send_message(user_message)
+        except Exception:
+            observe_llm_call("gpt-4o", time.perf_counter() - started, system_message + full_message, outcome="error")
+            raise
+        observe_llm_call("gpt-4o", time.perf_counter() - started, system_message + full_message, response)
         
         # Save to history
         await db.chat_history.insert_one({
@@ -475,7 +704,7 @@ Your role:
             "session_id": session_id,
             "role": "user",
             "content": message.message,
-            "timestamp": datetime.now(timezone.utc).isoformat()
+            "timestamp": dates.utc_now()
         })
         
         await db.chat_history.insert_one({
@@ -483,7 +712,7 @@ Your role:
             "session_id": session_id,
             "role": "assistant",
             "content": response,
-            "timestamp": datetime.now(timezone.utc).isoformat()
+            "timestamp": dates.utc_now()
         })
         
         return {"response": response, "session_id": session_id}
@@ -492,7 +721,7 @@ Your role:
         raise HTTPException(status_code=500, detail=f"AI Coach error: {str(e)}")
 
 @api_router.get("/ai-coach/history")
-async def get_chat_history(current_user: dict = Depends(get_current_user)):
+async def get_chat_history(current_user: dict = Depends(get_current_claims)):
     session_id = f"coach_{current_user['id']}"
     history = await db.chat_history.find(
         {"session_id": session_id},
@@ -502,99 +731,232 @@ async def get_chat_history(current_user: dict = Depends(get_current_user)):
 
 # ============ FOCUS MODE ROUTES ============
 
-@api_router.post("/focus/start", response_model=FocusSessionResponse)
-async def start_focus_session(session: FocusSessionCreate, current_user: dict = Depends(get_current_user)):
-    session_doc = {
-        "id": str(uuid.uuid4()),
-        "user_id": current_user["id"],
-        "duration_minutes": session.duration_minutes,
-        "task_id": session.task_id,
-        "completed": False,
-        "xp_earned": 0,
-        "started_at": datetime.now(timezone.utc).isoformat(),
-        "completed_at": None
-    }
-    
-    await db.focus_sessions.insert_one(session_doc)
-    return session_doc
-
-@api_router.post("/focus/{session_id}/complete")
-async def complete_focus_session(session_id: str, current_user: dict = Depends(get_current_user)):
-    session = await db.focus_sessions.find_one(
-        {"id": session_id, "user_id": current_user["id"]},
-        {"_id": 0}
+async def award_focus_session(session: dict, credited_minutes: int, client_id: Optional[str] = None) -> dict:
+    xp_earned = credited_minutes * 2
+    user = await db.users.find_one_and_update(
+        {"id": session["user_id"]},
+        {"$inc": {"xp": xp_earned, "discipline_score": 2 if credited_minutes else 0}},
+        projection={"_id": 0, "password": 0},
+        return_document=ReturnDocument.AFTER
     )
+    if not user:
+        return {"xp_earned": xp_earned, "level_up": False, "new_level": None}
+    
+    new_level = calculate_level(user["xp"])
+    level_up = new_level > user["level"]
+    if level_up:
+        await db.users.update_one({"id": user["id"], "level": {"$lt": new_level}}, {"$set": {"level": new_level}})
+    if credited_minutes:
+        await streaks.record_activity(db, user)
+        await publish_reward(user["id"], "focus", xp_earned, new_level if level_up else None,
+                             client_id, session_id=session["id"])
     
+    return {"xp_earned": xp_earned, "level_up": level_up, "new_level": new_level if level_up else None}
+
+# Times every running session of this worker and pushes its changes to WebSocket clients
+focus_engine = focus_timer.FocusEngine(db, award_focus_session, on_change=data_versions.bump)
+events.bus.on_remote("focus.", focus_engine.refresh)
+
+async def focus_session_error(session_id: str, user_id: str, expected: str):
+    session = await db.focus_sessions.find_one({"id": session_id, "user_id": user_id}, {"_id": 0})
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-    
-    if session["completed"]:
+    state = focus_timer.status_of(session)
+    if state == focus_timer.COMPLETED:
         raise HTTPException(status_code=400, detail="Session already completed")
+    raise HTTPException(status_code=409, detail=f"Session is {state}, not {expected}")
+
+@api_router.post("/focus/start", response_model=FocusSessionResponse)
+async def start_focus_session(session: FocusSessionCreate, current_user: dict = Depends(get_current_user)):
+    return await focus_engine.start(current_user["id"], session.duration_minutes, session.task_id)
+
+@api_router.post("/focus/{session_id}/pause", response_model=FocusSessionResponse)
+async def pause_focus_session(session_id: str, current_user: dict = Depends(get_current_user)):
+    session = await focus_engine.pause(current_user["id"], session_id)
+    if session is None:
+        await focus_session_error(session_id, current_user["id"], focus_timer.RUNNING)
+    return session
+
+@api_router.post("/focus/{session_id}/resume", response_model=FocusSessionResponse)
+async def resume_focus_session(session_id: str, current_user: dict = Depends(get_current_user)):
+    session = await focus_engine.resume(current_user["id"], session_id)
+    if session is None:
+        await focus_session_error(session_id, current_user["id"], focus_timer.PAUSED)
+    return session
+
+@api_router.post("/focus/{session_id}/abandon", response_model=FocusSessionResponse)
+async def abandon_focus_session(session_id: str, current_user: dict = Depends(get_current_user)):
+    session = await focus_engine.abandon(current_user["id"], session_id)
+    if session is None:
+        await focus_session_error(session_id, current_user["id"], "active")
+    return session
+
+@api_router.post("/focus/{session_id}/complete")
+async def complete_focus_session(session_id: str, current_user: dict = Depends(get_current_user),
+                                 x_client_id: Optional[str] = Header(None)):
+    # XP is credited for the time actually focused, as measured by the server
+    session = await focus_engine.complete(current_user["id"], session_id, client_id=x_client_id)
+    if session is None:
+        await focus_session_error(session_id, current_user["id"], "active")
     
-    xp_earned = session["duration_minutes"] * 2
+    return {
+        "message": "Focus session completed!",
+        "xp_earned": session["xp_earned"],
+        "elapsed_seconds": session["elapsed_seconds"],
+        "credited_minutes": session["credited_minutes"],
+        "level_up": session["level_up"],
+        "new_level": session["new_level"]
+    }
+
+@api_router.websocket("/focus/ws")
+async def focus_updates(websocket: WebSocket, token: str = Query(...)):
+    # Browsers can't set headers on WebSocket requests, hence the query parameter
+    try:
+        user_id = verify_token(token)["user_id"]
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
     
-    await db.focus_sessions.update_one(
-        {"id": session_id},
-        {"$set": {
-            "completed": True,
-            "xp_earned": xp_earned,
-            "completed_at": datetime.now(timezone.utc).isoformat()
-        }}
-    )
+    await websocket.accept()
+    queue = await focus_engine.subscribe(user_id)
     
-    new_xp = current_user["xp"] + xp_earned
-    new_level = calculate_level(new_xp)
-    level_up = new_level > current_user["level"]
+    async def forward():
+        try:
+            while True:
+                await websocket.send_json(await queue.get())
+        except (WebSocketDisconnect, RuntimeError):
+            pass
     
-    await db.users.update_one(
-        {"id": current_user["id"]},
-        {
-            "$set": {"xp": new_xp, "level": new_level},
-            "$inc": {"discipline_score": 2}
-        }
-    )
+    async def drain_incoming():
+        # Nothing is expected from the client; this only notices it leaving
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
     
-    return {
-        "message": "Focus session completed!",
-        "xp_earned": xp_earned,
-        "level_up": level_up,
-        "new_level": new_level if level_up else None
-    }
+    tasks = [asyncio.create_task(forward()), asyncio.create_task(drain_incoming())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        focus_engine.unsubscribe(user_id, queue)
+
+FOCUS_TOTALS_MAX_TASKS = 200
 
 @api_router.get("/focus/history", response_model=List[FocusSessionResponse])
-async def get_focus_history(current_user: dict = Depends(get_current_user)):
-    sessions = await db.focus_sessions.find(
-        {"user_id": current_user["id"]},
-        {"_id": 0}
-    ).sort("started_at", -1).to_list(20)
-    return sessions
+async def get_focus_history(
+    request: Request,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_claims),
+    etag: str = Depends(data_etag)
+):
+    # Newest first; X-Next-Cursor, when present, fetches the following page
+    after = None
+    if cursor:
+        after = focus_timer.decode_cursor(cursor)
+        if after is None:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
+    sessions, next_cursor = await focus_timer.history_page(db, current_user["id"], limit, after)
+    response = tagged(fast_response(sessions, List[FocusSessionResponse]), etag)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+@api_router.get("/focus/totals", response_model=Dict[str, TaskFocusTotals])
+async def get_task_focus_totals(
+    request: Request,
+    task_ids: str = Query(..., description="Comma-separated task ids"),
+    current_user: dict = Depends(get_current_claims),
+    etag: str = Depends(data_etag)
+):
+    ids = list(dict.fromkeys(task_id for task_id in task_ids.split(",") if task_id))
+    if len(ids) > FOCUS_TOTALS_MAX_TASKS:
+        raise HTTPException(status_code=400, detail=f"At most {FOCUS_TOTALS_MAX_TASKS} tasks per request")
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
+    totals = await focus_timer.task_totals(db, current_user["id"], ids)
+    return tagged(fast_response(totals, Dict[str, TaskFocusTotals]), etag)
+
+# ============ EVENT STREAM ROUTES ============
+
+def sse_message(event: dict) -> bytes:
+    return b"id: %s\nevent: %s\ndata: %s\n\n" % (event["id"].encode(), event["type"].encode(), dumps(event))
+
+@api_router.get("/events")
+async def event_stream(
+    request: Request,
+    token: Optional[str] = None,
+    client_id: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None)
+):
+    """Server-sent events for the current user: rewards, level-ups, streaks, focus sessions.
+
+    EventSource can't send headers, so the token may come as a query
+    parameter. Events caused by ``client_id`` itself are left out.
+    """
+    authorization = request.headers.get("authorization", "")
+    token = token or (authorization[7:] if authorization.lower().startswith("bearer ") else None)
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    user_id = verify_token(token)["user_id"]
+    
+    async def stream():
+        # Subscribed inside the generator, so a client gone before the first
+        # chunk leaves nothing behind
+        subscription = events.bus.subscribe(user_id)
+        try:
+            yield b"retry: 3000\n\n"
+            # A reconnecting EventSource sends the last id it saw: replay what it missed
+            replayed = set()
+            if last_event_id:
+                for event in await events.since(db, user_id, last_event_id):
+                    replayed.add(event["id"])
+                    yield sse_message(events.public(event))
+            while not subscription.closed:
+                event = await subscription.get(timeout=EVENT_STREAM_HEARTBEAT)
+                if event is None:
+                    yield b": keep-alive\n\n"
+                elif event["id"] not in replayed and (not client_id or event["data"].get("client_id") != client_id):
+                    yield sse_message(event)
+        finally:
+            events.bus.unsubscribe(subscription)
+    
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # ============ ANALYTICS ROUTES ============
 
-@api_router.get("/analytics/dashboard")
-async def get_dashboard_analytics(current_user: dict = Depends(get_current_user)):
-    total_tasks = await db.tasks.count_documents({"user_id": current_user["id"], "completed": True})
-    pending_tasks = await db.tasks.count_documents({"user_id": current_user["id"], "completed": False})
-    
-    # Focus time this week
-    week_ago = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
-    focus_sessions = await db.focus_sessions.find(
-        {"user_id": current_user["id"], "completed": True, "started_at": {"$gte": week_ago}},
-        {"_id": 0}
-    ).to_list(100)
+async def dashboard_stats(current_user: dict) -> dict:
+    user_id = current_user["id"]
+    week_ago = dates.utc_now() - timedelta(days=7)
+    pipeline = [
+        {"$match": {"user_id": user_id, "completed": True}},
+        {"$group": {"_id": "$skill_tree", "count": {"$sum": 1}}}
+    ]
+    total_tasks, pending_tasks, focus_sessions, skill_breakdown = await asyncio.gather(
+        db.tasks.count_documents({"user_id": user_id, "completed": True}),
+        db.tasks.count_documents({"user_id": user_id, "completed": False}),
+        # Focus time this week
+        db.focus_sessions.find(
+            {"user_id": user_id, "completed": True, **dates.since("started_at", week_ago)},
+            {"_id": 0, "duration_minutes": 1}
+        ).to_list(100),
+        # Tasks by skill tree
+        db.tasks.aggregate(pipeline).to_list(20),
+    )
     
     total_focus_minutes = sum(s.get("duration_minutes", 0) for s in focus_sessions)
     
     # XP breakdown
     current_xp, next_level_xp = calculate_xp_to_next_level(current_user["xp"], current_user["level"])
     
-    # Tasks by skill tree
-    pipeline = [
-        {"$match": {"user_id": current_user["id"], "completed": True}},
-        {"$group": {"_id": "$skill_tree", "count": {"$sum": 1}}}
-    ]
-    skill_breakdown = await db.tasks.aggregate(pipeline).to_list(20)
-    
     return {
         "total_tasks": total_tasks,
         "pending_tasks": pending_tasks,
@@ -606,34 +968,49 @@ async def get_dashboard_analytics(current_user: dict = Depends(get_current_user)
         "streak": current_user.get("current_streak", 0)
     }
 
+@api_router.get("/analytics/dashboard")
+async def get_dashboard_analytics(request: Request, current_user: dict = Depends(get_current_claims), etag: str = Depends(data_etag)):
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
+    return tagged(json_response(await dashboard_stats(current_user)), etag)
+
 @api_router.get("/analytics/weekly")
-async def get_weekly_analytics(current_user: dict = Depends(get_current_user)):
-    days = []
-    for i in range(7):
-        date = (datetime.now(timezone.utc) - timedelta(days=i)).date().isoformat()
-        
-        tasks_completed = await db.tasks.count_documents({
-            "user_id": current_user["id"],
-            "completed": True,
-            "completed_at": {"$regex": f"^{date}"}
-        })
-        
-        focus_sessions = await db.focus_sessions.find({
-            "user_id": current_user["id"],
-            "completed": True,
-            "started_at": {"$regex": f"^{date}"}
-        }, {"_id": 0}).to_list(100)
-        
-        focus_minutes = sum(s.get("duration_minutes", 0) for s in focus_sessions)
-        
-        days.append({
-            "date": date,
-            "tasks_completed": tasks_completed,
-            "focus_minutes": focus_minutes
-        })
+async def get_weekly_analytics(request: Request, current_user: dict = Depends(get_current_claims), etag: str = Depends(data_etag)):
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
+    # One query per collection for the whole week, bucketed by UTC day here
+    today = dates.utc_now().date()
+    week = [today - timedelta(days=i) for i in range(6, -1, -1)]
+    week_start = dates.start_of_day(week[0])
+    tasks, focus_sessions = await asyncio.gather(
+        db.tasks.find(
+            {"user_id": current_user["id"], "completed": True, **dates.since("completed_at", week_start)},
+            {"_id": 0, "completed_at": 1}
+        ).to_list(None),
+        db.focus_sessions.find(
+            {"user_id": current_user["id"], "completed": True, **dates.since("started_at", week_start)},
+            {"_id": 0, "started_at": 1, "duration_minutes": 1}
+        ).to_list(None),
+    )
     
-    days.reverse()
-    return days
+    tasks_completed = dict.fromkeys(week, 0)
+    for task in tasks:
+        moment = dates.as_datetime(task["completed_at"])
+        if moment and moment.date() in tasks_completed:
+            tasks_completed[moment.date()] += 1
+    focus_minutes = dict.fromkeys(week, 0)
+    for session in focus_sessions:
+        moment = dates.as_datetime(session["started_at"])
+        if moment and moment.date() in focus_minutes:
+            focus_minutes[moment.date()] += session.get("duration_minutes", 0)
+    
+    days = [
+        {"date": day.isoformat(), "tasks_completed": tasks_completed[day], "focus_minutes": focus_minutes[day]}
+        for day in week
+    ]
+    return tagged(json_response(days), etag)
 
 # ============ ACHIEVEMENTS ROUTES ============
 
@@ -651,7 +1028,10 @@ ACHIEVEMENTS = [
 ]
 
 @api_router.get("/achievements", response_model=List[AchievementResponse])
-async def get_achievements(current_user: dict = Depends(get_current_user)):
+async def get_achievements(request: Request, current_user: dict = Depends(get_current_claims), etag: str = Depends(data_etag)):
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
     user_achievements = await db.achievements.find(
         {"user_id": current_user["id"]},
         {"_id": 0}
@@ -673,7 +1053,104 @@ async def get_achievements(current_user: dict = Depends(get_current_user)):
             "unlocked_at": unlocked_map.get(ach["id"], {}).get("unlocked_at")
         })
     
-    return result
+    return tagged(fast_response(result, List[AchievementResponse]), etag)
+
+# ============ DASHBOARD ROUTES ============
+
+# Seconds a dashboard section may take before the page is served without it
+DASHBOARD_SECTION_TIMEOUT = float(os.environ.get('DASHBOARD_SECTION_TIMEOUT', '3'))
+DASHBOARD_TASKS = 5
+
+dashboard_section_failures = REGISTRY.add(Counter(
+    "dashboard_section_failures_total", "Sections left out of /api/dashboard, by section and reason",
+    ("section", "reason")))
+
+async def dashboard_section(name: str, awaitable, errors: dict):
+    try:
+        return await asyncio.wait_for(awaitable, DASHBOARD_SECTION_TIMEOUT)
+    except asyncio.TimeoutError:
+        reason = "timeout"
+    except Exception as e:
+        logger.error(f"Dashboard section {name} failed: {e}")
+        reason = "error"
+    dashboard_section_failures.inc(name, reason)
+    errors[name] = reason
+    return None
+
+async def dashboard_boss_challenge(user_id: str, user: asyncio.Future) -> dict:
+    today = datetime.now(timezone.utc).date().isoformat()
+    challenge = await db.boss_challenges.find_one({"user_id": user_id, "date": today}, {"_id": 0})
+    if challenge:
+        challenge = await boss.mark_served(db, challenge)
+    else:
+        # Only a challenge created on demand needs the user document
+        challenge = await boss.get_or_create(db, await user, today)
+    return shape(challenge, BossChallengeResponse)
+
+async def dashboard_user(user: asyncio.Future) -> Optional[dict]:
+    doc = await user
+    return shape(doc, UserResponse) if doc else None
+
+@api_router.get("/dashboard")
+async def get_dashboard(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Everything the dashboard page shows, in one request.
+
+    Authenticates once and loads the sections concurrently. A section that
+    fails or takes longer than ``DASHBOARD_SECTION_TIMEOUT`` comes back as
+    null and is listed in ``errors``; the others are still returned.
+    """
+    claims = await get_current_claims(credentials)
+    user_id = claims["id"]
+    user = asyncio.ensure_future(db.users.find_one({"id": user_id}, {"_id": 0, "password": 0}))
+    sections = {
+        # Shielded: a timeout in one of the sections sharing it must not cancel it for the other
+        "user": dashboard_user(asyncio.shield(user)),
+        "tasks": db.tasks.find({"user_id": user_id, "completed": False}, {"_id": 0})
+            .sort("created_at", -1).to_list(DASHBOARD_TASKS),
+        "stats": dashboard_stats(claims),
+        "boss_challenge": dashboard_boss_challenge(user_id, asyncio.shield(user)),
+    }
+    errors = {}
+    try:
+        results = dict(zip(sections, await asyncio.gather(
+            *(dashboard_section(name, awaitable, errors) for name, awaitable in sections.items())
+        )))
+    finally:
+        user.cancel()
+    if results["user"] is None and "user" not in errors:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    response = json_response({**results, "errors": errors})
+    if results["user"] is not None:
+        response = with_fresh_claims(response, claims, user.result())
+    return response
+
+# ============ BATCH ROUTES ============
+
+# Most entries in one /api/batch request, and the seconds they get in total
+BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', '10'))
+BATCH_TIMEOUT = float(os.environ.get('BATCH_TIMEOUT', '5'))
+# Streams never finish, and a batch inside a batch would multiply the limits
+BATCH_EXCLUDED = {"/api/batch", "/api/events", "/api/focus/ws"}
+
+def batchable(path: str) -> bool:
+    return path.startswith("/api/") and path not in BATCH_EXCLUDED
+
+@api_router.post("/batch")
+async def run_batch(body: BatchRequest, request: Request,
+                    credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """GET up to ``BATCH_MAX_REQUESTS`` API paths in one round trip; see batch.py."""
+    # Verified once here; the entries then find the token in verified_tokens
+    verify_token(credentials.credentials)
+    if len(body.requests) > BATCH_MAX_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_REQUESTS} requests per batch")
+    ids = [entry.id for entry in body.requests]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Duplicate request ids")
+    
+    results = await batch.run(request.app, request.scope, [(entry.id, entry.path) for entry in body.requests],
+                              BATCH_TIMEOUT, batchable)
+    return Response(batch.encode(ids, results), media_type="application/json")
 
 # ============ ADMIN ROUTES ============
 
@@ -725,7 +1202,7 @@ async def admin_login(credentials: AdminLogin):
 
 async def verify_admin(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
-        payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        payload = verified_tokens(credentials.credentials)
         if not payload.get("admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
         return payload
@@ -755,6 +1232,39 @@ async def get_admin_stats(admin: dict = Depends(verify_admin)):
         "top_streaks": users_by_streak
     }
 
+@api_router.post("/admin/jobs/{job_id}/run")
+async def run_daily_job(job_id: str, admin: dict = Depends(verify_admin)):
+    job = DAILY_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    # Reruns today's job even if it already completed; jobs are idempotent per day
+    stats = await jobs.run_with_lease(db, job_id, job, force=True, batch_size=JOB_BATCH_SIZE)
+    if stats is None:
+        raise HTTPException(status_code=409, detail="Job is already running")
+    return stats
+
+@api_router.get("/admin/query-profile")
+async def get_query_profile(
+    limit: int = Query(20, ge=1, le=200),
+    sort: str = Query("total_ms", pattern="^(total_ms|count|mean_ms|p50_ms|p95_ms|p99_ms|max_ms|failures)$"),
+    admin: dict = Depends(verify_admin)
+):
+    # Each worker profiles its own commands; the worker id says which one answered.
+    # Commands still in the metrics backlog are folded in first.
+    REGISTRY.collect()
+    return {
+        "slow_ms": query_profiler.slow_ms,
+        "sample_every": query_profiler.sample_every,
+        "worker": os.environ.get("WORKER_ID"),
+        "shapes": query_profiler.top(limit, sort)
+    }
+
+@api_router.delete("/admin/query-profile")
+async def reset_query_profile(admin: dict = Depends(verify_admin)):
+    REGISTRY.collect()
+    query_profiler.reset()
+    return {"message": "Query profile reset"}
+
 @api_router.get("/admin/users")
 async def get_all_users(admin: dict = Depends(verify_admin)):
     users = await db.users.find({}, {"_id": 0, "password": 0}).to_list(1000)
@@ -771,7 +1281,7 @@ async def create_admin_quest(quest: QuestCreate, admin: dict = Depends(verify_ad
         "xp_reward": quest.xp_reward,
         "questions": quest.questions or [],
         "active": True,
-        "created_at": datetime.now(timezone.utc).isoformat(),
+        "created_at": dates.utc_now(),
         "created_by": "admin"
     }
     await db.admin_quests.insert_one(quest_doc)
@@ -797,9 +1307,10 @@ async def create_news(news: NewsCreate, admin: dict = Depends(verify_admin)):
         "title": news.title,
         "content": news.content,
         "category": news.category,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": dates.utc_now()
     }
     await db.news.insert_one(news_doc)
+    await public_content_changed()
     # Return clean document without _id
     return {k: v for k, v in news_doc.items() if k != "_id"}
 
@@ -811,6 +1322,7 @@ async def get_all_news(admin: dict = Depends(verify_admin)):
 @api_router.delete("/admin/news/{news_id}")
 async def delete_news(news_id: str, admin: dict = Depends(verify_admin)):
     result = await db.news.delete_one({"id": news_id})
+    await public_content_changed()
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="News not found")
     return {"message": "News deleted"}
@@ -818,7 +1330,7 @@ async def delete_news(news_id: str, admin: dict = Depends(verify_admin)):
 # ============ PUBLIC QUESTS ROUTES ============
 
 @api_router.get("/quests/available")
-async def get_available_quests(current_user: dict = Depends(get_current_user)):
+async def get_available_quests(current_user: dict = Depends(get_current_claims)):
     quests = await db.admin_quests.find({"active": True}, {"_id": 0}).to_list(50)
     
     # Check which quests user has completed
@@ -834,7 +1346,8 @@ async def get_available_quests(current_user: dict = Depends(get_current_user)):
     return quests
 
 @api_router.post("/quests/{quest_id}/submit")
-async def submit_quest(quest_id: str, answers: dict, current_user: dict = Depends(get_current_user)):
+async def submit_quest(quest_id: str, answers: dict, current_user: dict = Depends(get_current_user),
+                       x_client_id: Optional[str] = Header(None)):
     quest = await db.admin_quests.find_one({"id": quest_id}, {"_id": 0})
     if not quest:
         raise HTTPException(status_code=404, detail="Quest not found")
@@ -867,7 +1380,7 @@ async def submit_quest(quest_id: str, answers: dict, current_user: dict = Depend
         "score": score,
         "total_questions": total_questions,
         "xp_earned": xp_earned,
-        "completed_at": datetime.now(timezone.utc).isoformat()
+        "completed_at": dates.utc_now()
     })
     
     # Update user XP
@@ -879,6 +1392,12 @@ async def submit_quest(quest_id: str, answers: dict, current_user: dict = Depend
         {"id": current_user["id"]},
         {"$set": {"xp": new_xp, "level": new_level}}
     )
+    await events.append(db, [events.make_event(events.CHALLENGE_COMPLETED, current_user["id"], {
+        "quest_id": quest_id, "score": score, "total_questions": total_questions, "client_id": x_client_id
+    })])
+    await publish_reward(current_user["id"], "quest", xp_earned, new_level if level_up else None,
+                         x_client_id, quest_id=quest_id)
+    await data_versions.bump(current_user["id"])
     
     return {
         "score": score,
@@ -890,16 +1409,71 @@ async def submit_quest(quest_id: str, answers: dict, current_user: dict = Depend
 
 # ============ NEWS ROUTES (PUBLIC) ============
 
+# Public lists are the same for every caller. Concurrent misses for a key
+# share one query, and the serialized result is kept for a few seconds, so
+# a traffic spike costs one query per key per PUBLIC_CACHE_TTL.
+public_lists = LRUBytesCache(maxsize=64, ttl=float(os.environ.get('PUBLIC_CACHE_TTL', '2')))
+public_reads = SingleFlight()
+register_cache("public_lists", public_lists, COHERENCE_TTL, public_lists.ttl)
+register_cache("public_reads_coalesced", public_reads, COHERENCE_TTL, public_lists.ttl)
+
+async def public_list(key: str, load) -> CachedBody:
+    entry = public_lists.get(key)
+    if entry is not None:
+        return entry
+
+    # Requests after an invalidation don't join a fill that started before it
+    generation = public_lists.generation
+
+    async def fill():
+        body = dumps(await load())
+        return public_lists.put(key, body, body_etag(body), generation)
+
+    return await public_reads.do((key, generation), fill)
+
 @api_router.get("/news")
-async def get_public_news():
-    news = await db.news.find({}, {"_id": 0}).sort("created_at", -1).to_list(20)
-    return news
+async def get_public_news(request: Request):
+    entry = await public_list("news", lambda: db.news.find({}, {"_id": 0}).sort("created_at", -1).to_list(20))
+    return cached_response(entry, request)
 
 # ============ LEARNING ROUTES ============
 
+# Rendered article bodies, keyed by content id. Holds the serialized
+# response plus its gzip variant so hot reads skip Mongo and JSON encoding.
+learning_cache = LRUBytesCache(
+    maxsize=int(os.environ.get('LEARNING_CACHE_SIZE', '256')),
+    ttl=float(os.environ.get('LEARNING_CACHE_TTL', '300'))
+)
+register_cache("learning", learning_cache, COHERENCE_TTL, learning_cache.ttl)
+
+def drop_public_content(learning_id: Optional[str] = None):
+    if learning_id:
+        learning_cache.invalidate(learning_id)
+    public_lists.clear()
+
+async def public_content_changed(learning_id: Optional[str] = None):
+    # Clears this worker's caches now and, through the outbox, the other workers'
+    drop_public_content(learning_id)
+    await events.append(db, [events.make_event(events.CONTENT_CHANGED, None, {"learning_id": learning_id})])
+
+async def drop_remote_public_content(event: dict):
+    drop_public_content(event["data"].get("learning_id"))
+
+events.bus.on_remote(events.CONTENT_CHANGED, drop_remote_public_content)
+
+# The list endpoints return raw markdown; the rendered body is only sent
+# by the detail endpoint.
+LEARNING_LIST_PROJECTION = {"_id": 0, "content_html": 0, "content_hash": 0}
+
+def prerender_learning(content_doc: dict) -> dict:
+    content_doc["content_html"] = render_markdown(content_doc.get("content", ""))
+    content_doc.pop("content_hash", None)
+    content_doc["content_hash"] = content_hash(content_doc)
+    return content_doc
+
 @api_router.post("/admin/learning")
 async def create_learning_content(content: LearningContentCreate, admin: dict = Depends(verify_admin)):
-    content_doc = {
+    content_doc = prerender_learning({
         "id": str(uuid.uuid4()),
         "title": content.title,
         "description": content.description,
@@ -907,39 +1481,60 @@ async def create_learning_content(content: LearningContentCreate, admin: dict =
         "category": content.category,
         "difficulty": content.difficulty,
         "estimated_minutes": content.estimated_minutes,
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
+        "created_at": dates.utc_now()
+    })
     await db.learning_content.insert_one(content_doc)
+    await public_content_changed()
     # Return clean document without _id
     return {k: v for k, v in content_doc.items() if k != "_id"}
 
 @api_router.get("/admin/learning")
 async def get_all_learning_admin(admin: dict = Depends(verify_admin)):
-    content = await db.learning_content.find({}, {"_id": 0}).to_list(100)
+    content = await db.learning_content.find({}, LEARNING_LIST_PROJECTION).to_list(100)
     return content
 
 @api_router.delete("/admin/learning/{content_id}")
 async def delete_learning_content(content_id: str, admin: dict = Depends(verify_admin)):
     result = await db.learning_content.delete_one({"id": content_id})
+    await public_content_changed(content_id)
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Content not found")
     return {"message": "Content deleted"}
 
 @api_router.get("/learning")
-async def get_learning_content(category: Optional[str] = None):
+async def get_learning_content(request: Request, category: Optional[str] = None):
     query = {} if not category else {"category": category}
-    content = await db.learning_content.find(query, {"_id": 0}).to_list(100)
-    return content
+    entry = await public_list(f"learning:{category or ''}",
+                              lambda: db.learning_content.find(query, LEARNING_LIST_PROJECTION).to_list(100))
+    return cached_response(entry, request)
 
-@api_router.get("/learning/{content_id}")
-async def get_learning_detail(content_id: str):
+async def load_learning_detail(content_id: str, generation: int) -> CachedBody:
     content = await db.learning_content.find_one({"id": content_id}, {"_id": 0})
     if not content:
         raise HTTPException(status_code=404, detail="Content not found")
-    return content
+    
+    # Content created before pre-rendering existed is rendered once here
+    if "content_hash" not in content:
+        prerender_learning(content)
+        await db.learning_content.update_one(
+            {"id": content_id},
+            {"$set": {"content_html": content["content_html"], "content_hash": content["content_hash"]}}
+        )
+    
+    return learning_cache.put(content_id, dumps(content), f'"{content["content_hash"]}"', generation)
+
+@api_router.get("/learning/{content_id}")
+async def get_learning_detail(content_id: str, request: Request):
+    entry = learning_cache.get(content_id)
+    if entry is None:
+        generation = learning_cache.generation
+        entry = await public_reads.do(("learning", content_id, generation),
+                                      lambda: load_learning_detail(content_id, generation))
+    return cached_response(entry, request)
 
 @api_router.post("/learning/{content_id}/complete")
-async def complete_learning(content_id: str, current_user: dict = Depends(get_current_user)):
+async def complete_learning(content_id: str, current_user: dict = Depends(get_current_user),
+                            x_client_id: Optional[str] = Header(None)):
     content = await db.learning_content.find_one({"id": content_id}, {"_id": 0})
     if not content:
         raise HTTPException(status_code=404, detail="Content not found")
@@ -959,7 +1554,7 @@ async def complete_learning(content_id: str, current_user: dict = Depends(get_cu
         "user_id": current_user["id"],
         "content_id": content_id,
         "xp_earned": xp_earned,
-        "completed_at": datetime.now(timezone.utc).isoformat()
+        "completed_at": dates.utc_now()
     })
     
     new_xp = current_user["xp"] + xp_earned
@@ -969,6 +1564,9 @@ async def complete_learning(content_id: str, current_user: dict = Depends(get_cu
         {"id": current_user["id"]},
         {"$set": {"xp": new_xp, "level": new_level}}
     )
+    await publish_reward(current_user["id"], "learning", xp_earned,
+                         new_level if new_level > current_user["level"] else None, x_client_id, content_id=content_id)
+    await data_versions.bump(current_user["id"])
     
     return {"message": "Learning completed!", "xp_earned": xp_earned}
 
@@ -984,42 +1582,65 @@ DEFAULT_MUSIC = [
     {"id": "6", "title": "Synthwave Radio", "artist": "Retro Vibes", "url": "https://www.youtube.com/watch?v=4xDzrJKXOOY", "category": "synthwave", "thumbnail": "https://i.ytimg.com/vi/4xDzrJKXOOY/hqdefault.jpg"},
 ]
 
+music_catalog = MusicCatalog(DEFAULT_MUSIC, ttl=float(os.environ.get('MUSIC_CATALOG_TTL', '60')))
+register_cache("music_catalog", music_catalog, COHERENCE_TTL, music_catalog.ttl)
+
 @api_router.post("/admin/music")
 async def add_music_track(track: MusicTrackCreate, admin: dict = Depends(verify_admin)):
+    try:
+        url, thumbnail = canonicalize_track(track.url, track.thumbnail)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     track_doc = {
         "id": str(uuid.uuid4()),
         "title": track.title,
         "artist": track.artist,
-        "url": track.url,
+        "url": url,
         "category": track.category,
-        "thumbnail": track.thumbnail or "",
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "thumbnail": thumbnail,
+        "created_at": dates.utc_now()
     }
     await db.music_tracks.insert_one(track_doc)
+    await music_catalog.refresh(db.music_tracks)
     # Return clean document without _id
     return {k: v for k, v in track_doc.items() if k != "_id"}
 
 @api_router.get("/admin/music")
 async def get_all_music_admin(admin: dict = Depends(verify_admin)):
-    tracks = await db.music_tracks.find({}, {"_id": 0}).to_list(100)
-    return DEFAULT_MUSIC + tracks
+    await music_catalog.ensure_fresh(db.music_tracks)
+    return music_catalog.tracks()
 
 @api_router.delete("/admin/music/{track_id}")
 async def delete_music_track(track_id: str, admin: dict = Depends(verify_admin)):
     result = await db.music_tracks.delete_one({"id": track_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Track not found")
+    await music_catalog.refresh(db.music_tracks)
     return {"message": "Track deleted"}
 
 @api_router.get("/music")
-async def get_music_tracks(category: Optional[str] = None):
-    custom_tracks = await db.music_tracks.find({}, {"_id": 0}).to_list(100)
-    all_tracks = DEFAULT_MUSIC + custom_tracks
-    
-    if category:
-        all_tracks = [t for t in all_tracks if t.get("category") == category]
-    
-    return all_tracks
+async def get_music_tracks(
+    request: Request,
+    category: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=100)
+):
+    await music_catalog.ensure_fresh(db.music_tracks)
+    category = category or None  # "?category=" lists every track
+    
+    if offset or limit is not None:
+        entry = music_catalog.page(category, offset, limit or 100)
+    else:
+        entry = music_catalog.body(category)
+    
+    total = len(music_catalog.tracks(category))
+    return cached_response(entry, request, headers={"X-Total-Count": str(total)})
+
+@api_router.get("/music/categories")
+async def get_music_categories():
+    await music_catalog.ensure_fresh(db.music_tracks)
+    return music_catalog.categories
 
 # ============ USER SETTINGS ============
 
@@ -1032,11 +1653,14 @@ class UserSettings(BaseModel):
     theme: str = "dark"
 
 @api_router.get("/settings")
-async def get_user_settings(current_user: dict = Depends(get_current_user)):
+async def get_user_settings(request: Request, current_user: dict = Depends(get_current_claims), etag: str = Depends(data_etag)):
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
     settings = await db.user_settings.find_one({"user_id": current_user["id"]}, {"_id": 0})
     if not settings:
         # Return defaults
-        return {
+        settings = {
             "user_id": current_user["id"],
             "music_enabled": True,
             "music_volume": 50,
@@ -1045,7 +1669,7 @@ async def get_user_settings(current_user: dict = Depends(get_current_user)):
             "focus_duration": 25,
             "theme": "dark"
         }
-    return settings
+    return tagged(json_response(settings), etag)
 
 @api_router.put("/settings")
 async def update_user_settings(settings: UserSettings, current_user: dict = Depends(get_current_user)):
@@ -1058,6 +1682,7 @@ async def update_user_settings(settings: UserSettings, current_user: dict = Depe
         {"$set": settings_doc},
         upsert=True
     )
+    await data_versions.bump(current_user["id"])
     return settings_doc
 
 # ============ AI TASK SUGGESTIONS ============
@@ -1090,6 +1715,7 @@ Return a JSON object with:
 Only return valid JSON, no markdown or explanation."""
     
     try:
+        LlmChat, UserMessage = await ai.sdk()
         chat = LlmChat(
             api_key=EMERGENT_LLM_KEY,
             session_id=f"task_suggest_{current_user['id']}_{datetime.now().timestamp()}",
@@ -1101,7 +1727,13 @@ Only return valid JSON, no markdown or explanation."""
             prompt += f"\nPreferred category: {request.skill_tree}"
         
         user_message = UserMessage(text=prompt)
-        response = await chat.send_message(user_message)
+        started = time.perf_counter()
+        try:
+            response = await chat.send_message(user_message)
+        except Exception:
+            observe_llm_call("gpt-4o", time.perf_counter() - started, system_message + prompt, outcome="error")
+            raise
+        observe_llm_call("gpt-4o", time.perf_counter() - started, system_message + prompt, response)
         
         # Try to parse JSON
         import json
@@ -1137,7 +1769,34 @@ async def get_data():
 
 @api_router.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.now(timezone.utc).isoformat()}
+    try:
+        await ping(db, timeout=1.0)
+        database = "up"
+    except Exception:
+        database = "down"
+    return {
+        "status": "healthy" if database == "up" else "degraded",
+        "database": database,
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+
+@api_router.get("/livez")
+async def liveness():
+    # The process is up and serving; says nothing about dependencies
+    return {"status": "alive"}
+
+@api_router.get("/readyz")
+async def readiness():
+    if app_state["draining"]:
+        return JSONResponse(status_code=503, content={"status": "draining"})
+    
+    pool = None if MEMORY_DB else pool_monitor.stats()
+    try:
+        latency = await ping(db, timeout=2.0)
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"status": "unavailable", "database": type(e).__name__, "pool": pool})
+    
+    return {"status": "ready", "database_ping_ms": round(latency * 1000, 2), "pool": pool}
 
 @api_router.get("/")
 async def root():
@@ -1146,41 +1805,55 @@ async def root():
 # Include the router in the main app
 app.include_router(api_router)
 
+# Inside CORS, so browsers can read the 429
+rate_limited_routes = {}
+if RATE_LIMIT_AUTH:
+    rate_limited_routes.update({("POST", path): ("auth", RATE_LIMIT_AUTH) for path in ("/api/auth/login", "/api/auth/register")})
+if RATE_LIMIT_AI:
+    rate_limited_routes.update({("POST", path): ("ai", RATE_LIMIT_AI) for path in ("/api/ai-coach/chat", "/api/ai/suggest-task")})
+if rate_limited_routes:
+    app.add_middleware(ratelimit.RateLimitMiddleware, buckets=rate_limit_buckets, routes=rate_limited_routes,
+                       identify=rate_limit_identity, per_ip=("auth",), proxy_hops=RATE_LIMIT_PROXY_HOPS)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Access-Token", "X-Next-Cursor"],
 )
 
+app.add_middleware(MetricsMiddleware)
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    snapshots = app_state["metrics"]
+    body = snapshots.render(REGISTRY) if snapshots else REGISTRY.render()
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
 # Serve static frontend files (for production deployment)
 static_dir = ROOT_DIR / "static"
 if static_dir.exists():
-    from fastapi.staticfiles import StaticFiles
-    from fastapi.responses import FileResponse
-    
-    # Serve static assets
-    app.mount("/static", StaticFiles(directory=str(static_dir / "static")), name="static")
+    static_manifest = StaticManifest(static_dir)
+    register_cache("static_assets", None, COHERENCE_IMMUTABLE)
     
-    # Serve index.html for all non-API routes (SPA support)
+    # Serve build files and index.html for all non-API routes (SPA support)
     @app.get("/{full_path:path}")
-    async def serve_spa(full_path: str):
+    async def serve_spa(full_path: str, request: Request):
         # Don't serve index.html for API routes
         if full_path.startswith("api"):
             raise HTTPException(status_code=404, detail="Not found")
         
-        # Check if file exists in static folder
-        file_path = static_dir / full_path
-        if file_path.exists() and file_path.is_file():
-            return FileResponse(str(file_path))
+        asset = static_manifest.lookup(full_path)
+        if asset is not None:
+            return static_manifest.respond(asset, request)
         
-        # Return index.html for SPA routing
-        index_path = static_dir / "index.html"
-        if index_path.exists():
-            return FileResponse(str(index_path))
+        # Missing build assets are real 404s, everything else is a client route
+        if full_path.startswith("static/") or static_manifest.index is None:
+            raise HTTPException(status_code=404, detail="Not found")
         
-        raise HTTPException(status_code=404, detail="Not found")
+        return static_manifest.respond(static_manifest.index, request)
 
 # Configure logging
 logging.basicConfig(
@@ -1188,7 +1861,3 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
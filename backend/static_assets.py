@@ -0,0 +1,127 @@
+"""Manifest-based serving for the bundled SPA build in ``backend/static``.
+
+The build directory is scanned once at startup. Every file is held in
+memory together with its gzip and brotli variants, so serving a request is
+a dict lookup plus content negotiation instead of filesystem probes.
+
+Variants produced at build time (``python static_assets.py static``)
+are picked up as-is; anything missing is compressed at startup.
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import re
+import sys
+from pathlib import Path
+from typing import Dict, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from caching import etag_matches, parse_accept_encoding
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# CRA emits fingerprinted names such as main.3f2a9c1e.js or 787.1a2b3c4d.chunk.css
+HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}(\.chunk)?\.[a-z0-9]+$")
+
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml",
+                      "application/xml", "application/manifest+json")
+MIN_COMPRESS_SIZE = 512
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+def _compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def _content_type(path: Path) -> str:
+    if path.suffix == ".js":
+        return "application/javascript"
+    return mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+
+
+class StaticAsset:
+    __slots__ = ("content_type", "etag", "cache_control", "body", "gzip_body", "br_body")
+
+    def __init__(self, content_type: str, body: bytes, immutable: bool):
+        self.content_type = content_type
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.cache_control = IMMUTABLE if immutable else REVALIDATE
+        self.body = body
+        self.gzip_body: Optional[bytes] = None
+        self.br_body: Optional[bytes] = None
+
+
+class StaticManifest:
+    def __init__(self, root: Path, index: str = "index.html"):
+        self.root = root
+        self.assets: Dict[str, StaticAsset] = {}
+        self.index = None
+        self._build()
+        self.index = self.assets.get(index)
+
+    def _build(self):
+        for path in sorted(self.root.rglob("*")):
+            if not path.is_file() or path.suffix in (".gz", ".br"):
+                continue
+            rel = path.relative_to(self.root).as_posix()
+            content_type = _content_type(path)
+            asset = StaticAsset(content_type, path.read_bytes(), bool(HASHED_NAME.search(path.name)))
+
+            if _compressible(content_type) and len(asset.body) >= MIN_COMPRESS_SIZE:
+                gz_path = path.with_name(path.name + ".gz")
+                br_path = path.with_name(path.name + ".br")
+                asset.gzip_body = gz_path.read_bytes() if gz_path.exists() else \
+                    gzip.compress(asset.body, compresslevel=6, mtime=0)
+                if br_path.exists():
+                    asset.br_body = br_path.read_bytes()
+                elif BROTLI_AVAILABLE:
+                    asset.br_body = brotli.compress(asset.body, quality=5)
+            self.assets[rel] = asset
+
+        logger.info(f"Static manifest built: {len(self.assets)} files from {self.root}")
+
+    def lookup(self, path: str) -> Optional[StaticAsset]:
+        return self.assets.get(path.lstrip("/"))
+
+    def respond(self, asset: StaticAsset, request: Request) -> Response:
+        headers = {"ETag": asset.etag, "Cache-Control": asset.cache_control, "Vary": "Accept-Encoding"}
+        if etag_matches(request.headers.get("if-none-match"), asset.etag):
+            return Response(status_code=304, headers=headers)
+
+        body = asset.body
+        accepted = parse_accept_encoding(request.headers.get("accept-encoding", ""))
+        if asset.br_body is not None and accepted.get("br", 0) > 0:
+            body = asset.br_body
+            headers["Content-Encoding"] = "br"
+        elif asset.gzip_body is not None and accepted.get("gzip", 0) > 0:
+            body = asset.gzip_body
+            headers["Content-Encoding"] = "gzip"
+        return Response(body, media_type=asset.content_type, headers=headers)
+
+
+def precompress(root: Path):
+    """Write .gz (and .br when available) siblings next to compressible files."""
+    for path in sorted(root.rglob("*")):
+        if not path.is_file() or path.suffix in (".gz", ".br"):
+            continue
+        if not _compressible(_content_type(path)) or path.stat().st_size < MIN_COMPRESS_SIZE:
+            continue
+        body = path.read_bytes()
+        path.with_name(path.name + ".gz").write_bytes(gzip.compress(body, compresslevel=9, mtime=0))
+        if BROTLI_AVAILABLE:
+            path.with_name(path.name + ".br").write_bytes(brotli.compress(body, quality=11))
+
+
+if __name__ == "__main__":
+    precompress(Path(sys.argv[1] if len(sys.argv) > 1 else Path(__file__).parent / "static"))
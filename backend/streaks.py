@@ -0,0 +1,143 @@
+"""Daily streaks and discipline-score decay.
+
+Activity (logging in, completing a task or a focus session) advances the
+streak immediately through ``record_activity``. Everything that happens
+because of *inactivity* is done by a batch job instead: once per UTC day
+it walks the users who missed yesterday, ordered by the
+(last_active_date, id) index, breaks their streaks and decays their
+discipline score. Users are streamed from one cursor and written back
+with ``bulk_write`` every ``batch_size`` users, so memory is bounded by
+the batch and a million users cost a thousand round trips.
+
+Every write is conditional on the ``last_active_date`` that was read, so
+a user who becomes active while the job runs keeps the new streak. The
+job is idempotent for a given day and scheduled through jobs.py.
+"""
+import logging
+import os
+import time
+from datetime import date, timedelta
+from typing import Optional
+
+from pymongo import UpdateOne
+
+import events
+from jobs import utc_today
+
+logger = logging.getLogger(__name__)
+
+# Discipline lost per missed day, and the score it never decays below
+DISCIPLINE_DECAY = float(os.environ.get('DISCIPLINE_DECAY', '0.95'))
+DISCIPLINE_FLOOR = int(os.environ.get('DISCIPLINE_FLOOR', '10'))
+
+
+async def ensure_indexes(db):
+    try:
+        await db.users.create_index("id", unique=True)
+        await db.users.create_index([("last_active_date", 1), ("id", 1)])
+    except Exception as e:
+        logger.error(f"Could not create user indexes: {e}")
+
+
+def _streak_event(user_id: str, old: int, new: int, reason: str) -> dict:
+    return events.make_event(events.STREAK_CHANGED, user_id, {"old": old, "new": new, "reason": reason})
+
+
+async def record_activity(db, user: dict, today: Optional[date] = None) -> dict:
+    """Count today as active for ``user``, extending or restarting the streak.
+
+    Updates ``user`` in place and returns the fields that changed (empty
+    when today was already counted).
+    """
+    today = today or utc_today()
+    last = user.get("last_active_date")
+    if last == today.isoformat():
+        return {}
+
+    old = user.get("current_streak", 0)
+    extended = last == (today - timedelta(days=1)).isoformat()
+    streak = old + 1 if extended else 1
+    changes = {
+        "current_streak": streak,
+        "longest_streak": max(user.get("longest_streak", 0), streak),
+        "last_active_date": today.isoformat(),
+    }
+    # Conditional on the date we read: concurrent requests count the day once
+    result = await db.users.update_one({"id": user["id"], "last_active_date": last}, {"$set": changes})
+    if not result.modified_count:
+        return {}
+
+    user.update(changes)
+    if streak != old:
+        await events.append(db, [_streak_event(user["id"], old, streak, "extended" if extended else "started")])
+    return changes
+
+
+def decayed_score(score: float, missed_days: int) -> int:
+    if score <= DISCIPLINE_FLOOR or missed_days <= 0:
+        return score
+    return max(DISCIPLINE_FLOOR, round(score * DISCIPLINE_DECAY ** missed_days))
+
+
+def _missed_days(user: dict, yesterday: date) -> int:
+    """Missed days not yet charged to the user's discipline score."""
+    charged_through = max(user["last_active_date"], user.get("discipline_decayed_through") or "")
+    try:
+        return (yesterday - date.fromisoformat(charged_through)).days
+    except ValueError:
+        return 1
+
+
+async def run(db, today: Optional[date] = None, batch_size: int = 1000, on_batch=None) -> dict:
+    """Break the streaks and decay the scores of users who missed yesterday."""
+    today = today or utc_today()
+    yesterday = today - timedelta(days=1)
+    stats = {"date": today.isoformat(), "scanned": 0, "updated": 0, "streaks_broken": 0, "batches": 0}
+    started = time.perf_counter()
+
+    cursor = db.users.find(
+        {
+            "last_active_date": {"$lt": yesterday.isoformat()},
+            "discipline_decayed_through": {"$not": {"$gte": yesterday.isoformat()}},
+            "$or": [{"current_streak": {"$gt": 0}}, {"discipline_score": {"$gt": DISCIPLINE_FLOOR}}],
+        },
+        {"_id": 0, "id": 1, "last_active_date": 1, "current_streak": 1,
+         "discipline_score": 1, "discipline_decayed_through": 1},
+    ).sort([("last_active_date", 1), ("id", 1)]).batch_size(batch_size)
+
+    ops, pending_events = [], []
+
+    async def flush():
+        if ops:
+            result = await db.users.bulk_write(ops, ordered=False)
+            stats["updated"] += result.modified_count
+        await events.append(db, pending_events)
+        stats["batches"] += 1
+        ops.clear()
+        pending_events.clear()
+        if on_batch:
+            await on_batch(stats)
+
+    async for user in cursor:
+        stats["scanned"] += 1
+        changes = {"discipline_decayed_through": yesterday.isoformat()}
+        score = user.get("discipline_score", 50)
+        new_score = decayed_score(score, _missed_days(user, yesterday))
+        if new_score != score:
+            changes["discipline_score"] = new_score
+        streak = user.get("current_streak", 0)
+        if streak > 0:
+            changes["current_streak"] = 0
+            stats["streaks_broken"] += 1
+            pending_events.append(_streak_event(user["id"], streak, 0, "broken"))
+
+        # data_version: the user's cached analytics show the old streak (see versions.py)
+        ops.append(UpdateOne({"id": user["id"], "last_active_date": user["last_active_date"]},
+                             {"$set": changes, "$inc": {"data_version": 1}}))
+        if len(ops) >= batch_size:
+            await flush()
+
+    if ops or pending_events:
+        await flush()
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    return stats
@@ -0,0 +1,172 @@
+"""Refresh tokens and access-token revocation.
+
+Access tokens are short-lived JWTs (see ``create_token`` in server.py)
+carrying a snapshot of the user's hot claims, so read-only routes answer
+without fetching the user. Sessions last through long-lived refresh
+tokens: random strings handed to the client once and stored only as their
+SHA-256 digest in ``refresh_tokens``, which a TTL index expires.
+
+Every access token also carries the user's ``token_version`` as ``ver``.
+Revoking a user's sessions bumps the version, deletes their refresh
+tokens and stamps ``tokens_revoked_at``. Access tokens expire on their
+own, so only users revoked within the last access-token lifetime can
+still present a stale one: ``Revocations`` keeps just those users'
+versions in memory and reloads them every few seconds, which is how long
+another worker may go on accepting a revoked token.
+
+Verifying a JWT's HMAC and parsing its claims costs tens of microseconds,
+paid on every request for a token the client presents hundreds of times.
+``VerifiedTokenCache`` remembers decoded payloads until they expire;
+revocation is still checked on every use.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import secrets
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+
+from dates import as_datetime, since
+
+logger = logging.getLogger(__name__)
+
+ACCESS_TOKEN_MINUTES = float(os.environ.get('ACCESS_TOKEN_MINUTES', '15'))
+REFRESH_TOKEN_DAYS = float(os.environ.get('REFRESH_TOKEN_DAYS', '30'))
+REVOCATION_POLL_SECONDS = float(os.environ.get('REVOCATION_POLL_SECONDS', '10'))
+VERIFIED_TOKEN_CACHE_SIZE = int(os.environ.get('VERIFIED_TOKEN_CACHE_SIZE', '10000'))
+
+_time = time.time
+
+
+def _digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+async def ensure_indexes(db):
+    try:
+        await db.refresh_tokens.create_index("token_hash", unique=True)
+        await db.refresh_tokens.create_index("user_id")
+        await db.refresh_tokens.create_index("expires_at", expireAfterSeconds=0)
+        await db.users.create_index("tokens_revoked_at", sparse=True)
+    except Exception as e:
+        logger.error(f"Could not create token indexes: {e}")
+
+
+async def issue_refresh_token(db, user_id: str) -> str:
+    token = secrets.token_urlsafe(32)
+    now = datetime.now(timezone.utc)
+    await db.refresh_tokens.insert_one({
+        "token_hash": _digest(token),
+        "user_id": user_id,
+        "created_at": now,
+        "expires_at": now + timedelta(days=REFRESH_TOKEN_DAYS),
+    })
+    return token
+
+
+async def redeem_refresh_token(db, token: str) -> Optional[str]:
+    """The user id ``token`` was issued to, or None if unknown or expired."""
+    entry = await db.refresh_tokens.find_one({"token_hash": _digest(token)}, {"_id": 0, "user_id": 1, "expires_at": 1})
+    if not entry:
+        return None
+    # The TTL monitor only runs once a minute
+    if as_datetime(entry["expires_at"]) <= datetime.now(timezone.utc):
+        return None
+    return entry["user_id"]
+
+
+async def revoke_refresh_token(db, token: str) -> bool:
+    result = await db.refresh_tokens.delete_one({"token_hash": _digest(token)})
+    return result.deleted_count > 0
+
+
+class Revocations:
+    """``user_id -> token_version`` for users revoked in the last access-token lifetime."""
+
+    def __init__(self, db, window_minutes: float = ACCESS_TOKEN_MINUTES):
+        self.db = db
+        self.window = timedelta(minutes=window_minutes)
+        self.versions: Dict[str, int] = {}
+
+    def is_current(self, user_id: Optional[str], version: int) -> bool:
+        return version >= self.versions.get(user_id, 0)
+
+    async def revoke_all(self, user_id: str) -> int:
+        """End every session of ``user_id``; returns the new token version."""
+        user = await self.db.users.find_one_and_update(
+            {"id": user_id},
+            {"$inc": {"token_version": 1},
+             "$set": {"tokens_revoked_at": datetime.now(timezone.utc)}},
+            projection={"_id": 0, "token_version": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        await self.db.refresh_tokens.delete_many({"user_id": user_id})
+        version = user["token_version"] if user else 0
+        # Effective here at once, on the other workers at their next reload
+        self.versions[user_id] = max(version, self.versions.get(user_id, 0))
+        return version
+
+    async def reload(self):
+        cursor = self.db.users.find(
+            since("tokens_revoked_at", datetime.now(timezone.utc) - self.window),
+            {"_id": 0, "id": 1, "token_version": 1}
+        )
+        self.versions = {user["id"]: user.get("token_version", 0) async for user in cursor}
+
+    async def run(self, interval: float = REVOCATION_POLL_SECONDS):
+        while True:
+            try:
+                await self.reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Keep the last known set rather than forgetting revocations
+                logger.error(f"Could not reload token revocations: {e}")
+            await asyncio.sleep(interval)
+
+
+class VerifiedTokenCache:
+    """Bounded LRU of decoded token payloads, keyed by the token's SHA-256.
+
+    Calling it returns ``decode(token)``, from the cache while the payload's
+    ``exp`` is in the future. Only tokens that decoded are stored, so a
+    forged, tampered or expired token always goes through ``decode`` and
+    raises from there. Payloads are shared between callers: read only.
+    """
+
+    def __init__(self, decode: Callable[[str], dict], maxsize: int = VERIFIED_TOKEN_CACHE_SIZE):
+        self.decode = decode
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+
+    def __call__(self, token: str) -> dict:
+        # Hashed so the cache holds no usable credentials
+        key = hashlib.sha256(token.encode()).digest()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > _time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+        self.misses += 1
+        payload = self.decode(token)
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)) and self.maxsize > 0:
+            self._entries[key] = (exp, payload)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return payload
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
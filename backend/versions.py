@@ -0,0 +1,64 @@
+"""Per-user data versions, for conditional GETs on user-scoped reads.
+
+Every write to a user's data increments ``users.data_version``, after the
+data itself has been written. Read routes tag their responses with an
+ETag derived from the version they saw *before* querying, and answer a
+matching ``If-None-Match`` with 304 without running their queries. A read
+racing a write can only carry an older version than its body, which costs
+a refetch later and never a stale 304.
+
+Versions are cached per worker for ``VERSION_CACHE_SECONDS``, so a
+revalidation that hits the cache costs no database query at all. A write
+updates the cache of the worker that made it at once; other workers may
+answer 304 for the previous version until their entry expires.
+"""
+import os
+import time
+from typing import Dict, Tuple
+
+from pymongo import ReturnDocument
+
+VERSION_CACHE_SECONDS = float(os.environ.get('VERSION_CACHE_SECONDS', '2'))
+
+_monotonic = time.monotonic
+
+
+class DataVersions:
+    """``user_id -> data_version``, cached for ``ttl`` seconds."""
+
+    def __init__(self, db, ttl: float = VERSION_CACHE_SECONDS, maxsize: int = 100000):
+        self.db = db
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, Tuple[int, float]] = {}
+
+    def _store(self, user_id: str, version: int):
+        if len(self._entries) >= self.maxsize:
+            now = _monotonic()
+            self._entries = {k: v for k, v in self._entries.items() if v[1] > now}
+            if len(self._entries) >= self.maxsize:
+                self._entries.clear()
+        self._entries[user_id] = (version, _monotonic() + self.ttl)
+
+    async def get(self, user_id: str) -> int:
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[1] > _monotonic():
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        user = await self.db.users.find_one({"id": user_id}, {"_id": 0, "data_version": 1})
+        version = (user or {}).get("data_version", 0)
+        self._store(user_id, version)
+        return version
+
+    async def bump(self, user_id: str) -> int:
+        """Mark ``user_id``'s data as changed; call after the write itself."""
+        user = await self.db.users.find_one_and_update(
+            {"id": user_id}, {"$inc": {"data_version": 1}},
+            projection={"_id": 0, "data_version": 1}, return_document=ReturnDocument.AFTER,
+        )
+        version = (user or {}).get("data_version", 0)
+        self._store(user_id, version)
+        return version
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Per-request cost of token authentication (verify_token in server.py).
+
+Replays a stream of requests from --sessions signed-in clients at --rps
+requests per second. Each client renews its access token every
+ACCESS_TOKEN_MINUTES, so a matching share of requests carries a token the
+worker has never seen. The stream goes through verify_token:
+
+- without the verified-token cache (a full jwt.decode, with HMAC, every time),
+- with it (one SHA-256 and a dict lookup, plus a decode per new token),
+
+and through get_current_claims, the dependency read-only routes use. It
+reports microseconds per request and the share of one core that auth
+takes at the given rate.
+
+    python benchmarks/bench_auth.py [--rps 5000] [--sessions 2000] [--requests 200000]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+os.environ.setdefault("DB_BACKEND", "memory")
+os.environ.setdefault("JOB_INTERVAL", "0")
+
+import server  # noqa: E402
+import tokens  # noqa: E402
+from fastapi.security import HTTPAuthorizationCredentials  # noqa: E402
+
+
+def request_stream(sessions: int, requests: int, rps: float):
+    """Tokens in request order, with renewals spread as they would be at ``rps``."""
+    users = [{"id": f"user-{i}", "email": f"user{i}@example.com", "username": f"user{i}",
+              "level": 3, "xp": 450, "current_streak": 4} for i in range(sessions)]
+    current = [server.create_token(user) for user in users]
+    # Each session renews once per access-token lifetime
+    renewals_per_request = sessions / (tokens.ACCESS_TOKEN_MINUTES * 60) / rps
+    rng = random.Random(42)
+    stream, renewed = [], 0
+    for _ in range(requests):
+        i = rng.randrange(sessions)
+        if rng.random() < renewals_per_request:
+            users[i]["xp"] += 1  # a different payload, so a different token
+            current[i] = server.create_token(users[i])
+            renewed += 1
+        stream.append(current[i])
+    return stream, renewed
+
+
+def report(label: str, seconds: float, requests: int, rps: float):
+    per_request = seconds / requests
+    print(f"{label:<34} {per_request * 1e6:7.2f} us/request   {per_request * rps * 100:5.1f}% of a core")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rps", type=float, default=5000)
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=200000)
+    args = parser.parse_args()
+
+    stream, renewed = request_stream(args.sessions, args.requests, args.rps)
+    print(f"{args.requests} requests from {args.sessions} sessions at {args.rps:g} rps, "
+          f"{renewed} carrying a renewed token")
+
+    verify = server.verify_token
+    cache = server.verified_tokens
+
+    cache.maxsize = 0
+    started = time.perf_counter()
+    for token in stream:
+        verify(token)
+    report("verify_token, no cache", time.perf_counter() - started, args.requests, args.rps)
+
+    cache.maxsize = tokens.VERIFIED_TOKEN_CACHE_SIZE
+    cache.clear()
+    cache.hits = cache.misses = 0
+    started = time.perf_counter()
+    for token in stream:
+        verify(token)
+    report("verify_token, cached", time.perf_counter() - started, args.requests, args.rps)
+    print(f"{'':<34} hit rate {cache.hits / (cache.hits + cache.misses):.2%}, {len(cache)} entries")
+
+    credentials = [HTTPAuthorizationCredentials(scheme="Bearer", credentials=token) for token in stream]
+    claims = server.get_current_claims
+
+    async def resolve_all():
+        for credential in credentials:
+            await claims(credential)
+
+    started = time.perf_counter()
+    asyncio.run(resolve_all())
+    report("get_current_claims, cached", time.perf_counter() - started, args.requests, args.rps)
+
+
+if __name__ == "__main__":
+    main()
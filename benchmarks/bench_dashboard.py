@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Time to dashboard: the page's four separate calls against one /api/dashboard.
+
+Before, the dashboard needed /auth/me, /tasks?completed=false,
+/analytics/dashboard and /boss-challenge/today. Each one authenticated
+and ran its queries one after another; the benchmark fires all four at
+once, as a browser would. After, one /api/dashboard request
+authenticates once and runs every query concurrently.
+
+The app runs in process on the in-memory database. --rtt-ms is added to
+every HTTP request (client <-> server) and --db-ms to every database
+operation (server <-> MongoDB), so the numbers show what round trips cost
+rather than what this machine does. A run with both at 0 reports CPU per
+page load.
+
+    python benchmarks/bench_dashboard.py [--loads 200] [--rtt-ms 40] [--db-ms 2]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+os.environ.setdefault("DB_BACKEND", "memory")
+os.environ.setdefault("JOB_INTERVAL", "0")
+
+import httpx  # noqa: E402
+
+import memdb  # noqa: E402
+import server  # noqa: E402
+
+SEPARATE = ["/api/auth/me", "/api/tasks?completed=false", "/api/analytics/dashboard", "/api/boss-challenge/today"]
+COMPOSITE = ["/api/dashboard"]
+
+
+async def seed(client: httpx.AsyncClient) -> dict:
+    response = await client.post("/api/auth/register", json={
+        "username": "bench", "email": "bench@example.com", "password": "bench-password"})
+    headers = {"Authorization": f"Bearer {response.json()['token']}"}
+    for i in range(30):
+        await client.post("/api/tasks", headers=headers, json={
+            "title": f"Task {i}", "skill_tree": ["mind", "body", "skill"][i % 3],
+            "difficulty": 1 + i % 5, "estimated_minutes": 25})
+    await client.get("/api/boss-challenge/today", headers=headers)
+    return headers
+
+
+async def page_load(client: httpx.AsyncClient, headers: dict, paths, rtt: float):
+    async def call(path):
+        await asyncio.sleep(rtt)
+        response = await client.get(path, headers=headers)
+        response.raise_for_status()
+
+    await asyncio.gather(*(call(path) for path in paths))
+
+
+async def measure(client, headers, paths, loads: int, rtt: float):
+    ops_before = sum(server.db.op_counts.values())
+    cpu_before = time.process_time()
+    times = []
+    for _ in range(loads):
+        started = time.perf_counter()
+        await page_load(client, headers, paths, rtt)
+        times.append(time.perf_counter() - started)
+    cpu = time.process_time() - cpu_before
+    ops = sum(server.db.op_counts.values()) - ops_before
+    return statistics.median(times), max(times), cpu / loads, ops / loads
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--loads", type=int, default=200)
+    parser.add_argument("--rtt-ms", type=float, default=40.0)
+    parser.add_argument("--db-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        headers = await seed(client)
+
+        print(f"{'':<24} {'median':>10} {'max':>10} {'cpu/load':>10} {'db ops':>7}")
+        for rtt_ms, db_ms in ((0.0, 0.0), (args.rtt_ms, args.db_ms)):
+            memdb.ROUND_TRIP_SECONDS = db_ms / 1000
+            print(f"rtt {rtt_ms:g} ms, db {db_ms:g} ms")
+            loads = args.loads if rtt_ms or db_ms else args.loads * 5
+            for label, paths in (("four calls", SEPARATE), ("/api/dashboard", COMPOSITE)):
+                median, worst, cpu, ops = await measure(client, headers, paths, loads, rtt_ms / 1000)
+                print(f"  {label:<22} {median * 1000:8.2f}ms {worst * 1000:8.2f}ms "
+                      f"{cpu * 1000:8.2f}ms {ops:7.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
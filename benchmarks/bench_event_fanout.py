@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Fan-out cost of the per-user event bus (events.py) with many idle streams.
+
+Opens N subscriptions, each consumed by a task shaped like the /api/events
+stream loop (waiting with a heartbeat timeout), and reports:
+
+- memory held per idle connection (bus side: subscription + consumer task),
+- publishing one event for a user while N others sit idle,
+- publishing one event to each of the N users and how long until every
+  consumer has received it,
+- the same with slow consumers that never read, to show the queues stay
+  bounded (drop-oldest) instead of growing.
+
+Socket buffers and HTTP framing are not included; they are the server's
+per-connection cost whichever way events are produced.
+
+    python benchmarks/bench_event_fanout.py [--connections 10000] [--queue 100]
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+import events  # noqa: E402
+
+
+async def consume(subscription, received, done, expected):
+    while not subscription.closed:
+        event = await subscription.get(timeout=15)
+        if event is not None:
+            received[0] += 1
+            if received[0] == expected:
+                done.set()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--queue", type=int, default=events.SUBSCRIBER_QUEUE)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    bus = events.EventBus(queue_size=args.queue)
+    users = [f"user-{i}" for i in range(args.connections)]
+    received, done = [0], asyncio.Event()
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    subscriptions = [bus.subscribe(user) for user in users]
+    tasks = [asyncio.create_task(consume(s, received, done, args.connections * args.rounds)) for s in subscriptions]
+    await asyncio.sleep(0.1)  # every consumer parked on its wait
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"idle connections:   {args.connections}")
+    print(f"memory per idle:    {(after - before) / args.connections:,.0f} B")
+
+    # One user's event while everyone else idles: cost independent of N
+    event = events.make_event(events.XP_EARNED, users[0], {"xp_earned": 10})
+    started = time.perf_counter()
+    for _ in range(10000):
+        event["id"] = str(time.perf_counter_ns())
+        bus.publish(event)
+    print(f"publish to 1 user:  {(time.perf_counter() - started) / 10000 * 1e6:.2f} us/event")
+    await asyncio.sleep(0.1)
+    received[0] = 0
+
+    # One event to every user, repeated
+    started = time.perf_counter()
+    for round_ in range(args.rounds):
+        for user in users:
+            bus.publish(events.make_event(events.LEVEL_UP, user, {"new_level": round_}))
+    published = time.perf_counter() - started
+    await asyncio.wait_for(done.wait(), 60)
+    total = time.perf_counter() - started
+    count = args.connections * args.rounds
+    print(f"fan-out publish:    {count} events in {published:.3f}s ({count / published:,.0f}/s)")
+    print(f"fan-out delivered:  all received after {total:.3f}s ({count / total:,.0f}/s)")
+
+    # Consumers that stopped reading: queues cap at --queue, the rest is dropped
+    for task in tasks:
+        task.cancel()
+    for round_ in range(args.queue * 3):
+        for user in users[:1000]:
+            bus.publish(events.make_event(events.XP_EARNED, user, {"xp_earned": round_}))
+    queued = sum(len(s.queue) for s in subscriptions[:1000])
+    dropped = sum(s.dropped for s in subscriptions[:1000])
+    print(f"stalled consumers:  1000 x {args.queue * 3} events -> {queued} queued, {dropped} dropped")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Cost of holding many running focus sessions in one worker (focus_timer.py).
+
+Seeds N running sessions with random remaining times, then measures:
+recovering them from the database into the timer wheel, the memory the
+engine holds for them, the per-second cost of advancing the wheel with a
+share of users connected (ticks), and expiring a burst of sessions that
+all come due in the same second. The award callback is a no-op, so the
+expiry figure is the engine's own cost plus one conditional update each.
+
+    python benchmarks/bench_focus_timers.py [--sessions 50000] [--connected 0.2]
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+import focus_timer  # noqa: E402
+from memdb import MemoryClient  # noqa: E402
+
+
+def make_sessions(n: int, now: float, seed: int):
+    rng = random.Random(seed)
+    for _ in range(n):
+        duration = rng.choice([15, 25, 45, 60])
+        started = now - rng.uniform(0, duration * 60)
+        yield {
+            "id": str(uuid.uuid4()),
+            "user_id": str(uuid.uuid4()),
+            "duration_minutes": duration,
+            "task_id": None,
+            "completed": False,
+            "xp_earned": 0,
+            "status": focus_timer.RUNNING,
+            "elapsed_seconds": 0.0,
+            "started_at": focus_timer._at(started),
+            "resumed_at": focus_timer._at(started),
+            "completed_at": None,
+        }
+
+
+async def no_award(session, minutes, client_id):
+    return {}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50000)
+    parser.add_argument("--connected", type=float, default=0.2, help="share of users with an open WebSocket")
+    parser.add_argument("--burst", type=int, default=2000, help="sessions expiring in the same second")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    db = MemoryClient()["cyberfocus_bench_focus"]
+    engine = focus_timer.FocusEngine(db, no_award, tick_seconds=5)
+    await engine.ensure_indexes()
+    docs = list(make_sessions(args.sessions, time.time(), args.seed))
+    await db.focus_sessions.insert_many(docs, ordered=False)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    recovered = await engine.recover()
+    recover_seconds = time.perf_counter() - started
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"recovered:       {recovered} sessions in {recover_seconds:.2f}s")
+    print(f"held in memory:  {held / 2**20:.1f} MiB  ({held / max(recovered, 1):,.0f} B/session)")
+
+    # Connected users get a tick timer as well
+    rng = random.Random(args.seed)
+    for doc in rng.sample(docs, int(len(docs) * args.connected)):
+        engine.subscribers[doc["user_id"]] = {asyncio.Queue(maxsize=focus_timer.SUBSCRIBER_QUEUE)}
+        engine._track(engine.sessions[doc["id"]])
+    print(f"timers:          {len(engine.wheel)}")
+
+    # Advance the wheel second by second over a minute of simulated time, without the expiries
+    now = time.time()
+    focus_timer._now = lambda: clock
+    fired, cost = 0, 0.0
+    for second in range(1, 61):
+        clock = now + second
+        started = time.perf_counter()
+        keys = engine.wheel.advance(clock)
+        for kind, session_id in keys:
+            if kind == "tick":
+                doc = engine.sessions[session_id]
+                engine._publish("tick", doc)
+                engine._schedule_tick(doc)
+        cost += time.perf_counter() - started
+        fired += len(keys)
+    print(f"wheel advance:   {cost / 60 * 1000:.2f} ms per second of wall time ({fired / 60:,.0f} timers fired/s)")
+
+    focus_timer._now = time.time
+
+    # A burst of sessions all due now
+    burst = list(engine.sessions)[:args.burst]
+    for session_id in burst:
+        engine.sessions[session_id]["elapsed_seconds"] = 0.0
+    started = time.perf_counter()
+    await engine._expire_all(burst)
+    seconds = time.perf_counter() - started
+    completed = await db.focus_sessions.count_documents({"completed": True})
+    print(f"expiry burst:    {completed} completed in {seconds:.2f}s ({completed / max(seconds, 1e-9):,.0f}/s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Measures the request-path cost of the metrics: MetricsMiddleware and the
+MongoDB command listener (MongoCommandListener, feeding QueryProfiler).
+
+Drives the real FastAPI app in-process over raw ASGI (no sockets) against
+/api/tasks, a signed-in read that queries the database, on the in-memory
+backend (which calls command listeners like Motor does). Requests are
+timed one by one in groups of four, without, with, with and without the
+metrics (with, without, without, with in every other group), so a machine
+speeding up or slowing down cancels out of each group's difference. The
+budget is checked against the median of the groups' differences relative
+to their requests without metrics; the scheduling noise of a shared
+machine swamps anything coarser.
+
+The middleware timed alone around a no-op app is printed as well, as a
+diagnostic.
+
+    python benchmarks/bench_metrics_overhead.py [--groups 10000] [--budget 2.0]
+"""
+
+import argparse
+import asyncio
+import gc
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+os.environ.setdefault("DB_BACKEND", "memory")
+os.environ.setdefault("JOB_INTERVAL", "0")
+
+import server  # noqa: E402
+from dates import utc_now  # noqa: E402
+from metrics import MetricsMiddleware  # noqa: E402
+
+
+def build_stack(with_metrics: bool):
+    app = server.app
+    saved = list(app.user_middleware)
+    if not with_metrics:
+        app.user_middleware = [m for m in saved if m.cls is not MetricsMiddleware]
+    stack = app.build_middleware_stack()
+    app.user_middleware = saved
+    return stack
+
+
+async def seed(tasks: int) -> str:
+    """A user with ``tasks`` tasks; returns their access token."""
+    user = {"id": str(uuid.uuid4()), "email": "bench@example.com", "username": "bench", "level": 3,
+            "xp": 420, "current_streak": 2, "created_at": utc_now()}
+    await server.db.users.insert_one(dict(user))
+    now = utc_now()
+    await server.db.tasks.insert_many([{
+        "id": str(uuid.uuid4()), "user_id": user["id"], "title": f"Task {i}", "description": "Something to do",
+        "skill_tree": "focus", "difficulty": 1 + i % 3, "estimated_minutes": 25, "xp_reward": 50,
+        "completed": i % 4 == 0, "completed_at": now if i % 4 == 0 else None,
+        "created_at": now - timedelta(minutes=i),
+    } for i in range(tasks)])
+    return server.create_token(user)
+
+
+def request_timer(path: str, token: str):
+    """An ``async time(stack)`` serving one request and returning its seconds."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "client": ("127.0.0.1", 1), "server": ("bench", 80), "app": server.app,
+        "headers": [(b"host", b"bench"), (b"authorization", b"Bearer " + token.encode())],
+    }
+    status = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    async def timed(stack) -> float:
+        start = time.perf_counter()
+        await stack(dict(scope), receive, send)
+        elapsed = time.perf_counter() - start
+        if status.pop() != 200:
+            raise SystemExit(f"{path} answered an error")
+        return elapsed
+
+    return timed
+
+
+async def isolated_cost(n: int) -> float:
+    async def noop_app(scope, receive, send):
+        scope["endpoint"] = noop_app
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    async def send(message):
+        pass
+
+    middleware = MetricsMiddleware(noop_app)
+    middleware._route_paths = {noop_app: "/noop"}
+    scope = {"type": "http", "method": "GET", "app": server.app}
+
+    timings = []
+    for app in (noop_app, middleware):
+        start = time.perf_counter()
+        for _ in range(n):
+            await app(dict(scope), None, send)
+        timings.append((time.perf_counter() - start) / n)
+    return timings[1] - timings[0]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--groups", type=int, default=10000, help="groups of four requests")
+    parser.add_argument("--tasks", type=int, default=20, help="tasks the user has")
+    parser.add_argument("--budget", type=float, default=2.0, help="max overhead in percent")
+    parser.add_argument("--path", default="/api/tasks")
+    args = parser.parse_args()
+
+    token = await seed(args.tasks)
+    timed = request_timer(args.path, token)
+    listeners = server.client.command_listeners
+    bare, instrumented = build_stack(False), build_stack(True)
+
+    async def measure(with_metrics: bool) -> float:
+        server.client.command_listeners = listeners if with_metrics else []
+        return await timed(instrumented if with_metrics else bare)
+
+    for _ in range(500):
+        await measure(False)
+        await measure(True)
+
+    bare_times, instrumented_times, deltas, overheads = [], [], [], []
+    gc.disable()
+    for group in range(args.groups):
+        if group % 1000 == 0:
+            gc.collect()  # between groups, never during one
+        order = (False, True, True, False) if group % 2 else (True, False, False, True)
+        timings = {False: 0.0, True: 0.0}
+        for with_metrics in order:
+            timings[with_metrics] += await measure(with_metrics)
+        bare_times.append(timings[False] / 2)
+        instrumented_times.append(timings[True] / 2)
+        deltas.append((timings[True] - timings[False]) / 2)
+        overheads.append((timings[True] - timings[False]) / timings[False] * 100)
+    isolated = await isolated_cost(100_000)
+    gc.enable()
+    server.client.command_listeners = listeners
+
+    overhead = statistics.median(overheads)
+
+    print(f"path:             {args.path} ({args.groups} groups of four requests)")
+    print(f"without metrics:  {statistics.median(bare_times) * 1e6:8.1f} us/request (median)")
+    print(f"with metrics:     {statistics.median(instrumented_times) * 1e6:8.1f} us/request (median)")
+    print(f"overhead:         {statistics.median(deltas) * 1e6:8.2f} us/request ({overhead:.2f}%, median of groups)")
+    print(f"middleware alone: {isolated * 1e6:8.2f} us/request around a no-op app (diagnostic)")
+    print(f"budget:           {args.budget:.2f}%  ->  {'OK' if overhead <= args.budget else 'OVER BUDGET'}")
+    return 0 if overhead <= args.budget else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Per-check cost of the rate limiter (ratelimit.py).
+
+Times MemoryBuckets.hit for a hot key, for many distinct keys (one per
+client IP), and for rejected requests, plus the middleware's lookup on
+routes that are not limited at all. With --mongo-url it also times the
+shared MongoBuckets backend (one round trip per check).
+
+    python benchmarks/bench_ratelimit.py [--checks 1000000] [--keys 100000]
+    python benchmarks/bench_ratelimit.py --mongo-url mongodb://localhost:27017
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+import ratelimit  # noqa: E402
+
+
+def per_check(label: str, seconds: float, checks: int):
+    print(f"{label:<28} {seconds / checks * 1e9:8.0f} ns/check")
+
+
+def bench_memory(checks: int, keys: int):
+    generous = ratelimit.Limit(10**9, 1)
+    strict = ratelimit.Limit(1, 3600)
+
+    buckets = ratelimit.MemoryBuckets()
+    hit = buckets.hit
+    started = time.perf_counter()
+    for _ in range(checks):
+        hit("auth:ip:10.0.0.1", generous)
+    per_check("allowed, one hot key", time.perf_counter() - started, checks)
+
+    names = [f"auth:ip:10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(keys)]
+    buckets = ratelimit.MemoryBuckets()
+    hit = buckets.hit
+    started = time.perf_counter()
+    for i in range(checks):
+        hit(names[i % keys], generous)
+    per_check(f"allowed, {keys} keys", time.perf_counter() - started, checks)
+
+    buckets = ratelimit.MemoryBuckets()
+    hit = buckets.hit
+    hit("ai:u:spammer", strict)
+    started = time.perf_counter()
+    for _ in range(checks):
+        hit("ai:u:spammer", strict)
+    per_check("rejected", time.perf_counter() - started, checks)
+
+    # Lazy expiry: a sweep after every key has refilled empties the table
+    buckets = ratelimit.MemoryBuckets()
+    for name in names:
+        buckets.hit(name, ratelimit.Limit(10, 1))
+    started = time.perf_counter()
+    buckets._sweep(time.time() + 2)
+    print(f"{'sweep of ' + str(keys) + ' idle keys':<28} {(time.perf_counter() - started) * 1000:8.1f} ms "
+          f"({len(buckets.tat)} left)")
+
+    routes = {("POST", "/api/auth/login"): ("auth", generous)}
+    get = routes.get
+    key = ("GET", "/api/tasks")
+    started = time.perf_counter()
+    for _ in range(checks):
+        get(key)
+    per_check("unlimited route lookup", time.perf_counter() - started, checks)
+
+
+async def bench_mongo(url: str, checks: int):
+    from motor.motor_asyncio import AsyncIOMotorClient
+    db = AsyncIOMotorClient(url)["cyberfocus_bench_ratelimit"]
+    await db.rate_limits.drop()
+    buckets = ratelimit.MongoBuckets(db)
+    await buckets.ensure_indexes()
+    limit = ratelimit.Limit(10**9, 1)
+    started = time.perf_counter()
+    for i in range(checks):
+        await buckets.ahit(f"auth:ip:{i % 100}", limit)
+    per_check("mongo, allowed", time.perf_counter() - started, checks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--checks", type=int, default=1000000)
+    parser.add_argument("--keys", type=int, default=100000)
+    parser.add_argument("--mongo-url", help="also time the shared backend on a scratch database")
+    args = parser.parse_args()
+
+    bench_memory(args.checks, args.keys)
+    if args.mongo_url:
+        asyncio.run(bench_mongo(args.mongo_url, min(args.checks, 5000)))
+
+
+if __name__ == "__main__":
+    main()
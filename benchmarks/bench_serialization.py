@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Serialization cost of a 100-task /api/tasks response.
+
+before: FastAPI's response_model path (validate through List[TaskResponse],
+        serialize the validated models, stdlib JSONResponse)
+after:  the pre-shaped documents dumped straight to bytes (orjson when
+        installed), as get_tasks now does
+
+    python benchmarks/bench_serialization.py [--tasks 100] [--iterations 2000]
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+
+import server  # noqa: E402
+from caching import ORJSON_AVAILABLE  # noqa: E402
+
+
+def make_tasks(n: int):
+    now = datetime.now(timezone.utc)
+    user_id = str(uuid.uuid4())
+    return [{
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "title": f"Task number {i} with a reasonably descriptive title",
+        "description": "Finish the chapter, write notes and push the summary to the repo",
+        "skill_tree": ["Work", "Learning", "Health", "Creative"][i % 4],
+        "difficulty": i % 5 + 1,
+        "estimated_minutes": 30,
+        "xp_reward": 25 + i % 5 * 20,
+        "completed": i % 3 == 0,
+        "completed_at": (now - timedelta(hours=i)).isoformat() if i % 3 == 0 else None,
+        "created_at": (now - timedelta(days=i)).isoformat(),
+    } for i in range(n)]
+
+
+def response_field():
+    for route in server.app.routes:
+        if getattr(route, "path", None) == "/api/tasks" and "GET" in route.methods:
+            return route.response_field
+    raise RuntimeError("GET /api/tasks route not found")
+
+
+async def before(tasks, field) -> bytes:
+    content = await serialize_response(field=field, response_content=tasks)
+    return JSONResponse(content).body
+
+
+async def after(tasks, field) -> bytes:
+    return server.fast_response(tasks, None).body
+
+
+async def bench(fn, tasks, field, iterations: int) -> float:
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await fn(tasks, field)
+        best = min(best, (time.perf_counter() - start) / iterations)
+    return best
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    tasks = make_tasks(args.tasks)
+    field = response_field()
+    assert len(await before(tasks, field)) > 0 and len(await after(tasks, field)) > 0
+
+    old = await bench(before, tasks, field, args.iterations)
+    new = await bench(after, tasks, field, args.iterations)
+
+    print(f"tasks per response:        {args.tasks}")
+    print(f"encoder:                   {'orjson' if ORJSON_AVAILABLE else 'json (orjson not installed)'}")
+    print(f"response_model + json:     {old * 1e6:9.1f} us")
+    print(f"pre-shaped + fast encoder: {new * 1e6:9.1f} us")
+    print(f"speedup:                   {old / new:9.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Database load of the public lists (/api/news, /api/learning) as concurrency grows.
+
+--clients-list sets how many clients to run. Each client requests the two
+lists back to back for --seconds, on the in-memory database with --db-ms
+added to every operation. The run is repeated three times:
+
+- uncoalesced: every request runs its own query, as before,
+- single-flight: concurrent requests for a list share one query in flight,
+- single-flight + cache: results are also kept for PUBLIC_CACHE_TTL seconds.
+
+Uncoalesced, database queries per second grow with the number of clients
+until the database is the bottleneck. Coalesced, they stop growing: with
+the cache they level off at one query per list per TTL.
+
+    python benchmarks/bench_singleflight.py [--clients-list 1,10,100,1000] [--seconds 3] [--db-ms 5]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+os.environ.setdefault("DB_BACKEND", "memory")
+os.environ.setdefault("JOB_INTERVAL", "0")
+
+import httpx  # noqa: E402
+
+import memdb  # noqa: E402
+import server  # noqa: E402
+from caching import SingleFlight  # noqa: E402
+
+PATHS = ["/api/news", "/api/learning"]
+QUERIES = [("news", "find"), ("learning_content", "find")]
+
+
+class NoFlight:
+    """Stands in for SingleFlight: every caller runs its own load."""
+    hits = misses = 0
+
+    async def do(self, key, load):
+        return await load()
+
+
+async def seed():
+    for i in range(20):
+        await server.db.news.insert_one({
+            "id": f"news-{i}", "title": f"News {i}", "content": "Lorem ipsum " * 40,
+            "category": "update", "created_at": f"2026-01-{i + 1:02d}T00:00:00+00:00"})
+    for i in range(30):
+        await server.db.learning_content.insert_one(server.prerender_learning({
+            "id": f"learn-{i}", "title": f"Lesson {i}", "description": "A lesson",
+            "content": "# Heading\n\n" + "Some *markdown* text. " * 60, "category": "focus",
+            "difficulty": 1 + i % 3, "estimated_minutes": 10, "created_at": "2026-01-01T00:00:00+00:00"}))
+
+
+async def run_clients(client: httpx.AsyncClient, clients: int, seconds: float):
+    deadline = time.perf_counter() + seconds
+    requests = 0
+
+    async def loop():
+        nonlocal requests
+        while time.perf_counter() < deadline:
+            for path in PATHS:
+                response = await client.get(path)
+                response.raise_for_status()
+                requests += 1
+
+    queries_before = sum(server.db.op_counts[op] for op in QUERIES)
+    started = time.perf_counter()
+    await asyncio.gather(*(loop() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    queries = sum(server.db.op_counts[op] for op in QUERIES) - queries_before
+    return requests / elapsed, queries / elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients-list", default="1,10,100,1000")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--db-ms", type=float, default=5.0)
+    args = parser.parse_args()
+    levels = [int(n) for n in args.clients_list.split(",")]
+
+    await seed()
+    memdb.ROUND_TRIP_SECONDS = args.db_ms / 1000
+    ttl = server.public_lists.ttl
+    modes = (("uncoalesced", NoFlight(), 0.0),
+             ("single-flight", SingleFlight(), 0.0),
+             (f"single-flight + {ttl:g}s cache", SingleFlight(), ttl))
+
+    transport = httpx.ASGITransport(app=server.app)
+    limits = httpx.Limits(max_connections=None)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", limits=limits) as client:
+        print(f"db {args.db_ms:g} ms per operation, {args.seconds:g}s per run")
+        print(f"{'':<30} {'clients':>8} {'requests/s':>11} {'queries/s':>10}")
+        for label, flight, cache_ttl in modes:
+            server.public_reads = flight
+            server.public_lists.ttl = cache_ttl
+            for clients in levels:
+                server.public_lists.clear()
+                rps, qps = await run_clients(client, clients, args.seconds)
+                print(f"{label:<30} {clients:>8} {rps:11.0f} {qps:10.1f}")
+                label = ""
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Cold-start cost of the API, checked against benchmarks/startup_budget.json.
+
+import:       `python -X importtime -c "import server"` in a fresh
+              interpreter; reports the cumulative import time of server
+              and the heaviest top-level imports
+first health: wall clock from spawning `uvicorn server:app` to the first
+              200 from /api/health
+
+Modules listed under "lazy_modules" in the budget (the LLM SDK tree) must
+not be imported at startup at all. Exits non-zero when a median exceeds
+its budget by more than the tolerance, or a lazy module was imported.
+
+    python benchmarks/bench_startup.py [--runs 5] [--update-budget]
+
+Uses the in-memory database unless --mongo-url is given, so the numbers
+measure the app rather than the network.
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1] / "backend"
+BUDGET_FILE = Path(__file__).resolve().parent / "startup_budget.json"
+
+
+def environment(mongo_url):
+    env = dict(os.environ)
+    if mongo_url:
+        env["MONGO_URL"] = mongo_url
+        env.pop("DB_BACKEND", None)
+    else:
+        env["DB_BACKEND"] = "memory"
+    return env
+
+
+def measure_import(env):
+    """Return (server cumulative ms, {direct import of server: cumulative ms}, all module names)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND, env=env, capture_output=True, text=True, check=True,
+    )
+    names, children = [], {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header row
+        # Children are printed before their parent, indented two more spaces
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        names.append(name)
+        if depth == 0:
+            if name == "server":
+                return int(cumulative) / 1000, children, names
+            children = {}
+        elif depth == 1:
+            children[name] = int(cumulative) / 1000
+    raise RuntimeError("server import not found in -X importtime output")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_first_health(env, timeout=30.0):
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/api/health"
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - started) * 1000
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"/api/health did not answer within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="heaviest imports to list")
+    parser.add_argument("--mongo-url", help="measure against a real MongoDB instead of the memory backend")
+    parser.add_argument("--update-budget", action="store_true",
+                        help="record the measured medians (plus headroom) as the new budget")
+    args = parser.parse_args()
+
+    budget = json.loads(BUDGET_FILE.read_text())
+    env = environment(args.mongo_url)
+
+    import_runs, health_runs = [], []
+    for _ in range(args.runs):
+        server_ms, children, names = measure_import(env)
+        import_runs.append(server_ms)
+        health_runs.append(measure_first_health(env))
+
+    import_ms = statistics.median(import_runs)
+    health_ms = statistics.median(health_runs)
+
+    print("heaviest imports of server (last run):")
+    for name, ms in sorted(children.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {ms:8.1f} ms  {name}")
+    print()
+
+    lazy = sorted(name for name in names
+                  if any(name == m or name.startswith(m + ".") for m in budget["lazy_modules"]))
+
+    tolerance = budget["tolerance"]
+    rows = [("import server", import_ms, budget["import_server_ms"]),
+            ("first /api/health", health_ms, budget["first_health_ms"])]
+    failed = False
+    for label, measured, limit in rows:
+        over = measured > limit * (1 + tolerance)
+        failed |= over
+        print(f"{label:18s} median {measured:8.1f} ms   budget {limit:8.1f} ms  ->  {'OVER' if over else 'OK'}")
+    if lazy:
+        failed = True
+        print(f"imported at startup but should be lazy: {', '.join(lazy)}")
+
+    if args.update_budget:
+        budget["import_server_ms"] = round(import_ms * 1.25)
+        budget["first_health_ms"] = round(health_ms * 1.25)
+        BUDGET_FILE.write_text(json.dumps(budget, indent=2) + "\n")
+        print(f"budget updated in {BUDGET_FILE}")
+        return 0
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Throughput and memory of the daily streak job (streaks.run).
+
+Seeds N users spread over the last 60 days of activity, then times one
+run and reports users/s and bulk_write round trips. With --trace-memory
+it reports the peak memory allocated during the run instead of a
+meaningful time (tracemalloc slows Python several times). Against the memory backend the cursor holds the
+whole result set, so the peak there grows with N; against MongoDB
+(--mongo-url, a scratch database) it is bounded by --batch-size.
+
+    python benchmarks/bench_streaks.py [--users 100000] [--batch-size 1000] [--trace-memory]
+    python benchmarks/bench_streaks.py --mongo-url mongodb://localhost:27017 --users 1000000
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+import streaks  # noqa: E402
+from memdb import MemoryClient  # noqa: E402
+
+
+def make_users(n: int, today, seed: int):
+    rng = random.Random(seed)
+    for _ in range(n):
+        idle = rng.choice([0, 0, 1, 1, 2, 3, 7, 14, 30, 60])
+        yield {
+            "id": str(uuid.uuid4()),
+            "last_active_date": (today - timedelta(days=idle)).isoformat(),
+            "current_streak": rng.randint(0, 30),
+            "longest_streak": 30,
+            "discipline_score": rng.randint(10, 100),
+        }
+
+
+async def seed(db, n: int, today, seed_value: int, chunk: int = 10000):
+    await db.users.drop()
+    await db.events.drop()
+    await streaks.ensure_indexes(db)
+    batch = []
+    for user in make_users(n, today, seed_value):
+        batch.append(user)
+        if len(batch) >= chunk:
+            await db.users.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.users.insert_many(batch, ordered=False)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--trace-memory", action="store_true")
+    parser.add_argument("--mongo-url", help="run against a scratch database on this MongoDB")
+    parser.add_argument("--db-name", default="cyberfocus_bench_streaks")
+    args = parser.parse_args()
+
+    if args.mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        db = AsyncIOMotorClient(args.mongo_url)[args.db_name]
+    else:
+        db = MemoryClient()[args.db_name]
+
+    today = streaks.utc_today()
+    started = time.perf_counter()
+    await seed(db, args.users, today, args.seed)
+    print(f"seeded {args.users} users in {time.perf_counter() - started:.1f}s")
+
+    if args.trace_memory:
+        tracemalloc.start()
+    stats = await streaks.run(db, today, batch_size=args.batch_size)
+    if args.trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    print(f"scanned:         {stats['scanned']}")
+    print(f"updated:         {stats['updated']}")
+    print(f"streaks broken:  {stats['streaks_broken']}")
+    print(f"bulk writes:     {stats['batches']}")
+    print(f"time:            {stats['seconds']:.2f}s  ({stats['scanned'] / max(stats['seconds'], 1e-9):,.0f} users/s)")
+    if args.trace_memory:
+        print(f"peak memory:     {peak / 2**20:.1f} MiB")
+
+    rerun = await streaks.run(db, today, batch_size=args.batch_size)
+    print(f"rerun scanned:   {rerun['scanned']} (the job is idempotent per day)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
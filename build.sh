@@ -15,4 +15,8 @@ yarn build
 echo "=== Copying Frontend Build to Backend ==="
 cp -r build ../backend/static
 
+echo "=== Precompressing Static Assets ==="
+cd ../backend
+python static_assets.py static
+
 echo "=== Build Complete ==="
@@ -31,6 +31,54 @@ const API = `${BACKEND_URL}/api`;
 // Configure axios defaults
 axios.defaults.baseURL = API;
 
+// Identifies this tab, so its event stream skips what the tab did itself
+const CLIENT_ID = `${Date.now().toString(36)}${Math.random().toString(36).slice(2)}`;
+axios.defaults.headers.common['X-Client-Id'] = CLIENT_ID;
+
+const setAccessToken = (token) => {
+  localStorage.setItem('token', token);
+  axios.defaults.headers.common['Authorization'] = `Bearer ${token}`;
+};
+
+// Access tokens are short-lived: on a 401, renew once from the refresh
+// token (shared by concurrent requests) and replay the request
+const NO_REFRESH = ['/auth/login', '/auth/register', '/auth/refresh', '/auth/logout'];
+let refreshing = null;
+const refreshAccessToken = () => {
+  if (!refreshing) {
+    refreshing = axios
+      .post('/auth/refresh', { refresh_token: localStorage.getItem('refresh_token') })
+      .then((response) => {
+        setAccessToken(response.data.token);
+        return response.data.token;
+      })
+      .finally(() => {
+        refreshing = null;
+      });
+  }
+  return refreshing;
+};
+
+axios.interceptors.response.use(
+  (response) => {
+    // Sent by /auth/me when the token's level/xp snapshot is out of date
+    const token = response.headers['x-access-token'];
+    if (token) setAccessToken(token);
+    return response;
+  },
+  async (error) => {
+    const { config, response } = error;
+    if (response?.status !== 401 || !config || config._retried || !localStorage.getItem('refresh_token')
+        || NO_REFRESH.includes(config.url) || config.url.startsWith('/admin')) {
+      throw error;
+    }
+    config._retried = true;
+    const token = await refreshAccessToken();
+    config.headers['Authorization'] = `Bearer ${token}`;
+    return axios(config);
+  }
+);
+
 export const AuthContext = createContext(null);
 export const GameContext = createContext(null);
 
@@ -50,6 +98,35 @@ function App() {
     }
   }, []);
 
+  // Rewards earned in other tabs and devices, and by server-side timers
+  useEffect(() => {
+    if (!user) return;
+    let source;
+    let stopped = false;
+    const open = () => {
+      const token = localStorage.getItem('token');
+      source = new EventSource(
+        `${API}/events?token=${encodeURIComponent(token)}&client_id=${CLIENT_ID}`
+      );
+      source.addEventListener('xp.earned', () => fetchCurrentUser());
+      source.addEventListener('level.up', (message) => {
+        setLevelUp(JSON.parse(message.data).data.new_level);
+      });
+      // A reconnect refused because the access token expired: renew and reopen
+      source.onerror = () => {
+        if (source.readyState !== EventSource.CLOSED) return;
+        refreshAccessToken().then(() => {
+          if (!stopped) open();
+        }, () => {});
+      };
+    };
+    open();
+    return () => {
+      stopped = true;
+      source.close();
+    };
+  }, [user?.id]);
+
   const fetchCurrentUser = async () => {
     try {
       const response = await axios.get('/auth/me');
@@ -57,15 +134,16 @@ function App() {
     } catch (error) {
       console.error('Failed to fetch user:', error);
       localStorage.removeItem('token');
+      localStorage.removeItem('refresh_token');
       delete axios.defaults.headers.common['Authorization'];
     } finally {
       setLoading(false);
     }
   };
 
-  const login = (token, userData) => {
-    localStorage.setItem('token', token);
-    axios.defaults.headers.common['Authorization'] = `Bearer ${token}`;
+  const login = (token, userData, refreshToken) => {
+    setAccessToken(token);
+    localStorage.setItem('refresh_token', refreshToken);
     setUser(userData);
     toast.success('Welcome back, warrior!', {
       description: `Level ${userData.level} • ${userData.current_streak ?? 0} day streak`,
@@ -73,7 +151,12 @@ function App() {
   };
 
   const logout = () => {
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (refreshToken) {
+      axios.post('/auth/logout', { refresh_token: refreshToken }).catch(() => {});
+    }
     localStorage.removeItem('token');
+    localStorage.removeItem('refresh_token');
     delete axios.defaults.headers.common['Authorization'];
     setUser(null);
     toast.info('Logged out. Come back stronger!');
@@ -105,7 +188,7 @@ function App() {
   }
 
   return (
-    <AuthContext.Provider value={{ user, login, logout, updateUser, fetchCurrentUser }}>
+    <AuthContext.Provider value={{ user, login, logout, updateUser, fetchCurrentUser, refreshAccessToken }}>
       <GameContext.Provider value={{ showLevelUp, showXpGain }}>
         <div className="app-container">
           <div className="noise-overlay" />
@@ -0,0 +1,10 @@
+import axios from 'axios';
+
+// Several GETs in one round trip: `paths` maps ids to API paths (without
+// the /api prefix). Resolves to { id: { status, body } }.
+export async function batchGet(paths) {
+  const { data } = await axios.post('/batch', {
+    requests: Object.entries(paths).map(([id, path]) => ({ id, path: `/api${path}` })),
+  });
+  return data.responses;
+}
@@ -1,6 +1,6 @@
 import React, { useState, useEffect, useContext } from 'react';
 import { motion } from 'framer-motion';
-import axios from 'axios';
+import { batchGet } from '@/lib/api';
 import { AuthContext } from '../App';
 import Layout from '../components/Layout';
 import { 
@@ -20,12 +20,9 @@ const Analytics = () => {
 
   const fetchAnalytics = async () => {
     try {
-      const [statsRes, weeklyRes] = await Promise.all([
-        axios.get('/analytics/dashboard'),
-        axios.get('/analytics/weekly')
-      ]);
-      setStats(statsRes.data);
-      setWeekly(weeklyRes.data);
+      const responses = await batchGet({ stats: '/analytics/dashboard', weekly: '/analytics/weekly' });
+      if (responses.stats.status === 200) setStats(responses.stats.body);
+      if (responses.weekly.status === 200) setWeekly(responses.weekly.body);
     } catch (error) {
       console.error('Failed to fetch analytics:', error);
     } finally {
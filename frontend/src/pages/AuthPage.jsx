@@ -27,7 +27,7 @@ const AuthPage = () => {
           email: formData.email,
           password: formData.password
         });
-        login(response.data.token, response.data.user);
+        login(response.data.token, response.data.user, response.data.refresh_token);
       } else {
         if (formData.password.length < 6) {
           toast.error('Password must be at least 6 characters');
@@ -39,7 +39,7 @@ const AuthPage = () => {
           email: formData.email,
           password: formData.password
         });
-        login(response.data.token, response.data.user);
+        login(response.data.token, response.data.user, response.data.refresh_token);
         toast.success('Welcome to CyberFocus, warrior!');
       }
     } catch (error) {
@@ -10,7 +10,7 @@ import {
 } from 'lucide-react';
 
 const Dashboard = () => {
-  const { user, fetchCurrentUser } = useContext(AuthContext);
+  const { user, fetchCurrentUser, updateUser } = useContext(AuthContext);
   const { showLevelUp, showXpGain } = useContext(GameContext);
   const [stats, setStats] = useState(null);
   const [tasks, setTasks] = useState([]);
@@ -23,15 +23,12 @@ const Dashboard = () => {
 
   const fetchDashboardData = async () => {
     try {
-      const [tasksRes, statsRes, bossRes] = await Promise.all([
-        axios.get('/tasks?completed=false'),
-        axios.get('/analytics/dashboard'),
-        axios.get('/boss-challenge/today')
-      ]);
-
-      setTasks(tasksRes.data.slice(0, 5));
-      setStats(statsRes.data);
-      setBossChallenge(bossRes.data);
+      // One request for the whole page; sections that failed come back null
+      const { data } = await axios.get('/dashboard');
+      if (data.user) updateUser(data.user);
+      setTasks(data.tasks || []);
+      setStats(data.stats);
+      setBossChallenge(data.boss_challenge);
     } catch (error) {
       console.error('Failed to fetch dashboard data:', error);
     } finally {
@@ -6,29 +6,100 @@ import { AuthContext, GameContext } from '../App';
 import Layout from '../components/Layout';
 import { Target, Play, Pause, RotateCcw, CheckCircle, Clock, Zap } from 'lucide-react';
 
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL || window.location.origin;
+const FOCUS_WS_URL = `${BACKEND_URL.replace(/^http/, 'ws')}/api/focus/ws`;
+const HISTORY_PAGE = 5;
+
 const FocusMode = () => {
-  const { fetchCurrentUser } = useContext(AuthContext);
+  const { fetchCurrentUser, refreshAccessToken } = useContext(AuthContext);
   const { showLevelUp, showXpGain } = useContext(GameContext);
   const [duration, setDuration] = useState(25);
   const [timeLeft, setTimeLeft] = useState(25 * 60);
   const [isRunning, setIsRunning] = useState(false);
   const [session, setSession] = useState(null);
   const [history, setHistory] = useState([]);
+  const [historyCursor, setHistoryCursor] = useState(null);
   const intervalRef = useRef(null);
+  const socketRef = useRef(null);
+  const rewardedRef = useRef(new Set());
+
+  // The server owns the clock: adopt whatever state it reports for a session
+  const applyState = (state) => {
+    setSession(state);
+    setDuration(state.duration_minutes);
+    setTimeLeft(Math.ceil(state.remaining_seconds));
+    setIsRunning(state.status === 'running');
+  };
+
+  // Level-ups of sessions the timer completed come through the app's event stream
+  const showReward = (minutes, result, showLevel = true) => {
+    showXpGain(result.xp_earned, { x: '50%', y: '40%' });
+    toast.success('Focus session completed!', {
+      description: `You earned ${result.xp_earned} XP!`
+    });
+    
+    if (result.level_up && showLevel) {
+      setTimeout(() => showLevelUp(result.new_level), 1500);
+    }
+    
+    setIsRunning(false);
+    setSession(null);
+    setTimeLeft(minutes * 60);
+    fetchHistory();
+    fetchCurrentUser();
+  };
 
   useEffect(() => {
     fetchHistory();
+    let stopped = false;
+    const connect = (renewed) => {
+      const token = localStorage.getItem('token');
+      const socket = new WebSocket(`${FOCUS_WS_URL}?token=${encodeURIComponent(token)}`);
+      socket.onmessage = (event) => {
+        const message = JSON.parse(event.data);
+        if (message.type === 'state') {
+          if (message.sessions.length > 0) applyState(message.sessions[0]);
+        } else if (message.type === 'completed') {
+          // Completions this tab asked for are celebrated from the HTTP response
+          if (!rewardedRef.current.has(message.session.id)) {
+            rewardedRef.current.add(message.session.id);
+            showReward(message.session.duration_minutes, message, false);
+          }
+        } else if (message.type === 'abandoned') {
+          setSession(current => (current && current.id === message.session.id ? null : current));
+        } else {
+          applyState(message.session);
+        }
+      };
+      let opened = false;
+      socket.onopen = () => {
+        opened = true;
+      };
+      socket.onclose = () => {
+        // Refused during the handshake (an expired access token): renew it once and reconnect
+        if (!opened && !renewed && !stopped) {
+          refreshAccessToken().then(() => {
+            if (!stopped) connect(true);
+          }, () => {});
+        }
+      };
+      socketRef.current = socket;
+    };
+    connect(false);
     return () => {
+      stopped = true;
+      socketRef.current?.close();
       if (intervalRef.current) clearInterval(intervalRef.current);
     };
   }, []);
 
   useEffect(() => {
+    // Count down locally between server ticks; the server completes the session
     if (isRunning && timeLeft > 0) {
       intervalRef.current = setInterval(() => {
-        setTimeLeft(prev => prev - 1);
+        setTimeLeft(prev => Math.max(0, prev - 1));
       }, 1000);
-    } else if (timeLeft === 0 && session) {
+    } else if (timeLeft === 0 && session && socketRef.current?.readyState !== WebSocket.OPEN) {
       handleComplete();
     }
 
@@ -37,10 +108,12 @@ const FocusMode = () => {
     };
   }, [isRunning, timeLeft]);
 
-  const fetchHistory = async () => {
+  const fetchHistory = async (cursor = null) => {
     try {
-      const response = await axios.get('/focus/history');
-      setHistory(response.data);
+      const params = cursor ? { limit: HISTORY_PAGE, cursor } : { limit: HISTORY_PAGE };
+      const response = await axios.get('/focus/history', { params });
+      setHistory(prev => (cursor ? [...prev, ...response.data] : response.data));
+      setHistoryCursor(response.headers['x-next-cursor'] || null);
     } catch (error) {
       console.error('Failed to fetch history:', error);
     }
@@ -58,15 +131,37 @@ const FocusMode = () => {
     }
   };
 
-  const handlePause = () => {
+  const handlePause = async () => {
+    if (!session) return;
     setIsRunning(false);
+    try {
+      const response = await axios.post(`/focus/${session.id}/pause`);
+      setSession(response.data);
+      setTimeLeft(Math.ceil(response.data.duration_minutes * 60 - response.data.elapsed_seconds));
+    } catch (error) {
+      toast.error('Failed to pause session');
+    }
   };
 
-  const handleResume = () => {
-    setIsRunning(true);
+  const handleResume = async () => {
+    if (!session) return;
+    try {
+      const response = await axios.post(`/focus/${session.id}/resume`);
+      setSession(response.data);
+      setIsRunning(true);
+    } catch (error) {
+      toast.error('Failed to resume session');
+    }
   };
 
-  const handleReset = () => {
+  const handleReset = async () => {
+    if (session) {
+      try {
+        await axios.post(`/focus/${session.id}/abandon`);
+      } catch (error) {
+        console.error('Failed to abandon session:', error);
+      }
+    }
     setIsRunning(false);
     setSession(null);
     setTimeLeft(duration * 60);
@@ -76,23 +171,12 @@ const FocusMode = () => {
     if (!session) return;
     setIsRunning(false);
 
+    rewardedRef.current.add(session.id);
     try {
       const response = await axios.post(`/focus/${session.id}/complete`);
-      
-      showXpGain(response.data.xp_earned, { x: '50%', y: '40%' });
-      toast.success('Focus session completed!', {
-        description: `You earned ${response.data.xp_earned} XP!`
-      });
-      
-      if (response.data.level_up) {
-        setTimeout(() => showLevelUp(response.data.new_level), 1500);
-      }
-      
-      setSession(null);
-      setTimeLeft(duration * 60);
-      fetchHistory();
-      fetchCurrentUser();
+      showReward(session.duration_minutes, response.data);
     } catch (error) {
+      rewardedRef.current.delete(session.id);
       toast.error('Failed to complete session');
     }
   };
@@ -266,7 +350,7 @@ const FocusMode = () => {
             </p>
           ) : (
             <div className="space-y-3">
-              {history.slice(0, 5).map((s, i) => (
+              {history.map((s, i) => (
                 <div 
                   key={s.id} 
                   className="flex items-center justify-between p-3 bg-white/5 rounded-lg"
@@ -284,6 +368,15 @@ const FocusMode = () => {
                   )}
                 </div>
               ))}
+              {historyCursor && (
+                <button
+                  onClick={() => fetchHistory(historyCursor)}
+                  className="w-full py-2 text-sm text-[#a0a0b0] hover:text-white transition-colors"
+                  data-testid="history-more-btn"
+                >
+                  Show older sessions
+                </button>
+              )}
             </div>
           )}
         </div>
@@ -6,7 +6,7 @@ import { AuthContext, GameContext } from '../App';
 import Layout from '../components/Layout';
 import { 
   Plus, CheckCircle, Trash2, Clock, Zap, X,
-  ListTodo, Filter, ChevronDown, Sparkles, Loader2
+  ListTodo, Filter, ChevronDown, Sparkles, Loader2, Target
 } from 'lucide-react';
 
 const SKILL_TREES = ['General', 'Work', 'Health', 'Learning', 'Creative', 'Social'];
@@ -15,6 +15,7 @@ const TasksPage = () => {
   const { fetchCurrentUser } = useContext(AuthContext);
   const { showLevelUp, showXpGain } = useContext(GameContext);
   const [tasks, setTasks] = useState([]);
+  const [focusTotals, setFocusTotals] = useState({});
   const [loading, setLoading] = useState(true);
   const [showModal, setShowModal] = useState(false);
   const [filter, setFilter] = useState('all');
@@ -37,6 +38,7 @@ const TasksPage = () => {
       const params = filter === 'all' ? {} : { completed: filter === 'completed' };
       const response = await axios.get('/tasks', { params });
       setTasks(response.data);
+      fetchFocusTotals(response.data);
     } catch (error) {
       console.error('Failed to fetch tasks:', error);
     } finally {
@@ -44,6 +46,19 @@ const TasksPage = () => {
     }
   };
 
+  // One request for the focus time of every listed task
+  const fetchFocusTotals = async (taskList) => {
+    if (taskList.length === 0) return;
+    try {
+      const response = await axios.get('/focus/totals', {
+        params: { task_ids: taskList.map(task => task.id).join(',') }
+      });
+      setFocusTotals(response.data);
+    } catch (error) {
+      console.error('Failed to fetch focus totals:', error);
+    }
+  };
+
   const suggestWithAI = async () => {
     if (!aiContext.trim()) {
       toast.error('Please describe what you want to work on');
@@ -214,6 +229,11 @@ const TasksPage = () => {
                       <span className="flex items-center gap-1 text-[#00F0FF] font-mono">
                         <Zap className="w-4 h-4" /> {task.xp_reward} XP
                       </span>
+                      {focusTotals[task.id]?.sessions > 0 && (
+                        <span className="flex items-center gap-1 text-[#a0a0b0]" data-testid={`focus-total-${i}`}>
+                          <Target className="w-4 h-4" /> {focusTotals[task.id].focus_minutes}m focused
+                        </span>
+                      )}
                     </div>
                   </div>
                   <div className="flex items-center gap-2">
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+CyberFocus Load Testing Harness
+Replays the backend_test.py flows as weighted async user journeys
+
+Each virtual user registers once and then loops over journeys (tasks, boss
+challenge, focus, analytics, browsing, admin) picked by weight. Concurrency
+is ramped through stages and every request is timed per endpoint. The
+report is written as JSON so runs can be compared between commits.
+
+Examples:
+    # against a local uvicorn + mongod
+    python loadtest.py --base-url http://localhost:8001/api --stages 10:30,50:60
+
+    # in-process, no sockets (the app's configured database is used)
+    python loadtest.py --in-process --stages 5:10,20:20
+
+    # in-process against the in-memory database, no mongod needed
+    DB_BACKEND=memory python loadtest.py --in-process
+
+    # compare with a previous report
+    python loadtest.py --in-process --compare test_reports/loadtest_baseline.json
+
+Every virtual user registers and logs in from the same address, and login
+and register are rate limited per IP (RATE_LIMIT_AUTH, 10/60 by default),
+so a ramp past a handful of users gets 429s. In-process runs switch that
+limit off. Start a server under test with RATE_LIMIT_AUTH=0 (or a limit
+above the peak user count) for the same reason.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+ROOT_DIR = Path(__file__).parent
+
+ADMIN_CREDENTIALS = {"username": "Rebadion", "password": "Rebadion2010"}
+
+
+class Recorder:
+    """Collects per-endpoint latencies and error counts"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.status_codes: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.stage_requests: List[int] = []
+
+    def record(self, name: str, seconds: float, status_code: Optional[int], ok: bool):
+        self.latencies[name].append(seconds)
+        if status_code is not None:
+            self.status_codes[name][status_code] += 1
+        if not ok:
+            self.errors[name] += 1
+        if self.stage_requests:
+            self.stage_requests[-1] += 1
+
+    @staticmethod
+    def percentile(ordered: List[float], q: float) -> float:
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self, elapsed: float) -> Dict[str, dict]:
+        endpoints = {}
+        for name, samples in sorted(self.latencies.items()):
+            ordered = sorted(samples)
+            endpoints[name] = {
+                "requests": len(samples),
+                "errors": self.errors.get(name, 0),
+                "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0,
+                "p50_ms": round(self.percentile(ordered, 0.50) * 1000, 2),
+                "p95_ms": round(self.percentile(ordered, 0.95) * 1000, 2),
+                "p99_ms": round(self.percentile(ordered, 0.99) * 1000, 2),
+                "max_ms": round(ordered[-1] * 1000, 2),
+                "status_codes": {str(k): v for k, v in sorted(self.status_codes[name].items())},
+            }
+        return endpoints
+
+
+class VirtualUser:
+    """One simulated player running journeys until cancelled"""
+
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, rng: random.Random,
+                 journeys: List[tuple], think_time: float):
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.journeys = journeys
+        self.think_time = think_time
+        self.headers: Dict[str, str] = {}
+        self.admin_headers: Dict[str, str] = {}
+
+    async def call(self, name: str, method: str, path: str, json_body=None, expected=(200,),
+                   headers: Optional[dict] = None):
+        start = time.perf_counter()
+        status_code = None
+        try:
+            response = await self.client.request(method, path, json=json_body,
+                                                 headers=headers if headers is not None else self.headers)
+            status_code = response.status_code
+            ok = status_code in expected
+            data = response.json() if ok and response.content else None
+        except (httpx.HTTPError, ValueError):
+            ok, data = False, None
+        self.recorder.record(name, time.perf_counter() - start, status_code, ok)
+        return data
+
+    async def think(self):
+        if self.think_time:
+            await asyncio.sleep(self.rng.uniform(0, self.think_time * 2))
+
+    # ----- journeys (mirroring backend_test.py) -----
+
+    async def onboarding(self):
+        email = f"load_{uuid.uuid4().hex[:12]}@example.com"
+        user = {"username": f"load_{email[5:13]}", "email": email, "password": "LoadTest123!"}
+        data = await self.call("POST /auth/register", "POST", "/auth/register", user, headers={})
+        if not data:
+            return False
+        data = await self.call("POST /auth/login", "POST", "/auth/login",
+                               {"email": email, "password": user["password"]}, headers={})
+        if not data:
+            return False
+        self.headers = {"Authorization": f"Bearer {data['token']}"}
+        await self.call("GET /auth/me", "GET", "/auth/me")
+        return True
+
+    async def task_flow(self):
+        await self.call("GET /tasks", "GET", "/tasks")
+        task = await self.call("POST /tasks", "POST", "/tasks", {
+            "title": "Load test task",
+            "description": "Created by loadtest.py",
+            "skill_tree": self.rng.choice(["Work", "Learning", "Health", "General"]),
+            "difficulty": self.rng.randint(1, 5),
+            "estimated_minutes": 30,
+            "xp_reward": 50
+        })
+        await self.think()
+        if task:
+            await self.call("PATCH /tasks/{id}", "PATCH", f"/tasks/{task['id']}", {"completed": True})
+        await self.call("GET /tasks?completed=false", "GET", "/tasks?completed=false")
+
+    async def boss_flow(self):
+        challenge = await self.call("GET /boss-challenge/today", "GET", "/boss-challenge/today")
+        if challenge and not challenge.get("completed"):
+            await self.call("POST /boss-challenge/{id}/complete", "POST",
+                            f"/boss-challenge/{challenge['id']}/complete", expected=(200, 400))
+
+    async def focus_flow(self):
+        session = await self.call("POST /focus/start", "POST", "/focus/start",
+                                  {"duration_minutes": self.rng.choice([15, 25, 50])})
+        await self.think()
+        if session:
+            await self.call("POST /focus/{id}/complete", "POST", f"/focus/{session['id']}/complete",
+                            expected=(200, 400))
+        await self.call("GET /focus/history", "GET", "/focus/history")
+
+    async def analytics_flow(self):
+        await self.call("GET /analytics/dashboard", "GET", "/analytics/dashboard")
+        await self.call("GET /analytics/weekly", "GET", "/analytics/weekly")
+        await self.call("GET /achievements", "GET", "/achievements")
+
+    async def browse_flow(self):
+        await self.call("GET /news", "GET", "/news", headers={})
+        await self.call("GET /learning", "GET", "/learning", headers={})
+        await self.call("GET /music", "GET", "/music", headers={})
+        await self.call("GET /quests/available", "GET", "/quests/available")
+        settings = await self.call("GET /settings", "GET", "/settings")
+        if settings and self.rng.random() < 0.2:
+            settings.pop("user_id", None)
+            settings["music_volume"] = self.rng.randint(0, 100)
+            await self.call("PUT /settings", "PUT", "/settings", settings)
+
+    async def admin_flow(self):
+        if not self.admin_headers:
+            data = await self.call("POST /admin/login", "POST", "/admin/login", ADMIN_CREDENTIALS, headers={})
+            if not data:
+                return
+            self.admin_headers = {"Authorization": f"Bearer {data['token']}"}
+        await self.call("GET /admin/stats", "GET", "/admin/stats", headers=self.admin_headers)
+        await self.call("GET /admin/users", "GET", "/admin/users", headers=self.admin_headers)
+        await self.call("GET /admin/quests", "GET", "/admin/quests", headers=self.admin_headers)
+
+    async def run(self):
+        if not await self.onboarding():
+            return
+        names, weights = zip(*self.journeys)
+        while True:
+            journey = self.rng.choices(names, weights=weights)[0]
+            await getattr(self, journey)()
+            await self.think()
+
+
+DEFAULT_JOURNEYS = [
+    ("task_flow", 5),
+    ("focus_flow", 3),
+    ("browse_flow", 3),
+    ("boss_flow", 2),
+    ("analytics_flow", 2),
+    ("admin_flow", 0.2),
+]
+
+
+def parse_stages(spec: str) -> List[tuple]:
+    stages = []
+    for part in spec.split(","):
+        users, seconds = part.split(":")
+        stages.append((int(users), float(seconds)))
+    return stages
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_load(client: httpx.AsyncClient, stages: List[tuple], seed: int, think_time: float) -> dict:
+    recorder = Recorder()
+    users: List[asyncio.Task] = []
+    stage_results = []
+    started = time.perf_counter()
+
+    for index, (target, seconds) in enumerate(stages):
+        while len(users) < target:
+            rng = random.Random(seed * 100003 + len(users))
+            users.append(asyncio.create_task(
+                VirtualUser(client, recorder, rng, DEFAULT_JOURNEYS, think_time).run()))
+        while len(users) > target:
+            users.pop().cancel()
+
+        recorder.stage_requests.append(0)
+        print(f"▶ Stage {index + 1}/{len(stages)}: {target} users for {seconds:.0f}s")
+        await asyncio.sleep(seconds)
+        stage_results.append({
+            "users": target,
+            "seconds": seconds,
+            "requests": recorder.stage_requests[-1],
+            "throughput_rps": round(recorder.stage_requests[-1] / seconds, 2),
+        })
+
+    for task in users:
+        task.cancel()
+    await asyncio.gather(*users, return_exceptions=True)
+    elapsed = time.perf_counter() - started
+
+    return {"elapsed_seconds": round(elapsed, 2), "stages": stage_results, "endpoints": recorder.summary(elapsed)}
+
+
+def compare(current: dict, baseline_path: Path, tolerance: float) -> bool:
+    baseline = json.loads(baseline_path.read_text())
+    print(f"\n📊 Comparison with {baseline_path} ({baseline.get('commit')})")
+    regressed = False
+    for name, stats in current["endpoints"].items():
+        old = baseline.get("endpoints", {}).get(name)
+        if not old or not old["p95_ms"]:
+            continue
+        change = (stats["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100
+        flag = "❌" if change > tolerance else "  "
+        regressed |= change > tolerance
+        print(f"{flag} {name:36} p95 {old['p95_ms']:8.2f} -> {stats['p95_ms']:8.2f} ms ({change:+.1f}%)")
+    return not regressed
+
+
+def print_report(report: dict):
+    print("\n" + "=" * 96)
+    print(f"{'endpoint':36} {'reqs':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    print("=" * 96)
+    for name, stats in report["endpoints"].items():
+        print(f"{name:36} {stats['requests']:7d} {stats['errors']:5d} {stats['throughput_rps']:8.1f} "
+              f"{stats['p50_ms']:8.2f} {stats['p95_ms']:8.2f} {stats['p99_ms']:8.2f}")
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="CyberFocus load test")
+    parser.add_argument("--base-url", default="http://localhost:8001/api")
+    parser.add_argument("--in-process", action="store_true", help="drive backend/server.py over ASGI")
+    parser.add_argument("--stages", default="5:15,20:30,50:30", help="users:seconds,...")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean pause between calls (s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--report", type=Path, default=None)
+    parser.add_argument("--compare", type=Path, default=None)
+    parser.add_argument("--tolerance", type=float, default=10.0, help="allowed p95 regression (%%)")
+    args = parser.parse_args()
+
+    stages = parse_stages(args.stages)
+    peak = max(users for users, _ in stages)
+    limits = httpx.Limits(max_connections=peak, max_keepalive_connections=peak)
+
+    if args.in_process:
+        sys.path.insert(0, str(ROOT_DIR / "backend"))
+        # All virtual users share one client address, see above
+        os.environ.setdefault("RATE_LIMIT_AUTH", "0")
+        import server
+        transport = httpx.ASGITransport(app=server.app)
+        base_url = "http://loadtest/api"
+    else:
+        transport = None
+        base_url = args.base_url.rstrip("/")
+
+    print("🚀 Starting CyberFocus load test")
+    print(f"🎯 Target: {'in-process ASGI' if args.in_process else base_url}")
+
+    async with httpx.AsyncClient(base_url=base_url, transport=transport, limits=limits, timeout=30) as client:
+        result = await run_load(client, stages, args.seed, args.think_time)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "target": "in-process" if args.in_process else base_url,
+        "seed": args.seed,
+        "think_time": args.think_time,
+        **result,
+    }
+    print_report(report)
+
+    report_path = args.report or ROOT_DIR / "test_reports" / f"loadtest_{report['commit'] or 'local'}.json"
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    report_path.write_text(json.dumps(report, indent=2))
+    print(f"\n💾 Report written to {report_path}")
+
+    if args.compare:
+        return 0 if compare(report, args.compare, args.tolerance) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
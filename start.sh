@@ -2,4 +2,4 @@
 # Start script for Render - runs from root directory
 
 cd backend
-uvicorn server:app --host 0.0.0.0 --port ${PORT:-8001}
+exec gunicorn -c gunicorn.conf.py server:app
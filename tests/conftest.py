@@ -0,0 +1,20 @@
+"""Tests run against the in-memory database backend, no MongoDB needed.
+
+    python -m pytest tests
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+os.environ.setdefault("DB_BACKEND", "memory")
+os.environ.setdefault("JOB_INTERVAL", "0")
+
+from memdb import MemoryClient  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    return MemoryClient()["test"]
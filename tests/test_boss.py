@@ -0,0 +1,67 @@
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+import boss
+import difficulty
+
+TODAY = date(2026, 10, 19)
+
+
+def test_pre_generated_challenges_are_served_on_first_read(db):
+    async def scenario():
+        await db.users.insert_one({"id": "u1", "last_active_date": TODAY.isoformat()})
+        await boss.generate(db, TODAY)
+        tomorrow = (TODAY + timedelta(days=1)).isoformat()
+        assert (await db.boss_challenges.find_one({"user_id": "u1"}))["served"] is False
+
+        challenge = await boss.get_or_create(db, {"id": "u1"}, tomorrow)
+        assert challenge["served"] is True
+        assert (await db.boss_challenges.find_one({"user_id": "u1"}))["served"] is True
+
+        created = await boss.get_or_create(db, {"id": "u2"}, tomorrow)
+        assert created["served"] is True and created["date"] == tomorrow
+
+    asyncio.run(scenario())
+
+
+def test_training_skips_today_and_unserved_challenges(db):
+    async def scenario():
+        yesterday = (TODAY - timedelta(days=1)).isoformat()
+        text = boss.BOSS_CHALLENGES[0]
+        rows = [
+            ("a", yesterday, {"served": True}),
+            ("b", yesterday, {}),  # from before challenges were marked served
+            ("c", yesterday, {"served": False}),
+            ("d", TODAY.isoformat(), {"served": True}),
+        ]
+        await db.boss_challenges.insert_many([
+            {"id": user_id, "user_id": user_id, "date": day, "challenge_text": text, "difficulty": 3,
+             "completed": False, **extra}
+            for user_id, day, extra in rows
+        ])
+        stats = await difficulty.train(db, TODAY, boss.BOSS_CHALLENGES)
+        assert stats["outcomes"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_ensure_indexes_removes_duplicates_first(db):
+    async def scenario():
+        await db.boss_challenges.insert_many([
+            {"id": "a1", "user_id": "a", "date": "2026-10-18", "completed": False},
+            {"id": "a2", "user_id": "a", "date": "2026-10-18", "completed": True},
+            {"id": "a3", "user_id": "a", "date": "2026-10-18", "completed": False},
+            {"id": "b1", "user_id": "b", "date": "2026-10-18", "completed": False},
+            {"id": "b2", "user_id": "b", "date": "2026-10-18", "completed": False},
+            {"id": "c1", "user_id": "c", "date": "2026-10-18", "completed": False},
+        ])
+        await boss.ensure_indexes(db)
+        ids = sorted(doc["id"] for doc in await db.boss_challenges.find({}).to_list(None))
+        assert ids == ["a2", "b1", "c1"]
+        with pytest.raises(DuplicateKeyError):
+            await db.boss_challenges.insert_one({"id": "c2", "user_id": "c", "date": "2026-10-18"})
+
+    asyncio.run(scenario())
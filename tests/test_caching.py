@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+from caching import LRUBytesCache, accepts_gzip, parse_accept_encoding
+
+
+def request(accept_encoding=None) -> Request:
+    headers = [(b"accept-encoding", accept_encoding.encode())] if accept_encoding is not None else []
+    return Request({"type": "http", "headers": headers})
+
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding("gzip, deflate;q=0.5, br;q=bad, ,IDENTITY") == {
+        "gzip": 1.0, "deflate": 0.5, "br": 0.0, "identity": 1.0,
+    }
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", True),
+    ("gzip, br", True),
+    ("GZIP;q=0.8", True),
+    ("gzip;q=0", False),
+    ("gzip;q=0.0, br", False),
+    ("br, deflate", False),
+    ("", False),
+    (None, False),
+])
+def test_accepts_gzip(header, expected):
+    assert accepts_gzip(request(header)) is expected
+
+
+def test_fill_started_before_an_invalidation_is_not_kept():
+    cache = LRUBytesCache()
+    generation = cache.generation
+    cache.invalidate("a")
+    entry = cache.put("a", b"stale", '"1"', generation)
+    assert entry.body == b"stale"
+    assert cache.get("a") is None
+
+    cache.put("a", b"fresh", '"2"', cache.generation)
+    assert cache.get("a").body == b"fresh"
+
+
+def test_content_changes_on_other_workers_clear_the_public_caches():
+    import events
+    import server
+
+    server.learning_cache.put("article", b"{}", '"1"')
+    server.public_lists.put("news", b"[]", '"2"')
+    event = events.make_event(events.CONTENT_CHANGED, None, {"learning_id": "article"})
+    event["origin"] = "another-host:1"
+    asyncio.run(events.bus.publish_remote(event))
+    assert server.learning_cache.get("article") is None
+    assert server.public_lists.get("news") is None
@@ -0,0 +1,68 @@
+import asyncio
+from datetime import timedelta
+
+import focus_timer
+from dates import utc_now
+
+
+def engine(db):
+    awarded = []
+
+    async def on_complete(session, minutes, client_id):
+        awarded.append((session["id"], minutes))
+        return {"xp_earned": minutes * 2}
+
+    return focus_timer.FocusEngine(db, on_complete, tick_seconds=0), awarded
+
+
+async def fire_due(focus):
+    focus._fire(focus.wheel.advance(focus_timer._now()))
+    await asyncio.gather(*focus._pending)
+
+
+def test_recover_ignores_sessions_without_status(db):
+    async def scenario():
+        # Written before the server kept the timer: no status, never completed
+        await db.focus_sessions.insert_one({
+            "id": "old", "user_id": "u", "duration_minutes": 60, "task_id": None, "completed": False,
+            "xp_earned": 0, "started_at": "2026-09-01T10:00:00+00:00", "completed_at": None,
+        })
+        focus, awarded = engine(db)
+        recovered = await focus.recover()
+        await fire_due(focus)
+        return recovered, focus.sessions, awarded, await focus.complete("u", "old")
+
+    recovered, sessions, awarded, completed = asyncio.run(scenario())
+    assert (recovered, sessions, awarded, completed) == (0, {}, [], None)
+    assert focus_timer.status_of({"completed": False}) == focus_timer.ABANDONED
+
+
+def test_recover_completes_expired_sessions_once(db):
+    async def scenario():
+        focus, _ = engine(db)
+        session = await focus.start("u", 25)
+        # The worker went away and the session ran out in the meantime
+        started = utc_now() - timedelta(hours=1)
+        await db.focus_sessions.update_one({"id": session["id"]}, {"$set": {"started_at": started, "resumed_at": started}})
+
+        restarted, awarded = engine(db)
+        recovered = await restarted.recover()
+        await fire_due(restarted)
+        await fire_due(restarted)
+        return recovered, awarded, await db.focus_sessions.find_one({"id": session["id"]})
+
+    recovered, awarded, doc = asyncio.run(scenario())
+    assert recovered == 1
+    assert awarded == [(doc["id"], 25)]
+    assert doc["status"] == focus_timer.COMPLETED and doc["completed"]
+
+
+def test_recover_leaves_paused_sessions_alone(db):
+    async def scenario():
+        focus, _ = engine(db)
+        session = await focus.start("u", 25)
+        await focus.pause("u", session["id"])
+        restarted, awarded = engine(db)
+        return await restarted.recover(), awarded
+
+    assert asyncio.run(scenario()) == (0, [])
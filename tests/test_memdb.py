@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from memdb import matches
+
+
+def at(day: int) -> datetime:
+    return datetime(2026, 10, day, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("query, expected", [
+    ({"n": {"$gt": 1}}, True),
+    ({"n": {"$gte": 3, "$lt": 4}}, False),
+    ({"n": {"$in": [1, 2]}}, True),
+    ({"n": {"$nin": [1, 2]}}, False),
+    ({"n": {"$ne": 2}}, False),
+    ({"missing": None}, True),
+    ({"missing": {"$exists": False}}, True),
+    ({"tags": "b"}, True),
+    ({"name": {"$regex": "^AL", "$options": "i"}}, True),
+    ({"$or": [{"n": 5}, {"name": "alice"}]}, True),
+    ({"$and": [{"n": 2}, {"name": "bob"}]}, False),
+    ({"n": {"$not": {"$gt": 5}}}, True),
+    ({"at": {"$type": "date"}}, True),
+    ({"at": {"$type": "string"}}, False),
+    # Values of different types never compare, as in MongoDB
+    ({"at": {"$gte": "2026-01-01"}}, False),
+    ({"at": {"$gte": at(1)}}, True),
+    # A naive datetime is UTC, as pymongo stores it
+    ({"at": {"$gte": datetime(2026, 10, 1)}}, True),
+    ({"at": {"$lt": datetime(2026, 10, 5)}}, False),
+    ({"at": datetime(2026, 10, 5)}, True),
+])
+def test_query_operators(query, expected):
+    doc = {"n": 2, "name": "alice", "tags": ["a", "b"], "at": at(5)}
+    assert matches(doc, query) is expected
+
+
+def test_update_operators(db):
+    async def scenario():
+        await db.items.insert_one({"id": "a", "n": 1, "tags": ["x"], "seen": "2026-10-01T00:00:00+00:00"})
+        await db.items.update_one({"id": "a"}, {
+            "$inc": {"n": 2}, "$set": {"nested.flag": True}, "$push": {"tags": {"$each": ["y", "z"], "$slice": -2}},
+            "$max": {"seen": at(2)}, "$unset": {"gone": ""},
+        })
+        return await db.items.find_one({"id": "a"}, {"_id": 0})
+
+    doc = asyncio.run(scenario())
+    # $max orders across types like BSON: any date is above any string
+    assert doc == {"id": "a", "n": 3, "tags": ["y", "z"], "seen": at(2), "nested": {"flag": True}}
+
+
+def test_upsert_seeds_from_equality_filters(db):
+    async def scenario():
+        await db.totals.update_one({"user_id": "u", "task_id": "t", "n": {"$gt": 5}},
+                                   {"$inc": {"n": 1}, "$setOnInsert": {"first": True}}, upsert=True)
+        await db.totals.update_one({"user_id": "u", "task_id": "t"}, {"$inc": {"n": 1}}, upsert=True)
+        return await db.totals.find({}, {"_id": 0}).to_list(None)
+
+    assert asyncio.run(scenario()) == [{"user_id": "u", "task_id": "t", "n": 2, "first": True}]
+
+
+def test_find_sort_skip_limit_projection(db):
+    async def scenario():
+        await db.items.insert_many([{"id": i, "group": i % 2, "at": at(i + 1)} for i in range(6)])
+        return await db.items.find({"group": 0}, {"_id": 0, "id": 1}).sort([("at", -1)]).skip(1).limit(2).to_list(None)
+
+    assert asyncio.run(scenario()) == [{"id": 2}, {"id": 0}]
+
+
+def test_unique_index_and_bulk_write(db):
+    async def scenario():
+        await db.users.create_index("email", unique=True)
+        await db.users.insert_one({"email": "a@example.com", "n": 0})
+        with pytest.raises(DuplicateKeyError):
+            await db.users.insert_one({"email": "a@example.com"})
+        result = await db.users.bulk_write([
+            UpdateOne({"email": "a@example.com"}, {"$inc": {"n": 1}}),
+            UpdateOne({"email": "b@example.com"}, {"$inc": {"n": 1}}, upsert=True),
+        ], ordered=False)
+        return result, await db.users.count_documents({"n": 1})
+
+    result, count = asyncio.run(scenario())
+    assert (result.modified_count, result.upserted_count, count) == (1, 1, 2)
+
+
+def test_aggregate_match_group(db):
+    async def scenario():
+        await db.sessions.insert_many([{"user_id": u, "minutes": m} for u, m in [("a", 10), ("a", 15), ("b", 5)]])
+        return await db.sessions.aggregate([
+            {"$match": {"minutes": {"$gte": 10}}},
+            {"$group": {"_id": "$user_id", "total": {"$sum": "$minutes"}, "count": {"$sum": 1}}},
+        ]).to_list(None)
+
+    assert asyncio.run(scenario()) == [{"_id": "a", "total": 25, "count": 2}]
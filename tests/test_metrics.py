@@ -0,0 +1,43 @@
+import asyncio
+import json
+import logging
+
+from memdb import MemoryClient
+from metrics import REGISTRY, MongoCommandListener, current_request, mongo_latency
+from query_profiler import QueryProfiler
+
+
+def run_finds(listener, collection: str, n: int):
+    db = MemoryClient(event_listeners=[listener])["test"]
+
+    async def finds():
+        for i in range(n):
+            await db[collection].find_one({"user_id": str(i)})
+
+    asyncio.run(finds())
+
+
+def test_commands_are_folded_in_on_collect():
+    profiler = QueryProfiler(sample_every=5)
+    listener = MongoCommandListener(profiler)
+    run_finds(listener, "folded", 20)
+    assert ("folded", "find") not in mongo_latency.values
+
+    REGISTRY.collect()
+    series = mongo_latency.values[("folded", "find")]
+    assert sum(series[:-1]) == 20
+    # Four sampled commands, each standing for five
+    assert [(row["shape"], row["count"]) for row in profiler.top()] == [("folded.find{user_id}", 20)]
+
+
+def test_slow_commands_are_logged_with_their_request(caplog):
+    listener = MongoCommandListener(QueryProfiler(slow_ms=0))
+    token = current_request.set({"method": "GET", "path": "/api/tasks"})
+    try:
+        with caplog.at_level(logging.WARNING, logger="cyberfocus.slowquery"):
+            run_finds(listener, "slow", 2)
+    finally:
+        current_request.reset(token)
+
+    logged = [json.loads(record.getMessage()) for record in caplog.records]
+    assert [(entry["shape"], entry["route"]) for entry in logged] == [("slow.find{user_id}", "GET /api/tasks")] * 2
@@ -0,0 +1,67 @@
+import asyncio
+from datetime import datetime, timezone
+
+import migrations
+
+
+async def seed(db, count=25):
+    await db.tasks.insert_many([{
+        "id": f"t{i}", "created_at": f"2026-10-{i % 28 + 1:02d}T08:00:00+00:00",
+        "completed_at": None if i % 2 else f"2026-10-{i % 28 + 1:02d}T09:30:00+00:00",
+    } for i in range(count)])
+
+
+def test_converts_strings_and_reruns_are_noops(db):
+    async def scenario():
+        await seed(db)
+        first = await migrations.run(db, batch_size=10, rate=0)
+        second = await migrations.run(db, batch_size=10, rate=0)
+        await migrations.restart(db)
+        third = await migrations.run(db, batch_size=10, rate=0)
+        return first["tasks"], second["tasks"], third["tasks"], await db.tasks.find({"id": "t0"}).to_list(None)
+
+    first, second, third, (doc,) = asyncio.run(scenario())
+    assert (first["scanned"], first["converted"], first["batches"], first["done"]) == (25, 25, 3, True)
+    # Done collections are skipped, and a restart finds nothing left to convert
+    assert second == {"scanned": 0, "converted": 0, "batches": 0, "done": True}
+    assert (third["scanned"], third["converted"]) == (0, 0)
+    assert doc["created_at"] == datetime(2026, 10, 1, 8, tzinfo=timezone.utc)
+    assert doc["completed_at"] == datetime(2026, 10, 1, 9, 30, tzinfo=timezone.utc)
+
+
+def test_resumes_after_an_interrupted_run(db):
+    class Interrupted(Exception):
+        pass
+
+    async def stop_after_first_batch(stats):
+        raise Interrupted
+
+    async def scenario():
+        await seed(db)
+        try:
+            await migrations.migrate_collection(db, "tasks", ("created_at",), batch_size=10, rate=0,
+                                                on_batch=stop_after_first_batch)
+        except Interrupted:
+            pass
+        resumed = await migrations.migrate_collection(db, "tasks", ("created_at",), batch_size=10, rate=0)
+        left = await db.tasks.count_documents({"created_at": {"$type": "string"}})
+        return resumed, left
+
+    resumed, left = asyncio.run(scenario())
+    assert (resumed["scanned"], resumed["converted"], left) == (15, 15, 0)
+
+
+def test_leaves_newer_writes_and_unparseable_values(db):
+    async def scenario():
+        newer = datetime(2026, 10, 18, tzinfo=timezone.utc)
+        await db.news.insert_many([
+            {"id": "bad", "created_at": "yesterday"},
+            {"id": "new", "created_at": newer},
+        ])
+        stats = await migrations.migrate_collection(db, "news", ("created_at",), rate=0)
+        docs = {doc["id"]: doc["created_at"] for doc in await db.news.find({}).to_list(None)}
+        return stats, docs, newer
+
+    stats, docs, newer = asyncio.run(scenario())
+    assert (stats["scanned"], stats["converted"]) == (1, 0)
+    assert docs == {"bad": "yesterday", "new": newer}
@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+from music import UNCATEGORIZED, MusicCatalog
+
+
+def test_tracks_without_category_get_their_own_group():
+    catalog = MusicCatalog([])
+    tracks = [{"id": "1", "category": "lofi"}, {"id": "2"}, {"id": "3", "category": None}]
+    catalog.rebuild(tracks)
+    assert [t["id"] for t in catalog.tracks()] == ["1", "2", "3"]
+    assert [t["id"] for t in catalog.tracks(UNCATEGORIZED)] == ["2", "3"]
+    assert catalog.categories == ["lofi", UNCATEGORIZED]
+    # The caller's list is left as it was
+    assert len(tracks) == 3
+
+
+@pytest.mark.parametrize("category", ["\u65e5", "\u00e9", 'a"b'])
+def test_etags_stay_valid_for_any_category(category):
+    catalog = MusicCatalog([])
+    catalog.rebuild([{"id": "1", "category": "lofi"}])
+    etag = catalog.body(category).etag
+    etag.encode("latin-1")
+    assert etag.count('"') == 2
+
+
+def test_empty_category_lists_every_track():
+    from fastapi.testclient import TestClient
+
+    import server
+
+    with TestClient(server.app) as client:
+        everything = client.get("/api/music").json()
+        assert everything and client.get("/api/music?category=").json() == everything
+        assert json.loads(client.get("/api/music?category=%E6%97%A5").content) == []
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from ratelimit import Limit, MemoryBuckets, RateLimitMiddleware, client_ip, parse_limit
+
+
+def test_parse_limit():
+    limit = parse_limit("10/60")
+    assert (limit.count, limit.period, limit.interval) == (10, 60.0, 6.0)
+    assert parse_limit("0") is None and parse_limit("") is None
+
+
+def test_gcra_allows_a_burst_then_one_per_interval():
+    buckets, limit = MemoryBuckets(), Limit(3, 60)
+    assert [buckets.hit("k", limit, now=100.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    # The burst is spent: the next request fits once one interval has passed
+    assert buckets.hit("k", limit, now=100.0) == pytest.approx(20.0)
+    assert buckets.hit("k", limit, now=110.0) == pytest.approx(10.0)
+    assert buckets.hit("k", limit, now=120.0) == 0.0
+    assert buckets.hit("k", limit, now=120.0) > 0
+    # Denied requests take nothing from the bucket, and keys are independent
+    assert buckets.hit("other", limit, now=120.0) == 0.0
+    # A bucket left alone refills completely
+    assert [buckets.hit("k", limit, now=1000.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+
+
+def test_sweep_drops_full_buckets():
+    buckets, limit = MemoryBuckets(sweep_interval=10), Limit(2, 10)
+    buckets.hit("a", limit, now=buckets._next_sweep - 1)
+    buckets.hit("b", limit, now=buckets._next_sweep + 100)
+    assert list(buckets.tat) == ["b"]
+
+
+def scope(path="/login", client="10.0.0.1", headers=()):
+    return {"type": "http", "method": "POST", "path": path, "client": (client, 1234), "headers": list(headers)}
+
+
+def test_client_ip_uses_the_hop_the_proxy_appended():
+    spoofed = [(b"x-forwarded-for", b"1.1.1.1, 203.0.113.7")]
+    assert client_ip(scope(headers=spoofed)) == "10.0.0.1"
+    assert client_ip(scope(headers=spoofed), proxy_hops=1) == "203.0.113.7"
+    assert client_ip(scope(headers=spoofed), proxy_hops=2) == "1.1.1.1"
+    # Fewer entries than proxies: the header is not from our proxies
+    assert client_ip(scope(headers=spoofed), proxy_hops=3) == "10.0.0.1"
+
+
+def run_requests(middleware, scopes):
+    statuses = []
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    async def scenario():
+        middleware.app = app
+        for s in scopes:
+            await middleware(s, None, send)
+
+    asyncio.run(scenario())
+    return statuses
+
+
+def test_middleware_answers_429_over_the_limit():
+    routes = {("POST", "/login"): ("auth", Limit(2, 60)), ("POST", "/ai"): ("ai", Limit(2, 60))}
+    middleware = RateLimitMiddleware(None, MemoryBuckets(), routes, identify=lambda s: "user-1",
+                                     per_ip=("auth",), proxy_hops=1)
+
+    def forwarded(ip):
+        return [(b"x-forwarded-for", f"{ip}, 203.0.113.7".encode())]
+
+    # Per IP on auth routes, whatever the client puts in front of the proxy's hop
+    assert run_requests(middleware, [scope(headers=forwarded(f"6.6.6.{i}")) for i in range(3)]) == [200, 200, 429]
+    # Per user elsewhere, from any address
+    assert run_requests(middleware, [scope("/ai", client=f"10.0.0.{i}") for i in range(3)]) == [200, 200, 429]
+    # Routes without a rule are never limited
+    assert run_requests(middleware, [scope("/other") for _ in range(5)]) == [200] * 5
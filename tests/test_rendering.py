@@ -0,0 +1,57 @@
+import pytest
+
+from rendering import render_markdown
+
+
+@pytest.mark.parametrize("url", [
+    "javascript:alert(1)",
+    "JavaScript:alert(1)",
+    "data:text/html;base64,PHNjcmlwdD4=",
+    "vbscript:msgbox",
+])
+def test_unsafe_link_targets_render_as_text(url):
+    html = render_markdown(f"[click]({url})")
+    assert "<a" not in html
+    assert "click" in html
+
+
+def test_safe_link_targets_are_kept():
+    for url in ("https://example.com", "mailto:a@example.com", "/learning", "#top"):
+        assert f'<a href="{url}" rel="noopener noreferrer nofollow">x</a>' in render_markdown(f"[x]({url})")
+
+
+def test_quotes_cannot_break_out_of_the_link():
+    html = render_markdown('[a" onmouseover="x](https://example.com)')
+    assert 'onmouseover="' not in html
+    assert "a&quot; onmouseover=&quot;x</a>" in html
+
+    html = render_markdown('[a](https://example.com/"onmouseover="x)')
+    assert 'onmouseover="' not in html
+    assert 'href="https://example.com/&quot;onmouseover=&quot;x"' in html
+
+
+def test_emphasis_is_not_applied_inside_link_targets():
+    assert render_markdown("[_docs_](https://example.com/_x_/*y*)") == \
+        '<p><a href="https://example.com/_x_/*y*" rel="noopener noreferrer nofollow"><em>docs</em></a></p>'
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("**bold _italic_ bold**", "<strong>bold <em>italic</em> bold</strong>"),
+    ("*italic **bold** italic*", "<em>italic <strong>bold</strong> italic</em>"),
+    ("***both***", "<strong><em>both</em></strong>"),
+    ("snake_case_name", "snake_case_name"),
+])
+def test_nested_emphasis(text, expected):
+    assert render_markdown(text) == f"<p>{expected}</p>"
+
+
+def test_code_spans_escape_html_and_skip_emphasis():
+    assert render_markdown("`<script>alert(1)</script>`") == \
+        "<p><code>&lt;script&gt;alert(1)&lt;/script&gt;</code></p>"
+    assert render_markdown("`**not bold**`") == "<p><code>**not bold**</code></p>"
+
+
+def test_raw_html_is_escaped():
+    html = render_markdown('<img src=x onerror=alert(1)>\n\n```\n<b>"fenced"</b>\n```')
+    assert "<img" not in html
+    assert "<pre><code>&lt;b&gt;&quot;fenced&quot;&lt;/b&gt;</code></pre>" in html